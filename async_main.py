@@ -0,0 +1,368 @@
+"""Module providing async variants of the views in main.py, served by aiohttp
+
+Usage:
+    python async_main.py
+    python async_main.py --port 8080
+
+The token and List Athletes views await their upstream calls instead of
+blocking a worker thread, so one process serves many users while TrainingPeaks
+is slow. Before and after each call they run the same steps as the views of
+main.py, on its sessions, tokens, config snapshots and metrics. Session cookies
+are signed and set with the settings of main.py's Flask app, so a cookie issued
+by either server is read by the other and both render the same pages for the
+same user. /stream-test-data and the /api routes are only served by main.py.
+"""
+
+import argparse
+import asyncio
+import time
+from typing import Callable, Dict, Optional, Tuple, TypeVar
+from aiohttp import ETag, hdrs, web
+from itsdangerous import BadSignature
+from werkzeug.http import generate_etag
+import main
+from main import (
+    check_get_data,
+    check_get_token,
+    check_refresh_token,
+    finish_get_data,
+    finish_token_call,
+    get_render_links,
+    handle_callback,
+)
+from services import metrics
+from services.async_public_api import (
+    AsyncGetTokenRequest,
+    AsyncListAthleteRequest,
+    AsyncRefreshTokenRequest,
+)
+from services.client_registry import OAuthClient, make_state_key
+from services.config_loader import CLIENTS_PATH, DEFAULT_CLIENT, Config
+from services.deadline import Deadline
+from services.html_renderer import HtmlRenderer, TimedHtmlRenderer
+from services.models import ApiError
+from services.public_api import GetTokenResponse, ListAthleteResponse
+from services.session_store import SessionStore
+
+HTML_CONTENT_TYPE = "text/html"
+COOKIE_NAME = main.app.config["SESSION_COOKIE_NAME"]
+session_interface = main.app.session_interface
+cookie_serializer = session_interface.get_signing_serializer(main.app)
+cookie_max_age = int(main.app.permanent_session_lifetime.total_seconds())
+
+T = TypeVar("T")
+
+TokenResult = Tuple[Optional[GetTokenResponse], Optional[ApiError]]
+
+# Refreshes of the same refresh token running on this event loop share one upstream call
+token_refreshes: Dict[Tuple[str, str], "asyncio.Future[TokenResult]"] = {}
+
+
+def load_session(request: web.Request) -> dict:
+    """The Flask session of the request's cookie, empty if it is missing or forged"""
+    cookie = request.cookies.get(COOKIE_NAME)
+    if not cookie:
+        return {}
+    try:
+        return dict(cookie_serializer.loads(cookie, max_age=cookie_max_age))
+    except BadSignature:
+        return {}
+
+
+def get_session_id(request: web.Request) -> str:
+    """Get the id of the current user's session, issuing one on first visit"""
+    session = request["session"]
+    if "session_id" not in session:
+        session["session_id"] = SessionStore.new_session_id()
+        request["session_modified"] = True
+    return session["session_id"]
+
+
+def get_state_key(request: web.Request, client: str) -> str:
+    return make_state_key(client, get_session_id(request))
+
+
+def current_config(request: web.Request) -> Config:
+    """The config snapshot this request started on, reloads meanwhile do not affect it"""
+    return request["config"]
+
+
+def current_client(request: web.Request, name: str) -> OAuthClient:
+    """The named client of this request's snapshot, 404 if the snapshot does not define it"""
+    client = main.clients.get(current_config(request), name)
+    if client is None:
+        raise web.HTTPNotFound()
+    return client
+
+
+async def in_session(request: web.Request, client: str, step: Callable[[HtmlRenderer], T]) -> T:
+    """Run step on the current user's locked state for the client, returns what it returns
+
+    The session is locked, used and unlocked by one call on a worker thread, so
+    waiting for another request of the same user never blocks the event loop.
+    Views do not hold the session while they await an upstream call.
+    """
+    current_client(request, client)
+    snapshot = current_config(request)
+    state_key = get_state_key(request, client)
+
+    def run() -> T:
+        with main.session_store.session(state_key) as state:
+            links = get_render_links(snapshot, client)
+            html_renderer = TimedHtmlRenderer(config=snapshot, state=state, links=links)
+            result = step(html_renderer)
+        if html_renderer.render_timing is not None:
+            # Observed by the middleware, like record_duration does for main.py
+            request["render_timing"] = html_renderer.render_timing
+        return result
+
+    return await asyncio.to_thread(run)
+
+
+async def refresh_access_token(
+    refresh_token: str, client: str = DEFAULT_CLIENT, deadline: Deadline = None
+) -> TokenResult:
+    """Refresh a token, concurrent refreshes of the same refresh token share one upstream call
+
+    Returns the new token, or the failure of the call when there is none.
+    """
+    oauth_client = main.clients.get(main.config_manager.current, client)
+    if oauth_client is None:
+        return None, None
+
+    async def refresh_once() -> TokenResult:
+        request = AsyncRefreshTokenRequest(refresh_token)
+        response = await request.execute(
+            oauth_client.oauth.token_url,
+            oauth_client.oauth.client_id,
+            oauth_client.oauth.client_secret,
+            http_client=oauth_client.async_http_client,
+            deadline=deadline,
+        )
+        return response, request.failure
+
+    key = (client, refresh_token)
+    refresh = token_refreshes.get(key)
+    if refresh is None:
+        refresh = asyncio.ensure_future(refresh_once())
+        token_refreshes[key] = refresh
+        refresh.add_done_callback(lambda _: token_refreshes.pop(key, None))
+    # A caller that disconnects must not cancel the refresh the others wait for
+    return await asyncio.shield(refresh)
+
+
+def html_response(text: str) -> web.Response:
+    return web.Response(text=text, content_type=HTML_CONTENT_TYPE)
+
+
+def client_route(routes: web.RouteTableDef, rule: str) -> Callable:
+    """Serve a view at rule for the default client and below /clients/{client} for named ones"""
+    def decorator(view: Callable) -> Callable:
+        async def default_client_view(request: web.Request) -> web.StreamResponse:
+            return await view(request, DEFAULT_CLIENT)
+
+        async def named_client_view(request: web.Request) -> web.StreamResponse:
+            return await view(request, request.match_info["client"])
+
+        routes.get(rule)(default_client_view)
+        routes.get(f"{CLIENTS_PATH}/{{client}}{rule}")(named_client_view)
+        return view
+    return decorator
+
+
+routes = web.RouteTableDef()
+
+
+@web.middleware
+async def flask_compatible(request: web.Request, handler: Callable) -> web.StreamResponse:
+    """Pin the config snapshot, load and save the session cookie and time the route"""
+    started = time.perf_counter()
+    request["config"] = main.config_manager.current
+    # Upstream calls of this request share one time budget
+    request["deadline"] = Deadline(current_config(request).http.deadline_seconds)
+    request["session"] = load_session(request)
+    request["session_modified"] = False
+    status = "500"
+    try:
+        response = await handler(request)
+        status = str(response.status)
+    except web.HTTPException as error:
+        status = str(error.status)
+        raise
+    finally:
+        # Labels use Flask's rule syntax so both servers add to the same series
+        resource = request.match_info.route.resource
+        rule = resource.canonical.replace("{client}", "<client>") if resource else "unmatched"
+        metrics.ROUTE_REQUEST_DURATION.observe(
+            time.perf_counter() - started, rule, request.method, status
+        )
+        render_timing = request.get("render_timing")
+        if render_timing is not None:
+            metrics.RENDER_DURATION.observe(*render_timing)
+    if request["session_modified"]:
+        save_session(request, response)
+    compress_response(request, response)
+    return response
+
+
+def save_session(request: web.Request, response: web.StreamResponse) -> None:
+    """Set the session cookie like Flask's session interface sets it for main.py"""
+    response.set_cookie(
+        COOKIE_NAME,
+        cookie_serializer.dumps(request["session"]),
+        domain=session_interface.get_cookie_domain(main.app),
+        path=session_interface.get_cookie_path(main.app),
+        httponly=session_interface.get_cookie_httponly(main.app),
+        secure=session_interface.get_cookie_secure(main.app),
+        samesite=session_interface.get_cookie_samesite(main.app),
+    )
+
+
+def compress_response(request: web.Request, response: web.StreamResponse) -> None:
+    """Compress bodies the client accepts compressed, like main.compress_response"""
+    compressor = main.compressor
+    if compressor is None or not compressor.compresses(response.content_type):
+        return
+    vary = response.headers.get(hdrs.VARY)
+    response.headers[hdrs.VARY] = f"{vary}, Accept-Encoding" if vary else "Accept-Encoding"
+    if (
+        not isinstance(response, web.Response)
+        or response.status != 200
+        or hdrs.CONTENT_ENCODING in response.headers
+        or not isinstance(response.body, bytes)
+    ):
+        return
+    encoding = compressor.negotiate(request.headers.get(hdrs.ACCEPT_ENCODING))
+    if encoding is None or not compressor.should_compress(response.body):
+        return
+    etag = response.etag
+    response.body = compressor.compress(
+        response.body, encoding, None if etag is None or etag.is_weak else etag.value
+    )
+    response.headers[hdrs.CONTENT_ENCODING] = encoding
+    if etag is not None:
+        response.etag = ETag(value=etag.value, is_weak=True)
+
+
+@routes.get("/metrics")
+async def get_metrics(request: web.Request) -> web.Response:
+    """Expose latency histograms and counters in the Prometheus text format"""
+    return web.Response(
+        body=metrics.registry.render().encode(), headers={"Content-Type": metrics.CONTENT_TYPE}
+    )
+
+
+@client_route(routes, "/")
+async def home(request: web.Request, client: str) -> web.Response:
+    """Entrypoint of the Application"""
+    body = await in_session(request, client, lambda html_renderer: html_renderer.render())
+    etag = generate_etag(body.encode())
+    headers = {"ETag": f'"{etag}"', "Cache-Control": "no-cache"}
+    # Browsers revalidate with If-None-Match and get a 304 while the state is unchanged
+    if request.if_none_match and any(match.value == etag for match in request.if_none_match):
+        return web.Response(status=304, headers=headers)
+    response = html_response(body)
+    response.headers.update(headers)
+    return response
+
+
+@client_route(routes, "/callback")
+async def callback(request: web.Request, client: str) -> web.Response:
+    """Handle callback from Authorization call"""
+    code = request.query.get("code")
+    return html_response(
+        await in_session(request, client, lambda html_renderer: handle_callback(html_renderer, code))
+    )
+
+
+@client_route(routes, "/get-token")
+async def get_token(request: web.Request, client: str) -> web.Response:
+    """Use the Authoization Code to get an Access Token"""
+    def check(html_renderer: HtmlRenderer) -> Tuple[Optional[str], str]:
+        code = html_renderer.state.authorization_code_response.authorization_code
+        return check_get_token(html_renderer), code
+
+    page, code = await in_session(request, client, check)
+    if page is not None:
+        return html_response(page)
+    oauth_client = current_client(request, client)
+    get_token_request = AsyncGetTokenRequest(
+        code, current_config(request).server.get_redirect_uri(client)
+    )
+    response: GetTokenResponse = await get_token_request.execute(
+        oauth_client.oauth.token_url,
+        oauth_client.oauth.client_id,
+        oauth_client.oauth.client_secret,
+        http_client=oauth_client.async_http_client,
+        deadline=request["deadline"],
+    )
+    state_key = get_state_key(request, client)
+    return html_response(await in_session(
+        request,
+        client,
+        lambda html_renderer: finish_token_call(
+            html_renderer, state_key, response, get_token_request.failure
+        ),
+    ))
+
+
+@client_route(routes, "/refresh-token")
+async def refresh_token(request: web.Request, client: str) -> web.Response:
+    """Use the Refresh Token to get a new Access Token"""
+    def check(html_renderer: HtmlRenderer) -> Tuple[Optional[str], str]:
+        refresh = html_renderer.state.token_code_response.refresh_token
+        return check_refresh_token(html_renderer), refresh
+
+    page, refresh = await in_session(request, client, check)
+    if page is not None:
+        return html_response(page)
+    response, failure = await refresh_access_token(refresh, client, request["deadline"])
+    state_key = get_state_key(request, client)
+    return html_response(await in_session(
+        request,
+        client,
+        lambda html_renderer: finish_token_call(html_renderer, state_key, response, failure),
+    ))
+
+
+@client_route(routes, "/get-test-data")
+async def get_data(request: web.Request, client: str) -> web.Response:
+    """Makes a GET request using the obtained token"""
+    def check(html_renderer: HtmlRenderer) -> Tuple[Optional[str], str]:
+        access_token = html_renderer.state.token_code_response.access_token
+        return check_get_data(html_renderer), access_token
+
+    page, access_token = await in_session(request, client, check)
+    if page is not None:
+        return html_response(page)
+    oauth_client = current_client(request, client)
+    list_athlete_request = AsyncListAthleteRequest()
+    response: ListAthleteResponse = await list_athlete_request.execute(
+        oauth_client.public_api.list_athletes_endpoint,
+        access_token,
+        http_client=oauth_client.async_http_client,
+        cache=main.list_athletes_cache,
+        deadline=request["deadline"],
+    )
+    state_key = get_state_key(request, client)
+    return html_response(await in_session(
+        request,
+        client,
+        lambda html_renderer: finish_get_data(
+            html_renderer, state_key, response, list_athlete_request.failure
+        ),
+    ))
+
+
+def create_app() -> web.Application:
+    app = web.Application(middlewares=[flask_compatible])
+    app.add_routes(routes)
+    return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=main.config.server.local_port)
+    args = parser.parse_args()
+    web.run_app(create_app(), host=args.host, port=args.port)
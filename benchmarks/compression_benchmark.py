@@ -0,0 +1,87 @@
+"""Micro-benchmark of compressing the /get-test-data page, per coding and level
+
+Usage:
+    python benchmarks/compression_benchmark.py
+    python benchmarks/compression_benchmark.py --athletes 2000 --number 50
+
+Renders the page with a roster of the given size and reports the compressed
+size, the compression ratio and the CPU time per body for gzip levels and,
+when the brotli package is installed, brotli qualities. The last row is a page
+served again from the cache of compressed bodies.
+"""
+
+import argparse
+import gzip
+import json
+import os
+import sys
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(ROOT)
+from benchmarks.models_benchmark import build_athletes_body
+from benchmarks.render_benchmark import TEST_CONFIG_PATH, build_states
+from services.application_state import Status
+from services.compression import BROTLI, GZIP, Compressor, brotli
+from services.config_loader import Config
+from services.html_renderer import HtmlRenderer, RenderLinks
+from services.models import decode_athletes
+from services.public_api import ListAthleteResponse
+
+
+def build_page(athlete_count: int) -> bytes:
+    config = Config(config_file=TEST_CONFIG_PATH)
+    state = build_states(0)["token"]
+    state.list_athletes_request_status = Status.SUCCESS.value
+    state.list_athletes_response = ListAthleteResponse(
+        athletes=decode_athletes(json.loads(build_athletes_body(athlete_count))),
+        status_code=200,
+    )
+    renderer = HtmlRenderer(config=config, state=state, links=RenderLinks.from_config(config))
+    return renderer.render().encode()
+
+
+def cpu_per_call(function, number: int) -> float:
+    started = time.process_time()
+    for _ in range(number):
+        function()
+    return (time.process_time() - started) / number
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--athletes", type=int, default=500)
+    parser.add_argument("--number", type=int, default=20)
+    args = parser.parse_args()
+    page = build_page(args.athletes)
+
+    cases = [(GZIP, level) for level in (1, 6, 9)]
+    if brotli is not None:
+        cases += [(BROTLI, quality) for quality in (1, 5, 11)]
+    else:
+        print("brotli is not installed, only gzip is measured\n")
+
+    print(f"page with {args.athletes} athletes: {len(page)} bytes\n")
+    print(f"{'coding':<16}{'bytes':>10}{'ratio':>10}{'cpu ms/body':>14}")
+    for encoding, level in cases:
+        compressor = Compressor(gzip_level=level, brotli_quality=level)
+        compressed = compressor.compress_uncached(page, encoding)
+        if encoding == GZIP:
+            assert gzip.decompress(compressed) == page
+        cpu = cpu_per_call(lambda: compressor.compress_uncached(page, encoding), args.number)
+        print(
+            f"{f'{encoding} {level}':<16}{len(compressed):>10}"
+            f"{len(page) / len(compressed):>10.1f}{cpu * 1e3:>14.3f}"
+        )
+
+    compressor = Compressor()
+    compressed = compressor.compress(page, GZIP, etag="page")
+    cached = cpu_per_call(lambda: compressor.compress(page, GZIP, etag="page"), args.number * 100)
+    print(
+        f"{'gzip 6 cached':<16}{len(compressed):>10}"
+        f"{len(page) / len(compressed):>10.1f}{cached * 1e3:>14.3f}"
+    )
+
+
+if __name__ == "__main__":
+    main()
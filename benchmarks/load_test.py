@@ -0,0 +1,287 @@
+"""Load test of the Flask routes against a local stub TrainingPeaks server
+
+Usage:
+    python benchmarks/load_test.py
+    python benchmarks/load_test.py --concurrency 1,8,32 --flows 200 --latency-ms 50 --error-rate 0.01
+    python benchmarks/load_test.py --compare benchmarks/results/<earlier run>.json
+
+Every flow is one browser session walking /callback, /get-token,
+/refresh-token and /get-test-data. The application runs in its own process,
+configured to call the stub, so its memory is measured on its own. Results
+are written as JSON, by default to benchmarks/results/, and --compare prints
+the change against an earlier results file.
+"""
+
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import configparser
+import datetime
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import Dict, List, Optional
+
+import requests
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(ROOT)
+from benchmarks.stub_server import LIST_ATHLETES_PATH, TOKEN_PATH, StubTrainingPeaksServer
+
+TEST_CONFIG_PATH = os.path.join(ROOT, "tests", "config", "test_config.ini")
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+ROUTES = ("/callback", "/get-token", "/refresh-token", "/get-test-data")
+
+APP_RUNNER = """
+import sys
+sys.path.insert(0, sys.argv[1])
+import main
+from werkzeug.serving import make_server
+make_server("127.0.0.1", int(sys.argv[2]), main.app, threaded=True).serve_forever()
+"""
+
+
+def get_free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def write_app_config(directory: str, port: int, stub_url: str) -> None:
+    """The test config pointed at the stub, with the outbound rate limit and background work off"""
+    config = configparser.ConfigParser()
+    config.read(TEST_CONFIG_PATH)
+    config["oauth"]["token_url"] = stub_url + TOKEN_PATH
+    config["server"]["local_port"] = str(port)
+    config["public_api"]["list_athletes_endpoint"] = stub_url + LIST_ATHLETES_PATH
+    config["http"]["max_retries"] = "0"
+    config["session"]["max_sessions"] = "100000"
+    config["session"]["backend"] = "memory"
+    config["rate_limit"]["enabled"] = "false"
+    config["token_refresh"]["enabled"] = "false"
+    config["token_store"]["enabled"] = "false"
+    os.makedirs(os.path.join(directory, "config"))
+    with open(os.path.join(directory, "config", "config.ini"), "w") as config_file:
+        config.write(config_file)
+
+
+def start_app(directory: str, port: int) -> subprocess.Popen:
+    process = subprocess.Popen(
+        [sys.executable, "-c", APP_RUNNER, ROOT, str(port)],
+        cwd=directory,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"application exited with {process.returncode}")
+        try:
+            requests.get(f"http://127.0.0.1:{port}/", timeout=1)
+            return process
+        except requests.ConnectionError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError("application did not start within 30 seconds")
+
+
+def read_memory_kb(pid: int) -> Dict[str, Optional[int]]:
+    """Current and peak resident set size, None where /proc is not available"""
+    memory = {"rss_kb": None, "peak_rss_kb": None}
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    memory["rss_kb"] = int(line.split()[1])
+                elif line.startswith("VmHWM:"):
+                    memory["peak_rss_kb"] = int(line.split()[1])
+    except OSError:
+        pass
+    return memory
+
+
+def percentile(ordered: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, int(round(fraction * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def summarize(latencies: List[float], errors: int, elapsed: float) -> Dict[str, float]:
+    ordered = sorted(latencies)
+    return {
+        "count": len(ordered),
+        "errors": errors,
+        "requests_per_second": len(ordered) / elapsed if elapsed else 0.0,
+        "mean_ms": sum(ordered) / len(ordered) * 1000 if ordered else 0.0,
+        "p50_ms": percentile(ordered, 0.50) * 1000,
+        "p95_ms": percentile(ordered, 0.95) * 1000,
+        "p99_ms": percentile(ordered, 0.99) * 1000,
+        "max_ms": ordered[-1] * 1000 if ordered else 0.0,
+    }
+
+
+class Recorder:
+    def __init__(self) -> None:
+        self.latencies: Dict[str, List[float]] = {route: [] for route in ROUTES}
+        self.errors: Dict[str, int] = {route: 0 for route in ROUTES}
+        self._lock = threading.Lock()
+
+    def record(self, route: str, elapsed: float, ok: bool) -> None:
+        with self._lock:
+            self.latencies[route].append(elapsed)
+            if not ok:
+                self.errors[route] += 1
+
+
+def run_flow(app_url: str, recorder: Recorder, flow: int) -> None:
+    """One browser session walking the OAuth flow and fetching the athletes"""
+    with requests.Session() as browser:
+        for route in ROUTES:
+            params = {"code": f"code-{flow}"} if route == "/callback" else None
+            started = time.perf_counter()
+            try:
+                ok = browser.get(app_url + route, params=params, timeout=60).status_code == 200
+            except requests.RequestException:
+                ok = False
+            recorder.record(route, time.perf_counter() - started, ok)
+
+
+def run_level(app_url: str, concurrency: int, flows: int) -> Dict:
+    recorder = Recorder()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(lambda flow: run_flow(app_url, recorder, flow), range(flows)))
+    elapsed = time.perf_counter() - started
+    all_latencies = [latency for route in ROUTES for latency in recorder.latencies[route]]
+    return {
+        "concurrency": concurrency,
+        "flows": flows,
+        "elapsed_seconds": elapsed,
+        "routes": {
+            route: summarize(recorder.latencies[route], recorder.errors[route], elapsed)
+            for route in ROUTES
+        },
+        "total": summarize(all_latencies, sum(recorder.errors.values()), elapsed),
+    }
+
+
+def get_git_revision() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_results(results: Dict, baseline: Dict = None) -> None:
+    baseline_levels = {
+        level["concurrency"]: level for level in (baseline or {}).get("levels", [])
+    }
+    header = (
+        f"{'conc':>5} {'route':<15}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+        f"{'errors':>8}"
+    )
+    if baseline is not None:
+        header += f"{'req/s vs':>10}{'p95 vs':>10}"
+    print(header)
+    for level in results["levels"]:
+        previous = baseline_levels.get(level["concurrency"])
+        rows = list(level["routes"].items()) + [("total", level["total"])]
+        for route, stats in rows:
+            line = (
+                f"{level['concurrency']:>5} {route:<15}{stats['requests_per_second']:>10.1f}"
+                f"{stats['p50_ms']:>10.2f}{stats['p95_ms']:>10.2f}{stats['p99_ms']:>10.2f}"
+                f"{stats['errors']:>8}"
+            )
+            if previous is not None:
+                old = previous["total"] if route == "total" else previous["routes"].get(route)
+                if old:
+                    line += f"{_change(old['requests_per_second'], stats['requests_per_second']):>10}"
+                    line += f"{_change(old['p95_ms'], stats['p95_ms']):>10}"
+            print(line)
+        memory = level["app_memory"]
+        print(f"{'':>5} app rss {memory['rss_kb']} kB, peak {memory['peak_rss_kb']} kB")
+
+
+def _change(old: float, new: float) -> str:
+    return f"{(new - old) / old * 100:+.1f}%" if old else "n/a"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--concurrency", default="1,8,32", help="comma separated levels")
+    parser.add_argument("--flows", type=int, default=200, help="sessions per level")
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="stub latency per call")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of stub calls failing")
+    parser.add_argument("--athletes", type=int, default=100, help="athletes the stub lists")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="results file, default benchmarks/results/load-<time>.json")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    args = parser.parse_args()
+
+    stub = StubTrainingPeaksServer(
+        latency_seconds=args.latency_ms / 1000,
+        error_rate=args.error_rate,
+        athlete_count=args.athletes,
+        seed=args.seed,
+    ).start()
+    port = get_free_port()
+    with tempfile.TemporaryDirectory() as directory:
+        write_app_config(directory, port, stub.base_url)
+        app = start_app(directory, port)
+        app_url = f"http://127.0.0.1:{port}"
+        try:
+            run_flow(app_url, Recorder(), -1)  # warm up imports and pools
+            levels = []
+            for concurrency in (int(level) for level in args.concurrency.split(",")):
+                level = run_level(app_url, concurrency, args.flows)
+                level["app_memory"] = read_memory_kb(app.pid)
+                levels.append(level)
+        finally:
+            app.terminate()
+            app.wait()
+            stub.stop()
+
+    started_at = datetime.datetime.now(datetime.timezone.utc)
+    results = {
+        "meta": {
+            "timestamp": started_at.isoformat(),
+            "git_revision": get_git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "stub": {
+                "latency_ms": args.latency_ms,
+                "error_rate": args.error_rate,
+                "athletes": args.athletes,
+                "failures": stub.failures,
+            },
+        },
+        "levels": levels,
+    }
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"load-{started_at.strftime('%Y%m%dT%H%M%SZ')}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as results_file:
+        json.dump(results, results_file, indent=2)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            baseline = json.load(baseline_file)
+    print_results(results, baseline)
+    # Routes render upstream failures into a 200 page, so count them at the stub
+    print(f"Injected stub failures: {stub.failures}")
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""Micro-benchmark of decoding token and athlete bodies, and of memory per athlete
+
+Usage:
+    python benchmarks/models_benchmark.py
+    python benchmarks/models_benchmark.py --athletes 1000 --number 2000
+
+Compares parsing a token body three times against decoding it once into a
+TokenPayload, and keeping athletes as dicts plus their pretty-printed string
+against keeping them as Athlete models serialized on first use.
+"""
+
+import argparse
+import gc
+import json
+import os
+import sys
+import timeit
+import tracemalloc
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(ROOT)
+from services.models import TokenPayload, decode_athletes
+
+TOKEN_BODY = json.dumps(
+    {
+        "access_token": "a" * 40,
+        "refresh_token": "r" * 40,
+        "expires_in": 3600,
+        "token_type": "bearer",
+    }
+)
+
+
+def build_athletes_body(count: int) -> str:
+    return json.dumps(
+        [
+            {
+                "Id": i,
+                "FirstName": "Athlete",
+                "LastName": str(i),
+                "Email": f"athlete{i}@example.com",
+                "Birthday": "1990-01-01",
+                "Sex": "F" if i % 2 else "M",
+                "Username": f"athlete{i}",
+            }
+            for i in range(count)
+        ]
+    )
+
+
+def parse_token_three_times():
+    return (
+        json.loads(TOKEN_BODY).get("refresh_token"),
+        json.loads(TOKEN_BODY).get("access_token"),
+        int(json.loads(TOKEN_BODY).get("expires_in")),
+    )
+
+
+def parse_token_once():
+    return TokenPayload.from_json(json.loads(TOKEN_BODY))
+
+
+def measure_bytes(build) -> int:
+    """Bytes still allocated by what build returns"""
+    gc.collect()
+    tracemalloc.start()
+    kept = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del kept
+    return size
+
+
+def best_per_call(function, number: int, repeat: int = 5) -> float:
+    return min(timeit.repeat(function, number=number, repeat=repeat)) / number
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--athletes", type=int, default=500)
+    parser.add_argument("--number", type=int, default=1000)
+    args = parser.parse_args()
+    athletes_body = build_athletes_body(args.athletes)
+
+    print(f"{'case':<40}{'us/call':>12}")
+    rows = [
+        ("token, json() three times", parse_token_three_times, args.number * 20),
+        ("token, decoded once", parse_token_once, args.number * 20),
+        (
+            f"athletes[{args.athletes}], indent=4 string",
+            lambda: json.dumps(json.loads(athletes_body), indent=4),
+            args.number // 10 or 1,
+        ),
+        (
+            f"athletes[{args.athletes}], Athlete models",
+            lambda: decode_athletes(json.loads(athletes_body)),
+            args.number // 10 or 1,
+        ),
+    ]
+    for name, function, number in rows:
+        print(f"{name:<40}{best_per_call(function, number) * 1e6:>12.2f}")
+
+    as_dicts = measure_bytes(lambda: json.loads(athletes_body))
+    as_string = measure_bytes(lambda: json.dumps(json.loads(athletes_body), indent=4))
+    as_models = measure_bytes(lambda: decode_athletes(json.loads(athletes_body)))
+    print()
+    print(f"{'kept per athlete':<40}{'bytes':>12}")
+    print(f"{'dicts':<40}{as_dicts / args.athletes:>12.0f}")
+    print(f"{'indent=4 string only':<40}{as_string / args.athletes:>12.0f}")
+    print(f"{'Athlete models':<40}{as_models / args.athletes:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
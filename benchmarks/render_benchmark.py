@@ -0,0 +1,100 @@
+"""Micro-benchmark of HtmlRenderer.render per call
+
+Usage:
+    python benchmarks/render_benchmark.py
+    python benchmarks/render_benchmark.py --baseline-rev <git revision>
+
+With --baseline-rev the services/html_renderer.py of that revision is timed
+against the working tree on the same states.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+import timeit
+import types
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(ROOT)
+from services.application_state import ApplicationState, Status
+from services.config_loader import Config
+from services.html_renderer import HtmlRenderer, RenderLinks
+from services.public_api import (
+    AuthorizationCodeResponse,
+    GetTokenResponse,
+    ListAthleteResponse,
+)
+
+TEST_CONFIG_PATH = os.path.join(ROOT, "tests", "config", "test_config.ini")
+
+
+def build_states(athlete_count: int):
+    authorized = ApplicationState(
+        authorization_code_request_status=Status.SUCCESS.value,
+        authorization_code_response=AuthorizationCodeResponse("code"),
+    )
+    token = ApplicationState(**vars(authorized))
+    token.token_code_request_status = Status.SUCCESS.value
+    token.token_code_response = GetTokenResponse("refresh", "access", time.time() + 3600)
+    athletes = ApplicationState(**vars(token))
+    athletes.list_athletes_request_status = Status.SUCCESS.value
+    athletes.list_athletes_response = ListAthleteResponse(
+        data=json.dumps(
+            [{"id": i, "name": f"Athlete {i}"} for i in range(athlete_count)], indent=4
+        ),
+        status_code=200,
+    )
+    return {
+        "initial": ApplicationState(),
+        "authorized": authorized,
+        "token": token,
+        f"athletes[{athlete_count}]": athletes,
+    }
+
+
+def load_baseline(revision: str):
+    source = subprocess.check_output(
+        ["git", "show", f"{revision}:services/html_renderer.py"], cwd=ROOT
+    )
+    module = types.ModuleType("baseline_html_renderer")
+    exec(compile(source, f"{revision}:services/html_renderer.py", "exec"), module.__dict__)
+    return module.HtmlRenderer
+
+
+def time_per_call(renderers, number: int, repeat: int = 7):
+    """Best time per call of each renderer, interleaved so machine noise hits both alike"""
+    best = [float("inf")] * len(renderers)
+    for _ in range(repeat):
+        for index, renderer in enumerate(renderers):
+            best[index] = min(best[index], timeit.timeit(renderer.render, number=number))
+    return [elapsed / number for elapsed in best]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--baseline-rev", help="git revision to compare against")
+    parser.add_argument("--number", type=int, default=20000)
+    parser.add_argument("--athletes", type=int, default=100)
+    args = parser.parse_args()
+
+    config = Config(TEST_CONFIG_PATH)
+    links = RenderLinks.from_config(config)
+    baseline = load_baseline(args.baseline_rev) if args.baseline_rev else None
+
+    print(f"{'state':<16}{'current us/call':>18}{'baseline us/call':>18}{'speedup':>10}")
+    for name, state in build_states(args.athletes).items():
+        renderers = [HtmlRenderer(config=config, state=state, links=links)]
+        if baseline is not None:
+            renderers.append(baseline(config=config, state=state))
+        timings = time_per_call(renderers, args.number)
+        line = f"{name:<16}{timings[0] * 1e6:>18.2f}"
+        if baseline is not None:
+            line += f"{timings[1] * 1e6:>18.2f}{timings[1] / timings[0]:>9.2f}x"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
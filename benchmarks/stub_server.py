@@ -0,0 +1,145 @@
+"""Local stand-in for the TrainingPeaks OAuth server and Public API
+
+Usage:
+    python benchmarks/stub_server.py --port 8765 --latency-ms 50 --error-rate 0.01 --athletes 500
+
+Serves POST /OAuth/Token for both grant types and GET /v1/coach/athletes,
+each after the configured latency, failing the configured share of calls
+with a 500 and listing the configured number of athletes.
+"""
+
+import argparse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import random
+import secrets
+import threading
+import time
+from urllib.parse import parse_qs
+
+TOKEN_PATH = "/OAuth/Token"
+LIST_ATHLETES_PATH = "/v1/coach/athletes"
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: "StubTrainingPeaksServer"
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.path != TOKEN_PATH:
+            return self._send(404, b"")
+        form = parse_qs(body.decode())
+        if form.get("grant_type") not in (["authorization_code"], ["refresh_token"]):
+            return self._send(400, b'{"error": "unsupported_grant_type"}')
+        if self.server.should_fail("token"):
+            return self._send(500, b'{"error": "server_error"}')
+        token = {
+            "access_token": secrets.token_urlsafe(24),
+            "refresh_token": secrets.token_urlsafe(24),
+            "token_type": "bearer",
+            "expires_in": 3600,
+        }
+        return self._send(200, json.dumps(token).encode())
+
+    def do_GET(self):
+        if self.path.split("?")[0] != LIST_ATHLETES_PATH:
+            return self._send(404, b"")
+        if not self.headers.get("Authorization", "").startswith("Bearer "):
+            return self._send(401, b"")
+        if self.server.should_fail("athletes"):
+            return self._send(500, b"")
+        return self._send(200, self.server.athletes_payload)
+
+    def _send(self, status: int, body: bytes) -> None:
+        if self.server.latency_seconds:
+            time.sleep(self.server.latency_seconds)
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class StubTrainingPeaksServer(ThreadingHTTPServer):
+    """Threaded stub with configurable latency, error rate and List Athletes payload size"""
+
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(
+        self,
+        address=("127.0.0.1", 0),
+        latency_seconds: float = 0.0,
+        error_rate: float = 0.0,
+        athlete_count: int = 100,
+        seed: int = None,
+    ) -> None:
+        super().__init__(address, StubHandler)
+        self.latency_seconds = latency_seconds
+        self.error_rate = error_rate
+        self.athletes_payload = json.dumps(
+            [
+                {
+                    "Id": i,
+                    "FirstName": "Athlete",
+                    "LastName": str(i),
+                    "Email": f"athlete{i}@example.com",
+                }
+                for i in range(athlete_count)
+            ]
+        ).encode()
+        self.failures = {"token": 0, "athletes": 0}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._thread: threading.Thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def should_fail(self, kind: str) -> bool:
+        with self._lock:
+            if self._random.random() >= self.error_rate:
+                return False
+            self.failures[kind] += 1
+            return True
+
+    def start(self) -> "StubTrainingPeaksServer":
+        self._thread = threading.Thread(target=self.serve_forever, args=(0.05,), daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--athletes", type=int, default=100)
+    args = parser.parse_args()
+
+    server = StubTrainingPeaksServer(
+        (args.host, args.port),
+        latency_seconds=args.latency_ms / 1000,
+        error_rate=args.error_rate,
+        athlete_count=args.athletes,
+    )
+    print(f"Serving {server.base_url}{TOKEN_PATH} and {server.base_url}{LIST_ATHLETES_PATH}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
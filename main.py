@@ -1,10 +1,45 @@
 """Module providing a basic OAuth2.0 implementation for use with TrainingPeaks Public API"""
 
+import atexit
 import os
-from flask import Flask, request
-from services.config_loader import Config
-from services.application_state import Status
-from services.html_renderer import HtmlRenderer
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Callable, Iterator, Optional, Tuple
+from flask import Flask, Response, abort, g, make_response, request, session
+from services.client_registry import ClientRegistry, OAuthClient, make_state_key, split_state_key
+from services.config_loader import CLIENTS_PATH, DEFAULT_CLIENT, Config
+from services.config_manager import ConfigManager
+from services.connection_warmer import ConnectionWarmer, WarmTarget
+from services.profiler import RouteProfiler
+from services.circuit_breaker import CircuitBreaker
+from services.compression import Compressor
+from services.deadline import Deadline
+from services.application_state import ApplicationState, Status
+from services.html_renderer import HtmlRenderer, RenderLinks, TimedHtmlRenderer
+from services.json_api import (
+    API_PATH,
+    AUTHORIZATION_REQUIRED_ERROR,
+    JSON_CONTENT_TYPE,
+    TOKEN_EXPIRED_ERROR,
+    TOKEN_REQUIRED_ERROR,
+    athletes_body,
+    dumps,
+    error_body,
+    failure_body,
+    failure_status,
+    token_body,
+)
+from services import metrics
+from services.models import INVALID_GRANT_ERROR, ApiError
+from services.response_cache import ResponseCache
+from services.roster_sync import RosterDelta, RosterSync
+from services.session_store import SessionStore
+from services.shared_session_store import SharedSessionStore
+from services.single_flight import SingleFlight
+from services.token_refresher import RefreshFailed, TokenRefreshScheduler
+from services.token_store import TokenStore
+from services.upstream_timing import SlowCallLog
 from services.public_api import (
     AuthorizationCodeResponse,
     GetTokenRequest,
@@ -14,108 +49,750 @@ from services.public_api import (
     RefreshTokenRequest,
 )
 
+config_manager = ConfigManager()
+# Pools, stores and limits are sized from the snapshot at startup, routes read current_config()
+config: Config = config_manager.current
+if config.config_reload.enabled:
+    config_manager.start()
+    atexit.register(config_manager.stop)
+token_store: TokenStore = None
+if config.token_store.enabled:
+    token_store = TokenStore(
+        config.token_store.path,
+        flush_interval_seconds=config.token_store.flush_interval_seconds,
+        max_age_seconds=config.token_store.max_age_days * 24 * 3600,
+    )
+    token_store.load()
+    token_store.start()
+    atexit.register(token_store.close)
+
 app = Flask(__name__)
-app.secret_key = os.urandom(24)
-config: Config = Config()
-html_renderer = HtmlRenderer(config=config)
+# Session cookies must stay valid across restarts for persisted tokens to be found again
+app.secret_key = config.server.secret_key or (
+    token_store.get_secret_key() if token_store is not None else os.urandom(24)
+)
+circuit_breaker: CircuitBreaker = None
+if config.circuit_breaker.enabled:
+    # Shared by every client, an endpoint that is down is down for all of them
+    circuit_breaker = CircuitBreaker(
+        failure_threshold=config.circuit_breaker.failure_threshold,
+        reset_timeout_seconds=config.circuit_breaker.reset_timeout_seconds,
+    )
+slow_call_log: SlowCallLog = None
+if config.http.phase_timing:
+    slow_call_log = SlowCallLog(
+        threshold_seconds=config.http.slow_call_seconds, max_entries=config.http.max_slow_calls
+    )
+# Every OAuth client gets its own connection pool and rate limit, built on first use
+clients = ClientRegistry(
+    http_config=config.http, circuit_breaker=circuit_breaker, slow_call_log=slow_call_log
+)
+list_athletes_cache = ResponseCache(
+    max_entries=config.response_cache.max_entries,
+    ttl_seconds=config.response_cache.ttl_seconds,
+)
+
+
+def get_warm_targets() -> Iterator[WarmTarget]:
+    """The token and List Athletes urls of every client, with the pool each is called through"""
+    snapshot = config_manager.current
+    for name in snapshot.clients:
+        client = clients.get(snapshot, name)
+        yield client.http_client, client.oauth.token_url
+        yield client.http_client, client.public_api.list_athletes_endpoint
+
+
+connection_warmer = ConnectionWarmer(
+    get_targets=get_warm_targets,
+    connections_per_host=config.connection_warmup.connections_per_host,
+    keepalive_interval_seconds=config.connection_warmup.keepalive_interval_seconds,
+)
+if config.connection_warmup.enabled:
+    # Before the server accepts traffic, serve.py's workers warm their own pools after forking
+    connection_warmer.warm()
+    if config.connection_warmup.keepalive_interval_seconds > 0:
+        connection_warmer.start()
+        atexit.register(connection_warmer.stop)
+
+compressor: Compressor = None
+if config.compression.enabled:
+    compressor = Compressor(
+        min_size_bytes=config.compression.min_size_bytes,
+        gzip_level=config.compression.gzip_level,
+        brotli_quality=config.compression.brotli_quality,
+        max_entries=config.compression.cache_entries,
+        compress_html=config.compression.compress_html,
+    )
+
+profiler: RouteProfiler = None
+if config.profiling.enabled:
+    profiler = RouteProfiler(
+        directory=config.profiling.directory,
+        sample_rate=config.profiling.sample_rate,
+        header=config.profiling.header,
+        header_secret=config.profiling.header_secret,
+        max_profiles=config.profiling.max_profiles,
+    )
+
+
+roster_sync: RosterSync = None
+if config.roster_sync.enabled:
+    roster_sync = RosterSync(
+        id_field=config.roster_sync.id_field, max_rosters=config.session.max_sessions
+    )
+
+
+def restore_session(state_key: str) -> Optional[ApplicationState]:
+    """Rebuild a session from the token persisted for it before a restart"""
+    token = token_store.get(state_key) if token_store is not None else None
+    if token is None:
+        return None
+    # Kept fresh like a newly issued token, one that expired meanwhile is refreshed right away
+    token_refresher.schedule(state_key, token)
+    return ApplicationState(
+        authorization_code_request_status=Status.SUCCESS.value,
+        token_code_request_status=Status.SUCCESS.value,
+        token_code_response=token,
+    )
 
 
-@app.route("/")
-def home():
+if config.session.backend == "sqlite":
+    # Worker processes started by serve.py find each other's sessions here
+    session_store = SharedSessionStore(
+        config.session.path,
+        max_sessions=config.session.max_sessions,
+        ttl_seconds=config.session.ttl_seconds,
+        restore=restore_session,
+    )
+else:
+    session_store = SessionStore(
+        max_sessions=config.session.max_sessions,
+        ttl_seconds=config.session.ttl_seconds,
+        restore=restore_session,
+    )
+
+
+def get_session_id() -> str:
+    """Get the id of the current user's session, issuing one on first visit"""
+    if "session_id" not in session:
+        session["session_id"] = SessionStore.new_session_id()
+    return session["session_id"]
+
+
+def get_state_key(client: str) -> str:
+    """Key of the current user's state for a client, each client keeps its own tokens"""
+    return make_state_key(client, get_session_id())
+
+
+def current_config() -> Config:
+    """The config snapshot this request started on, reloads meanwhile do not affect it"""
+    if "config" not in g:
+        g.config = config_manager.current
+    return g.config
+
+
+def current_client(name: str) -> OAuthClient:
+    """The named client of this request's snapshot, 404 if the snapshot does not define it"""
+    client = clients.get(current_config(), name)
+    if client is None:
+        abort(404)
+    return client
+
+
+@lru_cache(maxsize=16)
+def get_render_links(snapshot: Config, client: str) -> RenderLinks:
+    return RenderLinks.from_config(snapshot, client)
+
+
+@contextmanager
+def session_state(client: str) -> Iterator[ApplicationState]:
+    """Lock the current user's state for the client for the duration of the request"""
+    current_client(client)
+    with session_store.session(get_state_key(client)) as state:
+        yield state
+
+
+@contextmanager
+def session_renderer(client: str) -> Iterator[HtmlRenderer]:
+    """Render the current user's state for the client, locked like session_state"""
+    with session_state(client) as state:
+        snapshot = current_config()
+        html_renderer = TimedHtmlRenderer(
+            config=snapshot, state=state, links=get_render_links(snapshot, client)
+        )
+        yield html_renderer
+    # Observed by record_duration, so rendering is timed once per request
+    g.render_timing = html_renderer.render_timing
+
+
+def is_token_issued(result: Tuple[Optional[GetTokenResponse], Optional[ApiError]]) -> bool:
+    response, _ = result
+    return response is not None
+
+
+# Failed refreshes are not handed to later callers, they call upstream again
+token_refresh_flight = SingleFlight(
+    linger_seconds=config.token_refresh.coalesce_seconds, should_linger=is_token_issued
+)
+
+
+def refresh_access_token(
+    refresh_token: str, client: str = DEFAULT_CLIENT, deadline: Deadline = None
+) -> Tuple[Optional[GetTokenResponse], Optional[ApiError]]:
+    """Refresh a token, concurrent refreshes of the same refresh token share one upstream call
+
+    Returns the new token, or the failure of the call when there is none.
+    """
+    oauth_client = clients.get(config_manager.current, client)
+    if oauth_client is None:
+        return None, None
+
+    def refresh() -> Tuple[Optional[GetTokenResponse], Optional[ApiError]]:
+        request = RefreshTokenRequest(refresh_token)
+        response = request.execute(
+            oauth_client.oauth.token_url,
+            oauth_client.oauth.client_id,
+            oauth_client.oauth.client_secret,
+            http_client=oauth_client.http_client,
+            deadline=deadline,
+        )
+        return response, request.failure
+
+    return token_refresh_flight.do((client, refresh_token), refresh)
+
+
+def refresh_session_token(state_key: str) -> Optional[GetTokenResponse]:
+    """Refresh a session's token in the background before it expires
+
+    Under serve.py every worker schedules the sessions it served, so the token
+    is checked once the session is held. One that is not due any more was
+    refreshed meanwhile, e.g. by another worker, and is scheduled instead.
+    Only a rejected refresh token stops the refreshes, any other failure raises
+    RefreshFailed so the scheduler tries again while the token is still valid.
+    """
+    client, _ = split_state_key(state_key)
+    with session_store.existing_session(state_key) as state:
+        if state is None or not state.is_token_complete():
+            return None
+        if not token_refresher.is_due(state.token_code_response):
+            return state.token_code_response
+        response, failure = refresh_access_token(state.token_code_response.refresh_token, client)
+        if response is None:
+            if failure is None or failure.error == INVALID_GRANT_ERROR:
+                # The client was removed, or the refresh token is no good any more
+                return None
+            raise RefreshFailed(failure.message)
+        state.token_code_response = response
+        if token_store is not None:
+            token_store.put(state_key, response)
+        return response
+
+
+token_refresher = TokenRefreshScheduler(
+    refresh=refresh_session_token,
+    margin_seconds=config.token_refresh.margin_seconds,
+    jitter_seconds=config.token_refresh.jitter_seconds,
+)
+if config.token_refresh.enabled:
+    token_refresher.start()
+    atexit.register(token_refresher.stop)
+
+
+def token_issued(state_key: str, response: GetTokenResponse) -> None:
+    """Keep a newly issued token fresh and durable"""
+    token_refresher.schedule(state_key, response)
+    if token_store is not None:
+        token_store.put(state_key, response)
+
+
+metrics.registry.function(
+    "tp_sessions", "Sessions held in memory", lambda: len(session_store)
+)
+metrics.registry.function(
+    "tp_token_refreshes_scheduled",
+    "Sessions with a pending background refresh",
+    lambda: len(token_refresher),
+)
+metrics.registry.function(
+    "tp_token_refresh_calls_total",
+    "Token refreshes requested",
+    lambda: token_refresh_flight.stats().calls,
+    metric_type="counter",
+)
+metrics.registry.function(
+    "tp_token_refresh_coalesced_total",
+    "Token refreshes answered by a concurrent or recent refresh",
+    lambda: token_refresh_flight.stats().coalesced,
+    metric_type="counter",
+)
+for stat in ("hits", "revalidations", "misses", "evictions"):
+    metrics.registry.function(
+        f"tp_list_athletes_cache_{stat}_total",
+        f"List Athletes response cache {stat}",
+        lambda stat=stat: getattr(list_athletes_cache.stats(), stat),
+        metric_type="counter",
+    )
+metrics.registry.function(
+    "tp_config_reloads_total",
+    "Config snapshots swapped in after the file changed",
+    lambda: config_manager.reloads,
+    metric_type="counter",
+)
+metrics.registry.function(
+    "tp_config_reload_failures_total",
+    "Config changes rejected as invalid, the previous snapshot stays in use",
+    lambda: config_manager.failures,
+    metric_type="counter",
+)
+metrics.registry.function(
+    "tp_oauth_clients", "OAuth clients with a connection pool", lambda: len(clients)
+)
+if roster_sync is not None:
+    ROSTER_CHANGES = metrics.registry.counter(
+        "tp_roster_athletes_changed_total", "Athletes added, changed or removed by roster syncs", ("change",)
+    )
+
+    def count_roster_changes(_, delta: RosterDelta) -> None:
+        ROSTER_CHANGES.inc("added", amount=len(delta.added))
+        ROSTER_CHANGES.inc("changed", amount=len(delta.changed))
+        ROSTER_CHANGES.inc("removed", amount=len(delta.removed))
+
+    roster_sync.subscribe(count_roster_changes)
+if circuit_breaker is not None:
+    metrics.registry.function(
+        "tp_circuit_breakers_open",
+        "Upstream endpoints whose circuit is open or half-open",
+        circuit_breaker.count_open,
+    )
+    metrics.registry.function(
+        "tp_circuit_breaker_rejected_total",
+        "Upstream calls failed fast while their circuit was open",
+        lambda: circuit_breaker.rejected,
+        metric_type="counter",
+    )
+if compressor is not None:
+    for stat in ("hits", "misses", "evictions", "bytes_in", "bytes_out"):
+        metrics.registry.function(
+            f"tp_compression_{stat}_total",
+            f"Response compression {stat.replace('_', ' ')}",
+            lambda stat=stat: getattr(compressor.stats(), stat),
+            metric_type="counter",
+        )
+    metrics.registry.function(
+        "tp_compression_cpu_seconds_total",
+        "CPU time spent compressing response bodies",
+        lambda: compressor.stats().cpu_seconds,
+        metric_type="counter",
+    )
+if profiler is not None:
+    metrics.registry.function(
+        "tp_profiles_written_total",
+        "Route calls profiled",
+        lambda: profiler.written,
+        metric_type="counter",
+    )
+    metrics.registry.function(
+        "tp_profiles_skipped_total",
+        "Route calls picked for profiling while another profiler was active",
+        lambda: profiler.skipped,
+        metric_type="counter",
+    )
+if slow_call_log is not None:
+    metrics.registry.function(
+        "tp_upstream_slow_calls_total",
+        f"Upstream calls that took {config.http.slow_call_seconds}s or longer",
+        lambda: slow_call_log.recorded,
+        metric_type="counter",
+    )
+metrics.registry.function(
+    "tp_connections_warmed_total",
+    "Pooled upstream connections opened or kept alive ahead of requests",
+    lambda: connection_warmer.warmed,
+    metric_type="counter",
+)
+metrics.registry.function(
+    "tp_connection_warmup_failures_total",
+    "Warm-ups of an upstream host that failed",
+    lambda: connection_warmer.failures,
+    metric_type="counter",
+)
+if token_store is not None:
+    metrics.registry.function("tp_token_store_tokens", "Tokens persisted", lambda: len(token_store))
+
+
+@app.before_request
+def start_timer():
+    g.request_started = time.perf_counter()
+    # Upstream calls of this request share one time budget
+    g.deadline = Deadline(current_config().http.deadline_seconds)
+
+
+@app.after_request
+def record_duration(response):
+    """Time every route by its rule, so ids in urls do not add series, and the page it rendered"""
+    started = g.pop("request_started", None)
+    if started is not None:
+        rule = request.url_rule.rule if request.url_rule is not None else "unmatched"
+        metrics.ROUTE_REQUEST_DURATION.observe(
+            time.perf_counter() - started, rule, request.method, str(response.status_code)
+        )
+    render_timing = g.pop("render_timing", None)
+    if render_timing is not None:
+        metrics.RENDER_DURATION.observe(*render_timing)
+    return response
+
+
+@app.after_request
+def compress_response(response):
+    """Compress bodies the client accepts compressed, runs before record_duration so it is timed"""
+    if compressor is None or not compressor.compresses(response.mimetype):
+        return response
+    response.vary.add("Accept-Encoding")
+    if (
+        response.status_code != 200
+        or response.is_streamed
+        or response.direct_passthrough
+        or "Content-Encoding" in response.headers
+    ):
+        return response
+    encoding = compressor.negotiate(request.headers.get("Accept-Encoding"))
+    body = response.get_data()
+    if encoding is None or not compressor.should_compress(body):
+        return response
+    etag, weak = response.get_etag()
+    response.set_data(compressor.compress(body, encoding, None if weak else etag))
+    response.headers["Content-Encoding"] = encoding
+    if etag:
+        # The compressed bytes differ, but the page is the same and If-None-Match still matches
+        response.set_etag(etag, weak=True)
+    return response
+
+
+@app.route("/metrics")
+def get_metrics():
+    """Expose latency histograms and counters in the Prometheus text format"""
+    return Response(metrics.registry.render(), content_type=metrics.CONTENT_TYPE)
+
+
+def client_route(rule: str, **options) -> Callable:
+    """Serve a view at rule for the default client and below /clients/<client> for named ones"""
+    def decorator(view: Callable) -> Callable:
+        # Unwrapped while profiling is disabled, so it costs nothing then
+        view_func = view if profiler is None else profiler.wrap(view, lambda: request.headers)
+        app.add_url_rule(rule, view_func=view_func, defaults={"client": DEFAULT_CLIENT}, **options)
+        app.add_url_rule(f"{CLIENTS_PATH}/<client>{rule}", view_func=view_func, **options)
+        return view
+    return decorator
+
+
+def sync_roster(
+    state_key: str, previous: ListAthleteResponse, response: ListAthleteResponse
+) -> ListAthleteResponse:
+    """Sync the session's roster index, keeping the rendered previous response if nothing changed"""
+    if roster_sync is None or not isinstance(response.athletes, tuple):
+        return response
+    delta: RosterDelta = roster_sync.sync(state_key, response.athletes)
+    if (
+        delta.is_empty()
+        and not delta.reordered
+        and previous.status_code == response.status_code
+        # A streamed roster moves the index on without updating the session's response
+        and roster_sync.is_built_from(state_key, previous.athletes)
+    ):
+        # Same athletes in the same order, so the pretty-printed roster is reused as is
+        return previous
+    return response
+
+
+@client_route("/")
+def home(client: str):
     """Entrypoint of the Application"""
-    return html_renderer.render()
+    with session_renderer(client) as html_renderer:
+        response = make_response(html_renderer.render())
+    # Browsers revalidate with If-None-Match and get a 304 while the state is unchanged
+    response.add_etag()
+    response.headers["Cache-Control"] = "no-cache"
+    return response.make_conditional(request)
 
 
-@app.route("/callback")
-def callback():
-    """Handle callback from Authorization call"""
-    if "code" not in request.args:
+# Steps of the HTML views shared with async_main.py, which awaits the upstream calls between them
+
+
+def handle_callback(html_renderer: HtmlRenderer, code: Optional[str]) -> str:
+    """Record the Authorization Code the user was redirected back with"""
+    if code is None:
         html_renderer.state.authorization_code_request_status = Status.FAILURE.value
         html_renderer.set_authorization_exception()
     else:
         html_renderer.clear_exceptions()
         html_renderer.state.authorization_code_request_status = Status.SUCCESS.value
         html_renderer.state.authorization_code_response = AuthorizationCodeResponse(
-            authorization_code=request.args.get("code")
+            authorization_code=code
         )
     return html_renderer.render()
 
 
-@app.route("/get-token")
-def get_token():
-    """Use the Authoization Code to get an Access Token"""
+def check_get_token(html_renderer: HtmlRenderer) -> Optional[str]:
+    """The page to show instead of getting a token, None once the call may go ahead"""
     if not html_renderer.state.is_authorization_complete():
         return html_renderer.render()
-    response: GetTokenResponse = GetTokenRequest(
-        html_renderer.state.authorization_code_response.authorization_code,
-        config.server.get_redirect_uri()
-    ).execute(
-        config.oauth.token_url, 
-        config.oauth.client_id, 
-        config.oauth.client_secret
-    )
+    return None
 
-    if response:
-        html_renderer.clear_exceptions()
-        html_renderer.state.token_code_request_status = Status.SUCCESS.value
-        html_renderer.state.token_code_response = response
-    else:
-        html_renderer.state.token_code_request_status = Status.FAILURE.value
-        html_renderer.set_token_exception()
-    return html_renderer.render()
 
-
-@app.route("/refresh-token")
-def refresh_token():
-    """Use the Refresh Token to get a new Access Token"""
+def check_refresh_token(html_renderer: HtmlRenderer) -> Optional[str]:
+    """The page to show instead of refreshing the token, None once the call may go ahead"""
     if (
         not html_renderer.state.is_authorization_complete()
         or not html_renderer.state.is_token_complete()
     ):
         return html_renderer.render()
+    return None
 
-    response: GetTokenResponse = RefreshTokenRequest(
-        html_renderer.state.token_code_response.refresh_token
-    ).execute(config.oauth.token_url, config.oauth.client_id, config.oauth.client_secret)
 
-    if response:
-        html_renderer.clear_exceptions()
-        html_renderer.state.token_code_request_status = Status.SUCCESS.value
-        html_renderer.state.token_code_response = response
-    else:
-        html_renderer.state.token_code_request_status = Status.FAILURE.value
-        html_renderer.set_token_exception()
-    return html_renderer.render()
-
-
-@app.route("/get-test-data")
-def get_data():
-    """Makes a GET request using the obtained token"""
+def check_get_data(html_renderer: HtmlRenderer) -> Optional[str]:
+    """The page to show instead of listing athletes, None once the call may go ahead"""
     if (
         not html_renderer.state.is_authorization_complete()
         or not html_renderer.state.is_token_complete()
     ):
         return html_renderer.render()
-
     if html_renderer.state.token_code_response.is_token_expired():
         html_renderer.state.token_code_request_status = Status.EXPIRED.value
         html_renderer.set_token_expired_exception()
         return html_renderer.render()
+    return None
 
-    response: ListAthleteResponse = ListAthleteRequest().execute(
-        config.public_api.list_athletes_endpoint,
-        html_renderer.state.token_code_response.access_token,
-    )
 
+def finish_token_call(
+    html_renderer: HtmlRenderer,
+    state_key: str,
+    response: Optional[GetTokenResponse],
+    failure: Optional[ApiError],
+) -> str:
+    """Show the token a Get or Refresh Token call issued, or its failure"""
+    if response:
+        html_renderer.clear_exceptions()
+        html_renderer.state.token_code_request_status = Status.SUCCESS.value
+        html_renderer.state.token_code_response = response
+        token_issued(state_key, response)
+    else:
+        html_renderer.set_token_failure(failure)
+    return html_renderer.render()
+
+
+def finish_get_data(
+    html_renderer: HtmlRenderer,
+    state_key: str,
+    response: Optional[ListAthleteResponse],
+    failure: Optional[ApiError],
+) -> str:
+    """Show the athletes a List Athletes call returned, or its failure"""
     if response:
         html_renderer.clear_exceptions()
         html_renderer.state.list_athletes_request_status = Status.SUCCESS.value
-        html_renderer.state.list_athletes_response = response
+        html_renderer.state.list_athletes_response = sync_roster(
+            state_key, html_renderer.state.list_athletes_response, response
+        )
     else:
-        html_renderer.state.list_athletes_request_status = Status.FAILURE.value
-        html_renderer.set_list_athlete_exception(response.status_code, response.message)
+        html_renderer.set_list_athletes_failure(failure)
     return html_renderer.render()
 
 
+@client_route("/callback")
+def callback(client: str):
+    """Handle callback from Authorization call"""
+    with session_renderer(client) as html_renderer:
+        return handle_callback(html_renderer, request.args.get("code"))
+
+
+@client_route("/get-token")
+def get_token(client: str):
+    """Use the Authoization Code to get an Access Token"""
+    with session_renderer(client) as html_renderer:
+        page = check_get_token(html_renderer)
+        if page is not None:
+            return page
+        oauth_client = current_client(client)
+        get_token_request = GetTokenRequest(
+            html_renderer.state.authorization_code_response.authorization_code,
+            current_config().server.get_redirect_uri(client)
+        )
+        response: GetTokenResponse = get_token_request.execute(
+            oauth_client.oauth.token_url, 
+            oauth_client.oauth.client_id, 
+            oauth_client.oauth.client_secret,
+            http_client=oauth_client.http_client,
+            deadline=g.deadline,
+        )
+        return finish_token_call(
+            html_renderer, get_state_key(client), response, get_token_request.failure
+        )
+
+
+@client_route("/refresh-token")
+def refresh_token(client: str):
+    """Use the Refresh Token to get a new Access Token"""
+    with session_renderer(client) as html_renderer:
+        page = check_refresh_token(html_renderer)
+        if page is not None:
+            return page
+        response, failure = refresh_access_token(
+            html_renderer.state.token_code_response.refresh_token, client, g.deadline
+        )
+        return finish_token_call(html_renderer, get_state_key(client), response, failure)
+
+
+@client_route("/get-test-data")
+def get_data(client: str):
+    """Makes a GET request using the obtained token"""
+    with session_renderer(client) as html_renderer:
+        page = check_get_data(html_renderer)
+        if page is not None:
+            return page
+        oauth_client = current_client(client)
+        list_athlete_request = ListAthleteRequest()
+        response: ListAthleteResponse = list_athlete_request.execute(
+            oauth_client.public_api.list_athletes_endpoint,
+            html_renderer.state.token_code_response.access_token,
+            http_client=oauth_client.http_client,
+            cache=list_athletes_cache,
+            deadline=g.deadline,
+        )
+        return finish_get_data(
+            html_renderer, get_state_key(client), response, list_athlete_request.failure
+        )
+
+
+@client_route("/stream-test-data")
+def stream_data(client: str):
+    """Streams the athletes from a GET request using the obtained token"""
+    with session_renderer(client) as html_renderer:
+        page = check_get_data(html_renderer)
+        if page is not None:
+            return page
+        oauth_client = current_client(client)
+        list_athlete_request = ListAthleteRequest()
+        athletes = list_athlete_request.execute_stream(
+            oauth_client.public_api.list_athletes_endpoint,
+            html_renderer.state.token_code_response.access_token,
+            http_client=oauth_client.http_client,
+            deadline=g.deadline,
+        )
+
+        if athletes is None:
+            html_renderer.set_list_athletes_failure(list_athlete_request.failure)
+            return html_renderer.render()
+        html_renderer.clear_exceptions()
+        if roster_sync is not None:
+            athletes = roster_sync.track(get_state_key(client), athletes)
+        # The page around the athletes is rendered before the session lock is released
+        return Response(html_renderer.render_stream(athletes), mimetype="text/html")
+
+
+def json_response(body: str, status: int = 200) -> Response:
+    return Response(body, status=status, mimetype=JSON_CONTENT_TYPE)
+
+
+def api_error(status: int, error: str, description: str) -> Response:
+    return json_response(error_body(error, description), status)
+
+
+def api_failure(failure: Optional[ApiError]) -> Response:
+    return json_response(failure_body(failure), failure_status(failure))
+
+
+def store_token(state: ApplicationState, client: str, response: GetTokenResponse) -> None:
+    state.exception_text = ""
+    state.token_code_request_status = Status.SUCCESS.value
+    state.token_code_response = response
+    token_issued(get_state_key(client), response)
+
+
+@app.route("/slow-calls")
+def get_slow_calls():
+    """The most recent slow upstream calls with the time of each phase, oldest first"""
+    entries = slow_call_log.entries() if slow_call_log is not None else []
+    return json_response(dumps([timing.to_dict() for timing in entries]))
+
+
+@client_route(f"{API_PATH}/token", methods=["GET"])
+def api_get_token(client: str):
+    """The current user's token, without calling upstream"""
+    with session_state(client) as state:
+        if not state.is_token_complete():
+            return api_error(401, TOKEN_REQUIRED_ERROR, "Get a token first")
+        return json_response(token_body(state.token_code_response))
+
+
+@client_route(f"{API_PATH}/token", methods=["POST"])
+def api_create_token(client: str):
+    """Exchange the Authorization Code for a token, like /get-token"""
+    with session_state(client) as state:
+        if not state.is_authorization_complete():
+            return api_error(401, AUTHORIZATION_REQUIRED_ERROR, "Authorize the application first")
+        oauth_client = current_client(client)
+        get_token_request = GetTokenRequest(
+            state.authorization_code_response.authorization_code,
+            current_config().server.get_redirect_uri(client)
+        )
+        response = get_token_request.execute(
+            oauth_client.oauth.token_url,
+            oauth_client.oauth.client_id,
+            oauth_client.oauth.client_secret,
+            http_client=oauth_client.http_client,
+            deadline=g.deadline,
+        )
+        if not response:
+            return api_failure(get_token_request.failure)
+        store_token(state, client, response)
+        return json_response(token_body(response))
+
+
+@client_route(f"{API_PATH}/token/refresh", methods=["POST"])
+def api_refresh_token(client: str):
+    """Refresh the current user's token, like /refresh-token"""
+    with session_state(client) as state:
+        if not state.is_token_complete():
+            return api_error(401, TOKEN_REQUIRED_ERROR, "Get a token first")
+        response, failure = refresh_access_token(
+            state.token_code_response.refresh_token, client, g.deadline
+        )
+        if not response:
+            return api_failure(failure)
+        store_token(state, client, response)
+        return json_response(token_body(response))
+
+
+@client_route(f"{API_PATH}/athletes")
+def api_athletes(client: str):
+    """The coach's athletes, like /get-test-data"""
+    with session_state(client) as state:
+        if not state.is_token_complete():
+            return api_error(401, TOKEN_REQUIRED_ERROR, "Get a token first")
+        if state.token_code_response.is_token_expired():
+            return api_error(401, TOKEN_EXPIRED_ERROR, "Refresh the token first")
+
+        oauth_client = current_client(client)
+        list_athlete_request = ListAthleteRequest()
+        response = list_athlete_request.execute(
+            oauth_client.public_api.list_athletes_endpoint,
+            state.token_code_response.access_token,
+            http_client=oauth_client.http_client,
+            cache=list_athletes_cache,
+            deadline=g.deadline,
+        )
+        if not response:
+            return api_failure(list_athlete_request.failure)
+        state.exception_text = ""
+        state.list_athletes_request_status = Status.SUCCESS.value
+        state.list_athletes_response = sync_roster(
+            get_state_key(client), state.list_athletes_response, response
+        )
+    result = json_response(athletes_body(response))
+    # Clients polling an unchanged roster get a 304 without the body
+    result.add_etag()
+    return result.make_conditional(request)
+
+
 if __name__ == "__main__":
     app.run(port=config.server.local_port)
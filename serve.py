@@ -0,0 +1,140 @@
+"""Production server that pre-forks worker processes sharing one listening socket
+
+Usage:
+    python serve.py --workers 4 --host 0.0.0.0 --port 8080
+
+The socket is bound once and inherited by every worker, so the kernel spreads
+connections across them. Sessions are kept in the SQLite store of the
+[session] section, so a user's /callback and /get-token may land on different
+workers. Workers that exit are replaced, SIGTERM or Ctrl+C stops them all.
+Every worker serves its own /metrics, labelled with its process id as worker.
+"""
+
+import argparse
+import os
+import secrets
+import signal
+import socket
+import sys
+import threading
+import time
+from typing import Dict
+
+from services.config_loader import Config
+
+SHUTDOWN_GRACE_SECONDS = 10
+# A worker dying sooner than this after its start is not respawned straight away
+RESPAWN_BACKOFF_SECONDS = 1
+
+
+class ServerStopping(Exception):
+    """Raised in the supervisor by SIGTERM and SIGINT"""
+
+
+def share_state_between_workers(config: Config, workers: int) -> None:
+    """Settings every worker must agree on, passed as environment overrides before forking"""
+    if workers > 1 and config.session.backend != "sqlite":
+        os.environ["TP_SESSION__BACKEND"] = "sqlite"
+    # Workers derive the key from the token store when it is enabled, otherwise share one here
+    if not config.server.secret_key and not config.token_store.enabled:
+        os.environ["TP_SERVER__SECRET_KEY"] = secrets.token_hex(24)
+
+
+def run_worker(listener: socket.socket, host: str, port: int) -> None:
+    """Serve requests on the inherited socket until SIGTERM, in the forked child"""
+    from werkzeug.serving import make_server
+    from services import metrics
+    import main
+
+    # Each worker keeps its own metrics, the label tells their series apart
+    metrics.registry.set_constant_labels(worker=str(os.getpid()))
+    server = make_server(host, port, main.app, threaded=True, fd=listener.fileno())
+
+    def stop(*_):
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    server.serve_forever()
+
+
+def spawn_worker(listener: socket.socket, host: str, port: int) -> int:
+    pid = os.fork()
+    if pid == 0:
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        run_worker(listener, host, port)
+        # Exit through the interpreter so the worker's atexit hooks flush its stores
+        sys.exit(0)
+    return pid
+
+
+def supervise(listener: socket.socket, host: str, port: int, workers: int) -> None:
+    started: Dict[int, float] = {}
+    for _ in range(workers):
+        started[spawn_worker(listener, host, port)] = time.monotonic()
+
+    supervisor = os.getpid()
+
+    def stopping(*_):
+        if os.getpid() != supervisor:
+            # Signalled in a new worker before it installed its own handlers
+            os._exit(0)
+        raise ServerStopping()
+
+    signal.signal(signal.SIGTERM, stopping)
+    signal.signal(signal.SIGINT, stopping)
+    try:
+        while True:
+            pid, _ = os.wait()
+            started_at = started.pop(pid, None)
+            if started_at is None:
+                continue
+            if time.monotonic() - started_at < RESPAWN_BACKOFF_SECONDS:
+                time.sleep(RESPAWN_BACKOFF_SECONDS)
+            started[spawn_worker(listener, host, port)] = time.monotonic()
+    except ServerStopping:
+        signal.signal(signal.SIGTERM, signal.SIG_IGN)
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        stop_workers(started)
+
+
+def stop_workers(workers: Dict[int, float]) -> None:
+    for pid in workers:
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+    deadline = time.monotonic() + SHUTDOWN_GRACE_SECONDS
+    remaining = set(workers)
+    while remaining and time.monotonic() < deadline:
+        for pid in list(remaining):
+            if os.waitpid(pid, os.WNOHANG)[0] == pid:
+                remaining.discard(pid)
+        time.sleep(0.05)
+    for pid in remaining:
+        os.kill(pid, signal.SIGKILL)
+        os.waitpid(pid, 0)
+
+
+def main():
+    config = Config()
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=config.server.local_port)
+    parser.add_argument("--backlog", type=int, default=1024)
+    args = parser.parse_args()
+    if not hasattr(os, "fork"):
+        parser.error("pre-forking needs os.fork, use `python main.py` on this platform")
+
+    share_state_between_workers(config, args.workers)
+    listener = socket.create_server((args.host, args.port), backlog=args.backlog)
+    listener.set_inheritable(True)
+    print(f"Serving on http://{args.host}:{args.port} with {args.workers} workers")
+    supervise(listener, args.host, args.port, args.workers)
+    listener.close()
+
+
+if __name__ == "__main__":
+    main()
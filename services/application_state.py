@@ -1,7 +1,8 @@
 """Module providing Enum for call status"""
 
-from dataclasses import dataclass, field
+from dataclasses import asdict, dataclass, field
 from enum import Enum
+from typing import Any, Dict
 
 from services.public_api import (
     AuthorizationCodeResponse,
@@ -17,6 +18,7 @@ class Status(Enum):
     SUCCESS = "Success"
     FAILURE = "Failure"
     EXPIRED = "Expired"
+    UNAVAILABLE = "Upstream Unavailable"
 
 
 @dataclass
@@ -45,3 +47,28 @@ class ApplicationState:
 
     def is_list_athletes_complete(self) -> bool:
         return self.list_athletes_request_status == Status.SUCCESS.value
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "authorization_code_request_status": self.authorization_code_request_status,
+            "authorization_code_response": asdict(self.authorization_code_response),
+            "token_code_request_status": self.token_code_request_status,
+            "token_code_response": self.token_code_response.to_dict(),
+            "list_athletes_request_status": self.list_athletes_request_status,
+            "list_athletes_response": self.list_athletes_response.to_dict(),
+            "exception_text": self.exception_text,
+        }
+
+    @classmethod
+    def from_dict(cls, values: Dict[str, Any]) -> "ApplicationState":
+        return cls(
+            authorization_code_request_status=values["authorization_code_request_status"],
+            authorization_code_response=AuthorizationCodeResponse(
+                **values["authorization_code_response"]
+            ),
+            token_code_request_status=values["token_code_request_status"],
+            token_code_response=GetTokenResponse(**values["token_code_response"]),
+            list_athletes_request_status=values["list_athletes_request_status"],
+            list_athletes_response=ListAthleteResponse(**values["list_athletes_response"]),
+            exception_text=values["exception_text"],
+        )
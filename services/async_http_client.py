@@ -0,0 +1,235 @@
+"""Module providing a pooled asyncio HTTP transport for Public API and OAuth calls"""
+
+import asyncio
+from contextlib import asynccontextmanager
+import json
+import threading
+import time
+from typing import Any, AsyncIterator, Optional
+import weakref
+import aiohttp
+from multidict import CIMultiDict
+from services.circuit_breaker import CircuitBreaker
+from services.config_loader import HttpConfig
+from services.deadline import Deadline
+from services.http_client import CIRCUIT_FAILURE_STATUS_CODES, get_endpoint, get_max_wait
+from services.metrics import UPSTREAM_REQUEST_DURATION
+from services.models import CIRCUIT_OPEN_ERROR, DEADLINE_EXCEEDED_ERROR
+from services.rate_limiter import RateLimiter
+
+DEFAULT_TIMEOUT_SECONDS = 120
+
+
+class AsyncHttpClient:
+    """Shared aiohttp connection pool for the async request classes
+
+    aiohttp sessions belong to the event loop they were created on, so one
+    pooled session is kept per running loop. Within a loop every call shares the
+    same keep-alive connections, bounded by ``async_limit`` in total and
+    ``async_limit_per_host`` per host (0 means unbounded).
+    """
+
+    def __init__(
+        self,
+        http_config: HttpConfig = None,
+        client_id: str = "default",
+        rate_limiter: RateLimiter = None,
+        circuit_breaker: CircuitBreaker = None,
+    ) -> None:
+        self.http_config: HttpConfig = http_config or HttpConfig()
+        self.client_id = client_id
+        self.rate_limiter = rate_limiter
+        self.circuit_breaker = circuit_breaker
+        self._sessions: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, aiohttp.ClientSession]" = (
+            weakref.WeakKeyDictionary()
+        )
+        self._lock = threading.Lock()
+
+    def get_session(self) -> aiohttp.ClientSession:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            session = self._sessions.get(loop)
+            if session is None or session.closed:
+                session = aiohttp.ClientSession(
+                    connector=aiohttp.TCPConnector(
+                        limit=self.http_config.async_limit,
+                        limit_per_host=self.http_config.async_limit_per_host,
+                    ),
+                    # Tokens are per user, so never share cookies between callers
+                    cookie_jar=aiohttp.DummyCookieJar(),
+                    timeout=aiohttp.ClientTimeout(total=DEFAULT_TIMEOUT_SECONDS),
+                )
+                self._sessions[loop] = session
+            return session
+
+    @asynccontextmanager
+    async def request(
+        self,
+        method: str,
+        url: str,
+        operation: str = "http",
+        endpoint: str = None,
+        deadline: Deadline = None,
+        **kwargs,
+    ) -> AsyncIterator[aiohttp.ClientResponse]:
+        """Send a request, use as ``async with client.request(...) as response``
+
+        Rate limits, circuit breakers, timeouts and latency metrics work like
+        HttpClient.request, except that waiting for a turn sleeps instead of
+        blocking the event loop.
+        """
+        endpoint = endpoint or get_endpoint(url)
+        started = time.perf_counter()
+        status = "error"
+        try:
+            if deadline is not None and deadline.expired():
+                status = "504"
+                yield get_deadline_exceeded_response(url)
+                return
+            retry_after = None
+            if self.circuit_breaker is not None:
+                retry_after = self.circuit_breaker.allow(endpoint)
+            if retry_after is not None:
+                status = "503"
+                yield LocalResponse(
+                    url, 503, "Service Unavailable", CIRCUIT_OPEN_ERROR,
+                    f"{endpoint} is failing, calls to it are paused", retry_after,
+                )
+                return
+            delay = await self.wait_for_turn(endpoint, deadline)
+            if delay is not None or (deadline is not None and deadline.expired()):
+                if self.circuit_breaker is not None:
+                    self.circuit_breaker.cancel(endpoint)
+                refused = self.get_refused_response(url, delay)
+                status = str(refused.status)
+                yield refused
+                return
+            # Only now, the wait for a turn used up part of the budget
+            if "timeout" not in kwargs:
+                kwargs["timeout"] = self.get_timeout(deadline)
+            async with self.get_session().request(method, url, **kwargs) as response:
+                status = str(response.status)
+                if self.rate_limiter is not None:
+                    self.rate_limiter.observe(
+                        (self.client_id, endpoint), response.status, response.headers
+                    )
+                self.record_outcome(endpoint, response.status)
+                yield response
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            # Reading the body can time out as well, after the status was recorded
+            if self.circuit_breaker is not None:
+                self.circuit_breaker.record_failure(endpoint)
+            raise
+        finally:
+            UPSTREAM_REQUEST_DURATION.observe(
+                time.perf_counter() - started, operation, endpoint, status
+            )
+
+    def get_timeout(self, deadline: Deadline = None) -> aiohttp.ClientTimeout:
+        connect = self.http_config.connect_timeout_seconds
+        read = self.http_config.read_timeout_seconds
+        total = DEFAULT_TIMEOUT_SECONDS
+        if deadline is not None:
+            connect, read = deadline.get_timeout(connect, read)
+            total = deadline.remaining()
+        return aiohttp.ClientTimeout(total=total, sock_connect=connect, sock_read=read)
+
+    def record_outcome(self, endpoint: str, status: int) -> None:
+        if self.circuit_breaker is None:
+            return
+        if status in CIRCUIT_FAILURE_STATUS_CODES:
+            self.circuit_breaker.record_failure(endpoint)
+        elif status == 429:
+            self.circuit_breaker.cancel(endpoint)
+        else:
+            self.circuit_breaker.record_success(endpoint)
+
+    async def wait_for_turn(self, endpoint: str, deadline: Deadline = None) -> Optional[float]:
+        """Sleep until the rate limiter allows a call, returns the delay if it is too long to wait"""
+        if self.rate_limiter is None:
+            return None
+        key = (self.client_id, endpoint)
+        wait_until = self.rate_limiter.clock() + get_max_wait(self.rate_limiter, deadline)
+        while True:
+            # A zero timeout takes a token if there is one and never blocks the loop
+            delay = self.rate_limiter.acquire(key, timeout=0)
+            if delay is None:
+                return None
+            if self.rate_limiter.clock() + delay > wait_until:
+                return delay
+            await asyncio.sleep(delay)
+
+    def get_refused_response(self, url: str, delay: Optional[float]) -> "LocalResponse":
+        """A 429 when the rate limiter would not wait that long, a 504 when the deadline would not"""
+        if delay is not None and delay > self.rate_limiter.max_wait_seconds:
+            return LocalResponse(url, 429, "Too Many Requests", retry_after=delay)
+        return get_deadline_exceeded_response(url)
+
+    def get(self, url: str, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    async def close(self) -> None:
+        """Close the pool that belongs to the running event loop"""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            session = self._sessions.pop(loop, None)
+        if session is not None:
+            await session.close()
+
+
+class LocalResponse:
+    """A local failure for calls that are not sent, e.g. a 429 while rate limited
+
+    Failures with an ``error`` code get an OAuth style error body, like the
+    local responses of HttpClient.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        status: int,
+        reason: str,
+        error: str = None,
+        description: str = None,
+        retry_after: float = None,
+    ) -> None:
+        self.url = url
+        self.status = status
+        self.reason = reason
+        self.ok = False
+        self.headers = CIMultiDict()
+        if retry_after is not None:
+            self.headers["Retry-After"] = str(max(1, round(retry_after)))
+        self._text = ""
+        if error is not None:
+            self._text = json.dumps({"error": error, "error_description": description})
+
+    async def text(self) -> str:
+        return self._text
+
+    async def json(self, content_type: str = None) -> Any:
+        return json.loads(self._text) if self._text else None
+
+
+def get_deadline_exceeded_response(url: str) -> LocalResponse:
+    return LocalResponse(
+        url, 504, "Gateway Timeout", DEADLINE_EXCEEDED_ERROR,
+        "The request ran out of time before this call could be made",
+    )
+
+
+_default_client: AsyncHttpClient = None
+_default_client_lock = threading.Lock()
+
+
+def get_default_async_client() -> AsyncHttpClient:
+    """Get the process wide async client used when no client is passed explicitly"""
+    global _default_client
+    if _default_client is None:
+        with _default_client_lock:
+            if _default_client is None:
+                _default_client = AsyncHttpClient()
+    return _default_client
@@ -0,0 +1,144 @@
+"""Module providing asyncio counterparts of the Public API and OAuth requests"""
+
+import asyncio
+from dataclasses import dataclass, field
+from typing import Any
+import aiohttp
+from services.async_http_client import AsyncHttpClient, get_default_async_client
+from services.deadline import Deadline
+from services.models import ApiError, TokenPayload, decode_athletes
+from services.public_api import GetTokenResponse, ListAthleteResponse
+from services.response_cache import ResponseCache
+
+
+# Errors of calls that got no response, aiohttp's timeouts are asyncio.TimeoutError
+NO_RESPONSE_ERRORS = (aiohttp.ClientError, asyncio.TimeoutError)
+
+
+async def _post_token(
+    request: Any,
+    token_url: str,
+    body: dict,
+    http_client: AsyncHttpClient = None,
+    deadline: Deadline = None,
+) -> GetTokenResponse:
+    try:
+        async with (http_client or get_default_async_client()).post(
+            token_url,
+            data=body,
+            headers={"Accept": "application/json"},
+            operation=type(request).__name__,
+            deadline=deadline,
+        ) as response:
+            if not response.ok:
+                request.failure = ApiError.from_body(response.status, await response.text())
+                return None
+            payload = await response.json(content_type=None)
+    except NO_RESPONSE_ERRORS as error:
+        request.failure = ApiError.from_exception(
+            error, timed_out=isinstance(error, asyncio.TimeoutError)
+        )
+        return None
+    return GetTokenResponse.from_payload(TokenPayload.from_json(payload))
+
+@dataclass
+class AsyncGetTokenRequest:
+    code: str
+    redirect_uri: str = "http://localhost:8080/callback"
+    grant_type: str = "authorization_code"
+    # Status and body of the last failed call, e.g. a 503 while the circuit is open
+    failure: ApiError = field(default=None, init=False, repr=False)
+
+    async def execute(
+        self,
+        token_url: str,
+        client_id: str,
+        client_secret: str,
+        http_client: AsyncHttpClient = None,
+        deadline: Deadline = None,
+    ) -> GetTokenResponse:
+        body = {
+            "grant_type": self.grant_type,
+            "code": self.code,
+            "redirect_uri": self.redirect_uri,
+            "client_id": client_id,
+            "client_secret": client_secret,
+        }
+        return await _post_token(self, token_url, body, http_client, deadline)
+
+@dataclass
+class AsyncRefreshTokenRequest:
+    refresh_token: str
+    grant_type: str = "refresh_token"
+    failure: ApiError = field(default=None, init=False, repr=False)
+
+    async def execute(
+        self,
+        token_url: str,
+        client_id: str,
+        client_secret: str,
+        http_client: AsyncHttpClient = None,
+        deadline: Deadline = None,
+    ) -> GetTokenResponse:
+        body = {
+            "grant_type": self.grant_type,
+            "refresh_token": self.refresh_token,
+            "client_id": client_id,
+            "client_secret": client_secret,
+        }
+        return await _post_token(self, token_url, body, http_client, deadline)
+
+@dataclass
+class AsyncListAthleteRequest:
+    # Status and body of the last failed call, e.g. a 429 while rate limited
+    failure: ApiError = field(default=None, init=False, repr=False)
+
+    async def execute(
+        self,
+        list_athlete_url: str,
+        access_token: str,
+        http_client: AsyncHttpClient = None,
+        cache: ResponseCache = None,
+        deadline: Deadline = None,
+    ) -> ListAthleteResponse:
+        headers = {"Authorization": f"Bearer {access_token}"}
+        if cache is not None:
+            cache_key = cache.make_key(list_athlete_url, access_token)
+            cached = cache.fresh_response(cache_key)
+            if cached is not None:
+                return cached
+            headers.update(cache.conditional_headers(cache_key))
+
+        try:
+            async with (http_client or get_default_async_client()).get(
+                list_athlete_url,
+                headers=headers,
+                operation=type(self).__name__,
+                deadline=deadline,
+            ) as response:
+                if cache is not None and response.status == 304:
+                    cached = cache.revalidated(cache_key)
+                    if cached is not None:
+                        return cached
+                if not response.ok or response.status == 304:
+                    self.failure = ApiError.from_body(response.status, await response.text())
+                    return None
+                payload = await response.json(content_type=None)
+                result = ListAthleteResponse(
+                    athletes = decode_athletes(payload),
+                    status_code = response.status,
+                    message = response.reason
+                )
+                if cache is not None:
+                    cache.store(
+                        cache_key,
+                        result,
+                        etag=response.headers.get("ETag"),
+                        last_modified=response.headers.get("Last-Modified"),
+                    )
+                return result
+        except NO_RESPONSE_ERRORS as error:
+            self.failure = ApiError.from_exception(
+                error, timed_out=isinstance(error, asyncio.TimeoutError)
+            )
+            return None
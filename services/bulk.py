@@ -0,0 +1,110 @@
+"""Module providing concurrent fan-out of per-athlete Public API calls"""
+
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, replace
+import threading
+from typing import Any, Callable, Dict, Generic, Iterable, Iterator, Set, TypeVar
+from urllib.parse import urlsplit
+from services.deadline import Deadline
+from services.http_client import HttpClient
+from services.models import ApiError
+from services.public_api import AthleteDataRequest
+
+T = TypeVar("T")
+
+
+@dataclass
+class BulkResult(Generic[T]):
+    item: T
+    response: Any = None
+    error: BaseException = None
+    # Status and body of a call that got an answer other than the data, e.g. a 404
+    failure: ApiError = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None and self.failure is None and self.response is not None
+
+
+class BulkExecutor:
+    """Run one call per item on a bounded thread pool, with a concurrency cap per host
+
+    Results are yielded in completion order. A failing call is reported in its
+    BulkResult and never aborts the rest of the batch. At most ``max_workers``
+    items are in flight at any time, so the input may be a lazy iterable of
+    any length.
+    """
+
+    def __init__(self, max_workers: int = 16, max_per_host: int = 8) -> None:
+        self.max_workers = max_workers
+        self.max_per_host = max_per_host
+        self._host_slots: Dict[str, threading.BoundedSemaphore] = {}
+        self._lock = threading.Lock()
+
+    def run(
+        self,
+        items: Iterable[T],
+        url_for: Callable[[T], str],
+        call: Callable[[T], Any],
+    ) -> Iterator[BulkResult[T]]:
+        items = iter(items)
+        pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="bulk")
+        in_flight: Set[Future] = set()
+        try:
+            for item in items:
+                in_flight.add(pool.submit(self._call, item, url_for, call))
+                if len(in_flight) >= self.max_workers:
+                    break
+            while in_flight:
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    next_item = next(items, _EXHAUSTED)
+                    if next_item is not _EXHAUSTED:
+                        in_flight.add(pool.submit(self._call, next_item, url_for, call))
+                    yield future.result()
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def execute_for_athletes(
+        self,
+        athletes: Iterable[Dict[str, Any]],
+        request: AthleteDataRequest,
+        access_token: str,
+        http_client: HttpClient = None,
+        id_field: str = "Id",
+        deadline: Deadline = None,
+    ) -> Iterator[BulkResult[Dict[str, Any]]]:
+        """Run an AthleteDataRequest for every athlete of a List Athletes payload
+
+        Every athlete's call runs on a copy of request, so each BulkResult gets
+        the failure of its own call. Calls left once deadline expires fail fast.
+        """
+        def call(athlete: Dict[str, Any]):
+            athlete_request = replace(request)
+            response = athlete_request.execute(
+                athlete[id_field], access_token, http_client=http_client, deadline=deadline
+            )
+            return response, athlete_request.failure
+
+        for result in self.run(athletes, lambda athlete: request.get_url(athlete[id_field]), call):
+            if result.error is None:
+                result.response, result.failure = result.response
+            yield result
+
+    def _call(self, item: T, url_for: Callable[[T], str], call: Callable[[T], Any]) -> BulkResult:
+        try:
+            with self._get_host_slot(urlsplit(url_for(item)).netloc):
+                return BulkResult(item=item, response=call(item))
+        except Exception as error:  # pylint: disable=broad-except
+            return BulkResult(item=item, error=error)
+
+    def _get_host_slot(self, host: str) -> threading.BoundedSemaphore:
+        with self._lock:
+            slot = self._host_slots.get(host)
+            if slot is None:
+                slot = threading.BoundedSemaphore(self.max_per_host)
+                self._host_slots[host] = slot
+            return slot
+
+
+_EXHAUSTED = object()
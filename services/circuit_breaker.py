@@ -0,0 +1,99 @@
+"""Module providing per-endpoint circuit breakers for upstream calls"""
+
+from dataclasses import dataclass
+from enum import Enum
+import threading
+import time
+from typing import Callable, Dict, Hashable, Optional
+
+
+class CircuitState(Enum):
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+
+@dataclass
+class Circuit:
+    state: CircuitState = CircuitState.CLOSED
+    failures: int = 0
+    opened_at: float = 0.0
+    # A half-open circuit lets one probe call through at a time
+    probing: bool = False
+
+
+class CircuitBreaker:
+    """Closed/open/half-open circuit per key, e.g. per upstream endpoint
+
+    ``failure_threshold`` consecutive failures open a circuit. While it is open,
+    ``allow`` rejects calls straight away. After ``reset_timeout_seconds`` it
+    turns half-open and lets one probe call through: a success closes it again,
+    a failure opens it for another ``reset_timeout_seconds``.
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int = 5,
+        reset_timeout_seconds: float = 30,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.failure_threshold = failure_threshold
+        self.reset_timeout_seconds = reset_timeout_seconds
+        self.clock = clock
+        self.rejected = 0
+        self._circuits: Dict[Hashable, Circuit] = {}
+        self._lock = threading.Lock()
+
+    def allow(self, key: Hashable) -> Optional[float]:
+        """None if a call may go ahead, otherwise the seconds until the circuit is probed again"""
+        with self._lock:
+            circuit = self._circuits.get(key)
+            if circuit is None or circuit.state is CircuitState.CLOSED:
+                return None
+            retry_after = circuit.opened_at + self.reset_timeout_seconds - self.clock()
+            if circuit.state is CircuitState.OPEN and retry_after <= 0:
+                circuit.state = CircuitState.HALF_OPEN
+            if circuit.state is CircuitState.HALF_OPEN and not circuit.probing:
+                circuit.probing = True
+                return None
+            self.rejected += 1
+            return max(retry_after, 0.0)
+
+    def record_success(self, key: Hashable) -> None:
+        with self._lock:
+            circuit = self._circuits.get(key)
+            if circuit is not None:
+                circuit.state = CircuitState.CLOSED
+                circuit.failures = 0
+                circuit.probing = False
+
+    def record_failure(self, key: Hashable) -> None:
+        with self._lock:
+            circuit = self._circuits.setdefault(key, Circuit())
+            circuit.failures += 1
+            if (
+                circuit.state is CircuitState.HALF_OPEN
+                or circuit.failures >= self.failure_threshold
+            ):
+                circuit.state = CircuitState.OPEN
+                circuit.opened_at = self.clock()
+                circuit.probing = False
+
+    def cancel(self, key: Hashable) -> None:
+        """Give back a probe that was allowed but never sent, e.g. because it was rate limited"""
+        with self._lock:
+            circuit = self._circuits.get(key)
+            if circuit is not None:
+                circuit.probing = False
+
+    def get_state(self, key: Hashable) -> CircuitState:
+        with self._lock:
+            circuit = self._circuits.get(key)
+            return CircuitState.CLOSED if circuit is None else circuit.state
+
+    def count_open(self) -> int:
+        """Circuits that are open or half-open"""
+        with self._lock:
+            return sum(
+                circuit.state is not CircuitState.CLOSED for circuit in self._circuits.values()
+            )
@@ -0,0 +1,123 @@
+"""Module providing a connection pool and rate limiter per named OAuth client"""
+
+from dataclasses import dataclass
+import threading
+from typing import Dict, Optional, Tuple
+from services.async_http_client import AsyncHttpClient
+from services.circuit_breaker import CircuitBreaker
+from services.config_loader import DEFAULT_CLIENT, ClientConfig, Config, HttpConfig, OAuthConfig, PublicApiConfig
+from services.http_client import HttpClient
+from services.rate_limiter import RateLimiter
+from services.upstream_timing import SlowCallLog
+
+# Separates the client name from the session id in session, token store and refresh keys
+STATE_KEY_SEPARATOR = ":"
+
+
+@dataclass(frozen=True)
+class OAuthClient:
+    """A client's settings from one config snapshot, with the pools it sends through"""
+    config: ClientConfig
+    http_client: HttpClient
+    async_http_client: AsyncHttpClient
+
+    @property
+    def name(self) -> str:
+        return self.config.name
+
+    @property
+    def oauth(self) -> OAuthConfig:
+        return self.config.oauth
+
+    @property
+    def public_api(self) -> PublicApiConfig:
+        return self.config.public_api
+
+
+class ClientRegistry:
+    """HttpClient, AsyncHttpClient and RateLimiter per client name, built on first use
+
+    Both clients of a name share its RateLimiter, so blocking and async calls
+    count against one limit. Every client shares ``circuit_breaker``, whose
+    circuits are per endpoint, and ``slow_call_log``.
+
+    Credentials and endpoints are read from the snapshot passed to ``get``, so
+    reloads apply to them straight away. Pools and rate limits are sized when a
+    client is first used and keep their size until a restart.
+    """
+
+    def __init__(
+        self,
+        http_config: HttpConfig = None,
+        circuit_breaker: CircuitBreaker = None,
+        slow_call_log: SlowCallLog = None,
+    ) -> None:
+        self.http_config = http_config
+        self.circuit_breaker = circuit_breaker
+        self.slow_call_log = slow_call_log
+        self._http_clients: Dict[str, Tuple[HttpClient, AsyncHttpClient]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, snapshot: Config, name: str = DEFAULT_CLIENT) -> Optional[OAuthClient]:
+        """The named client of this snapshot, None if the snapshot does not define it"""
+        client_config = snapshot.get_client(name)
+        if client_config is None:
+            return None
+        with self._lock:
+            http_clients = self._http_clients.get(name)
+            if http_clients is None:
+                http_clients = self.build_http_clients(client_config)
+                self._http_clients[name] = http_clients
+        return OAuthClient(
+            config=client_config, http_client=http_clients[0], async_http_client=http_clients[1]
+        )
+
+    def build_http_clients(self, client_config: ClientConfig) -> Tuple[HttpClient, AsyncHttpClient]:
+        rate_limiter = None
+        if client_config.rate_limit.enabled:
+            rate_limiter = RateLimiter(
+                requests_per_second=client_config.rate_limit.requests_per_second,
+                burst=client_config.rate_limit.burst,
+                max_wait_seconds=client_config.rate_limit.max_wait_seconds,
+            )
+        return (
+            HttpClient(
+                http_config=self.http_config,
+                client_id=client_config.oauth.client_id,
+                rate_limiter=rate_limiter,
+                circuit_breaker=self.circuit_breaker,
+                slow_call_log=self.slow_call_log,
+            ),
+            AsyncHttpClient(
+                http_config=self.http_config,
+                client_id=client_config.oauth.client_id,
+                rate_limiter=rate_limiter,
+                circuit_breaker=self.circuit_breaker,
+            ),
+        )
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._http_clients)
+
+    def close(self) -> None:
+        """Close the blocking pools, async pools are closed by their event loop"""
+        with self._lock:
+            http_clients, self._http_clients = self._http_clients, {}
+        for http_client, _ in http_clients.values():
+            http_client.close()
+
+
+def make_state_key(client: str, session_id: str) -> str:
+    """Key of a session's state for one client, the default client keeps the bare session id"""
+    if client == DEFAULT_CLIENT:
+        return session_id
+    return f"{client}{STATE_KEY_SEPARATOR}{session_id}"
+
+
+def split_state_key(state_key: str) -> Tuple[str, str]:
+    """Client name and session id of a key made by make_state_key"""
+    client, separator, session_id = state_key.partition(STATE_KEY_SEPARATOR)
+    if not separator:
+        return DEFAULT_CLIENT, state_key
+    return client, session_id
@@ -0,0 +1,151 @@
+"""Module providing negotiated gzip/brotli compression of response bodies"""
+
+from collections import OrderedDict
+from dataclasses import dataclass, replace
+import gzip
+import hashlib
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, without it only gzip is offered
+    brotli = None
+
+GZIP = "gzip"
+BROTLI = "br"
+# Types worth compressing, images and archives are compressed already
+COMPRESSIBLE_TYPES = ("text/", "application/json", "application/javascript")
+HTML_TYPE = "text/html"
+
+
+@dataclass
+class CompressionStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    bytes_in: int = 0
+    bytes_out: int = 0
+    cpu_seconds: float = 0.0
+
+
+def is_compressible(content_type: Optional[str]) -> bool:
+    return bool(content_type) and content_type.startswith(COMPRESSIBLE_TYPES)
+
+
+def content_etag(body: bytes) -> str:
+    """Digest identifying a body that came without an ETag"""
+    return hashlib.blake2b(body, digest_size=16).hexdigest()
+
+
+def parse_accept_encoding(header: Optional[str]) -> Dict[str, float]:
+    """Quality of each coding of an Accept-Encoding header, e.g. {"gzip": 1.0, "br": 0.5}"""
+    accepted: Dict[str, float] = {}
+    for item in (header or "").split(","):
+        coding, _, params = item.partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        for param in params.split(";"):
+            key, _, value = param.partition("=")
+            if key.strip() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[coding] = quality
+    return accepted
+
+
+class Compressor:
+    """Compress bodies with the best coding a client accepts, caching the results
+
+    Bodies smaller than ``min_size_bytes`` are not worth the CPU and are sent as
+    is. Compressed bodies are kept per ETag and coding for the ``max_entries``
+    most recently used ones, so an unchanged page is compressed once.
+
+    HTML pages are only compressed with ``compress_html``. They show tokens next
+    to reflected input such as the ``code`` of /callback, and the size of such
+    a page once compressed gives the tokens away to a BREACH attack.
+    """
+
+    def __init__(
+        self,
+        min_size_bytes: int = 1024,
+        gzip_level: int = 6,
+        brotli_quality: int = 5,
+        max_entries: int = 256,
+        compress_html: bool = False,
+    ) -> None:
+        self.min_size_bytes = min_size_bytes
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.max_entries = max_entries
+        self.compress_html = compress_html
+        # In order of preference when a client accepts several equally
+        self.encodings: Tuple[str, ...] = (BROTLI, GZIP) if brotli is not None else (GZIP,)
+        self._bodies: "OrderedDict[Tuple[str, str], bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = CompressionStats()
+
+    def negotiate(self, accept_encoding: Optional[str]) -> Optional[str]:
+        """Best coding the client accepts, None to send the body as is"""
+        accepted = parse_accept_encoding(accept_encoding)
+        best, best_quality = None, 0.0
+        for encoding in self.encodings:
+            quality = accepted.get(encoding, accepted.get("*", 0.0))
+            if quality > best_quality:
+                best, best_quality = encoding, quality
+        return best
+
+    def compresses(self, content_type: Optional[str]) -> bool:
+        """Whether responses of this type are compressed at all"""
+        if not is_compressible(content_type):
+            return False
+        return self.compress_html or not content_type.startswith(HTML_TYPE)
+
+    def should_compress(self, body: bytes) -> bool:
+        return len(body) >= self.min_size_bytes
+
+    def compress(self, body: bytes, encoding: str, etag: str = None) -> bytes:
+        """Compressed body, from the cache when a body with this ETag was compressed before"""
+        key = (etag or content_etag(body), encoding)
+        with self._lock:
+            compressed = self._bodies.get(key)
+            if compressed is not None:
+                self._bodies.move_to_end(key)
+                self._stats.hits += 1
+                return compressed
+
+        started = time.thread_time()
+        compressed = self.compress_uncached(body, encoding)
+        elapsed = time.thread_time() - started
+
+        with self._lock:
+            self._stats.misses += 1
+            self._stats.bytes_in += len(body)
+            self._stats.bytes_out += len(compressed)
+            self._stats.cpu_seconds += elapsed
+            self._bodies[key] = compressed
+            while len(self._bodies) > self.max_entries:
+                self._bodies.popitem(last=False)
+                self._stats.evictions += 1
+        return compressed
+
+    def compress_uncached(self, body: bytes, encoding: str) -> bytes:
+        if encoding == BROTLI:
+            return brotli.compress(body, quality=self.brotli_quality)
+        if encoding == GZIP:
+            # mtime=0 keeps the output identical for identical bodies
+            return gzip.compress(body, compresslevel=self.gzip_level, mtime=0)
+        raise ValueError(f"Unsupported encoding {encoding!r}")
+
+    def stats(self) -> CompressionStats:
+        with self._lock:
+            return replace(self._stats)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._bodies)
@@ -1,7 +1,25 @@
 from dataclasses import dataclass
 import configparser
+import os
+import re
+from typing import Dict, Mapping
+from urllib.parse import urlsplit
 
-@dataclass
+# Environment variables named TP_<SECTION>__<KEY> override config.ini, e.g. TP_OAUTH__CLIENT_SECRET
+ENV_PREFIX = "TP_"
+ENV_SEPARATOR = "__"
+
+# [oauth] is the default client, further clients are named sections such as [oauth.sandbox]
+DEFAULT_CLIENT = "default"
+CLIENT_SECTION_PREFIX = "oauth."
+# Routes of a named client are served below /clients/<name>
+CLIENTS_PATH = "/clients"
+CLIENT_NAME_PATTERN = re.compile(r"^[A-Za-z0-9_-]+$")
+
+class ConfigError(ValueError):
+    """config.ini is missing a setting or holds an invalid value"""
+
+@dataclass(frozen=True)
 class OAuthConfig:
     client_id: str
     client_secret: str
@@ -9,25 +27,140 @@ class OAuthConfig:
     token_url: str
     scopes: str
 
-@dataclass
+@dataclass(frozen=True)
 class ServerConfig:
     local_port: int
+    secret_key: str = None
 
-    def get_local_url(self) -> str:
-        return f"http://localhost:{self.local_port}"
+    def get_local_url(self, client: str = DEFAULT_CLIENT) -> str:
+        local_url = f"http://localhost:{self.local_port}"
+        if client == DEFAULT_CLIENT:
+            return local_url
+        return f"{local_url}{CLIENTS_PATH}/{client}"
 
-    def get_redirect_uri(self) -> str:
-        return f"http://localhost:{self.local_port}/callback"
+    def get_redirect_uri(self, client: str = DEFAULT_CLIENT) -> str:
+        return f"{self.get_local_url(client)}/callback"
 
-@dataclass
+@dataclass(frozen=True)
 class PublicApiConfig:
     list_athletes_endpoint: str
 
+@dataclass(frozen=True)
+class HttpConfig:
+    pool_connections: int = 10
+    pool_maxsize: int = 10
+    pool_block: bool = False
+    max_retries: int = 3
+    backoff_factor: float = 0.5
+    async_limit: int = 1000
+    async_limit_per_host: int = 0
+    connect_timeout_seconds: float = 5.0
+    read_timeout_seconds: float = 30.0
+    # Budget shared by all upstream calls made for one incoming request
+    deadline_seconds: float = 60.0
+    phase_timing: bool = True
+    slow_call_seconds: float = 1.0
+    max_slow_calls: int = 100
+
+@dataclass
+class SessionConfig:
+    max_sessions: int = 10000
+    ttl_seconds: int = 3600
+    # "memory" keeps sessions in the process, "sqlite" shares them between worker processes
+    backend: str = "memory"
+    path: str = "./config/sessions.db"
+
+@dataclass
+class TokenRefreshConfig:
+    enabled: bool = True
+    margin_seconds: int = 60
+    jitter_seconds: int = 15
+    coalesce_seconds: int = 5
+
+@dataclass
+class ResponseCacheConfig:
+    max_entries: int = 1000
+    ttl_seconds: int = 60
+
+@dataclass
+class TokenStoreConfig:
+    enabled: bool = False
+    path: str = "./config/tokens.db"
+    flush_interval_seconds: float = 1.0
+    max_age_days: int = 30
+
+@dataclass
+class RateLimitConfig:
+    enabled: bool = True
+    requests_per_second: float = 10
+    burst: int = 20
+    max_wait_seconds: float = 30
+
+@dataclass(frozen=True)
+class ClientConfig:
+    """Credentials, API endpoint and rate limit of one named OAuth client"""
+    name: str
+    oauth: OAuthConfig
+    public_api: PublicApiConfig
+    rate_limit: RateLimitConfig
+
+@dataclass
+class CircuitBreakerConfig:
+    enabled: bool = True
+    failure_threshold: int = 5
+    reset_timeout_seconds: float = 30.0
+
+@dataclass
+class CompressionConfig:
+    enabled: bool = True
+    min_size_bytes: int = 1024
+    gzip_level: int = 6
+    brotli_quality: int = 5
+    cache_entries: int = 256
+    # HTML pages show tokens next to reflected input, compressing them exposes the tokens to BREACH
+    compress_html: bool = False
+
+@dataclass
+class ProfilingConfig:
+    enabled: bool = False
+    sample_rate: float = 0.0
+    header: str = "X-Profile"
+    header_secret: str = ""
+    directory: str = "./profiles"
+    max_profiles: int = 100
+
+@dataclass
+class ConnectionWarmupConfig:
+    enabled: bool = True
+    connections_per_host: int = 2
+    # 0 only warms the pools at startup
+    keepalive_interval_seconds: float = 30.0
+
+@dataclass
+class RosterSyncConfig:
+    enabled: bool = True
+    id_field: str = "Id"
+
+@dataclass
+class ConfigReloadConfig:
+    enabled: bool = True
+    interval_seconds: float = 2.0
+
 class Config:
-    def __init__(self, config_file: str = "./config/config.ini") -> None:
+    def __init__(
+        self, config_file: str = "./config/config.ini", environ: Mapping[str, str] = None
+    ) -> None:
         config: configparser.ConfigParser = configparser.ConfigParser()
         config.read(config_file)
+        apply_env_overrides(config, os.environ if environ is None else environ)
+
+        try:
+            self.read(config)
+        except (KeyError, ValueError) as error:
+            raise ConfigError(f"Invalid config {config_file}: {error}") from error
+        self.validate()
 
+    def read(self, config: configparser.ConfigParser) -> None:
         self.oauth: OAuthConfig = OAuthConfig(
             client_id = config["oauth"]["client_id"],
             client_secret = config["oauth"]["client_secret"],
@@ -37,9 +170,306 @@ class Config:
         )
 
         self.server: ServerConfig = ServerConfig(
-            local_port = int(config["server"]["local_port"])
+            local_port = int(config["server"]["local_port"]),
+            secret_key = config.get("server", "secret_key", fallback=None)
         )
 
         self.public_api: PublicApiConfig = PublicApiConfig(
             list_athletes_endpoint = config["public_api"]["list_athletes_endpoint"]
         )
+
+        self.http: HttpConfig = HttpConfig(
+            pool_connections = config.getint(
+                "http", "pool_connections", fallback=HttpConfig.pool_connections
+            ),
+            pool_maxsize = config.getint(
+                "http", "pool_maxsize", fallback=HttpConfig.pool_maxsize
+            ),
+            pool_block = config.getboolean(
+                "http", "pool_block", fallback=HttpConfig.pool_block
+            ),
+            max_retries = config.getint(
+                "http", "max_retries", fallback=HttpConfig.max_retries
+            ),
+            backoff_factor = config.getfloat(
+                "http", "backoff_factor", fallback=HttpConfig.backoff_factor
+            ),
+            async_limit = config.getint(
+                "http", "async_limit", fallback=HttpConfig.async_limit
+            ),
+            async_limit_per_host = config.getint(
+                "http", "async_limit_per_host", fallback=HttpConfig.async_limit_per_host
+            ),
+            connect_timeout_seconds = config.getfloat(
+                "http", "connect_timeout_seconds", fallback=HttpConfig.connect_timeout_seconds
+            ),
+            read_timeout_seconds = config.getfloat(
+                "http", "read_timeout_seconds", fallback=HttpConfig.read_timeout_seconds
+            ),
+            deadline_seconds = config.getfloat(
+                "http", "deadline_seconds", fallback=HttpConfig.deadline_seconds
+            ),
+            phase_timing = config.getboolean(
+                "http", "phase_timing", fallback=HttpConfig.phase_timing
+            ),
+            slow_call_seconds = config.getfloat(
+                "http", "slow_call_seconds", fallback=HttpConfig.slow_call_seconds
+            ),
+            max_slow_calls = config.getint(
+                "http", "max_slow_calls", fallback=HttpConfig.max_slow_calls
+            )
+        )
+
+        self.session: SessionConfig = SessionConfig(
+            max_sessions = config.getint(
+                "session", "max_sessions", fallback=SessionConfig.max_sessions
+            ),
+            ttl_seconds = config.getint(
+                "session", "ttl_seconds", fallback=SessionConfig.ttl_seconds
+            ),
+            backend = config.get("session", "backend", fallback=SessionConfig.backend),
+            path = config.get("session", "path", fallback=SessionConfig.path)
+        )
+
+        self.token_refresh: TokenRefreshConfig = TokenRefreshConfig(
+            enabled = config.getboolean(
+                "token_refresh", "enabled", fallback=TokenRefreshConfig.enabled
+            ),
+            margin_seconds = config.getint(
+                "token_refresh", "margin_seconds", fallback=TokenRefreshConfig.margin_seconds
+            ),
+            jitter_seconds = config.getint(
+                "token_refresh", "jitter_seconds", fallback=TokenRefreshConfig.jitter_seconds
+            ),
+            coalesce_seconds = config.getint(
+                "token_refresh", "coalesce_seconds", fallback=TokenRefreshConfig.coalesce_seconds
+            )
+        )
+
+        self.response_cache: ResponseCacheConfig = ResponseCacheConfig(
+            max_entries = config.getint(
+                "response_cache", "max_entries", fallback=ResponseCacheConfig.max_entries
+            ),
+            ttl_seconds = config.getint(
+                "response_cache", "ttl_seconds", fallback=ResponseCacheConfig.ttl_seconds
+            )
+        )
+
+        self.token_store: TokenStoreConfig = TokenStoreConfig(
+            enabled = config.getboolean(
+                "token_store", "enabled", fallback=TokenStoreConfig.enabled
+            ),
+            path = config.get("token_store", "path", fallback=TokenStoreConfig.path),
+            flush_interval_seconds = config.getfloat(
+                "token_store",
+                "flush_interval_seconds",
+                fallback=TokenStoreConfig.flush_interval_seconds,
+            ),
+            max_age_days = config.getint(
+                "token_store", "max_age_days", fallback=TokenStoreConfig.max_age_days
+            )
+        )
+
+        self.rate_limit: RateLimitConfig = RateLimitConfig(
+            enabled = config.getboolean(
+                "rate_limit", "enabled", fallback=RateLimitConfig.enabled
+            ),
+            requests_per_second = config.getfloat(
+                "rate_limit", "requests_per_second", fallback=RateLimitConfig.requests_per_second
+            ),
+            burst = config.getint(
+                "rate_limit", "burst", fallback=RateLimitConfig.burst
+            ),
+            max_wait_seconds = config.getfloat(
+                "rate_limit", "max_wait_seconds", fallback=RateLimitConfig.max_wait_seconds
+            )
+        )
+
+        self.circuit_breaker: CircuitBreakerConfig = CircuitBreakerConfig(
+            enabled = config.getboolean(
+                "circuit_breaker", "enabled", fallback=CircuitBreakerConfig.enabled
+            ),
+            failure_threshold = config.getint(
+                "circuit_breaker", "failure_threshold", fallback=CircuitBreakerConfig.failure_threshold
+            ),
+            reset_timeout_seconds = config.getfloat(
+                "circuit_breaker",
+                "reset_timeout_seconds",
+                fallback=CircuitBreakerConfig.reset_timeout_seconds,
+            )
+        )
+
+        self.compression: CompressionConfig = CompressionConfig(
+            enabled = config.getboolean(
+                "compression", "enabled", fallback=CompressionConfig.enabled
+            ),
+            min_size_bytes = config.getint(
+                "compression", "min_size_bytes", fallback=CompressionConfig.min_size_bytes
+            ),
+            gzip_level = config.getint(
+                "compression", "gzip_level", fallback=CompressionConfig.gzip_level
+            ),
+            brotli_quality = config.getint(
+                "compression", "brotli_quality", fallback=CompressionConfig.brotli_quality
+            ),
+            cache_entries = config.getint(
+                "compression", "cache_entries", fallback=CompressionConfig.cache_entries
+            ),
+            compress_html = config.getboolean(
+                "compression", "compress_html", fallback=CompressionConfig.compress_html
+            ),
+        )
+
+        self.profiling: ProfilingConfig = ProfilingConfig(
+            enabled = config.getboolean(
+                "profiling", "enabled", fallback=ProfilingConfig.enabled
+            ),
+            sample_rate = config.getfloat(
+                "profiling", "sample_rate", fallback=ProfilingConfig.sample_rate
+            ),
+            header = config.get("profiling", "header", fallback=ProfilingConfig.header),
+            header_secret = config.get(
+                "profiling", "header_secret", fallback=ProfilingConfig.header_secret
+            ),
+            directory = config.get("profiling", "directory", fallback=ProfilingConfig.directory),
+            max_profiles = config.getint(
+                "profiling", "max_profiles", fallback=ProfilingConfig.max_profiles
+            )
+        )
+
+        self.connection_warmup: ConnectionWarmupConfig = ConnectionWarmupConfig(
+            enabled = config.getboolean(
+                "connection_warmup", "enabled", fallback=ConnectionWarmupConfig.enabled
+            ),
+            connections_per_host = config.getint(
+                "connection_warmup",
+                "connections_per_host",
+                fallback=ConnectionWarmupConfig.connections_per_host,
+            ),
+            keepalive_interval_seconds = config.getfloat(
+                "connection_warmup",
+                "keepalive_interval_seconds",
+                fallback=ConnectionWarmupConfig.keepalive_interval_seconds,
+            )
+        )
+
+        self.roster_sync: RosterSyncConfig = RosterSyncConfig(
+            enabled = config.getboolean(
+                "roster_sync", "enabled", fallback=RosterSyncConfig.enabled
+            ),
+            id_field = config.get("roster_sync", "id_field", fallback=RosterSyncConfig.id_field)
+        )
+
+        self.config_reload: ConfigReloadConfig = ConfigReloadConfig(
+            enabled = config.getboolean(
+                "config_reload", "enabled", fallback=ConfigReloadConfig.enabled
+            ),
+            interval_seconds = config.getfloat(
+                "config_reload", "interval_seconds", fallback=ConfigReloadConfig.interval_seconds
+            )
+        )
+
+        self.clients: Dict[str, ClientConfig] = {
+            DEFAULT_CLIENT: ClientConfig(
+                name=DEFAULT_CLIENT,
+                oauth=self.oauth,
+                public_api=self.public_api,
+                rate_limit=self.rate_limit,
+            )
+        }
+        for section in config.sections():
+            if section.startswith(CLIENT_SECTION_PREFIX):
+                client = self.read_client(config, section[len(CLIENT_SECTION_PREFIX):])
+                self.clients[client.name] = client
+
+    def read_client(self, config: configparser.ConfigParser, name: str) -> ClientConfig:
+        """A named client, settings it does not set are taken from [oauth], [public_api] and [rate_limit]"""
+        section = config[CLIENT_SECTION_PREFIX + name]
+        return ClientConfig(
+            name=name,
+            oauth=OAuthConfig(
+                client_id = section["client_id"],
+                client_secret = section["client_secret"],
+                authorization_url = section.get("authorization_url", self.oauth.authorization_url),
+                token_url = section.get("token_url", self.oauth.token_url),
+                scopes = section.get("scopes", self.oauth.scopes)
+            ),
+            public_api=PublicApiConfig(
+                list_athletes_endpoint = section.get(
+                    "list_athletes_endpoint", self.public_api.list_athletes_endpoint
+                )
+            ),
+            rate_limit=RateLimitConfig(
+                enabled = self.rate_limit.enabled,
+                requests_per_second = section.getfloat(
+                    "requests_per_second", self.rate_limit.requests_per_second
+                ),
+                burst = section.getint("burst", self.rate_limit.burst),
+                max_wait_seconds = self.rate_limit.max_wait_seconds
+            ),
+        )
+
+    def get_client(self, name: str) -> ClientConfig:
+        """The named client, None if this snapshot does not define it"""
+        return self.clients.get(name)
+
+    def validate(self) -> None:
+        """Reject values that would only fail later, on the first request that uses them"""
+        for client in self.clients.values():
+            self.validate_client(client)
+        if self.session.backend not in ("memory", "sqlite"):
+            raise ConfigError(
+                f"session.backend must be memory or sqlite, got {self.session.backend!r}"
+            )
+        if not 1 <= self.compression.gzip_level <= 9:
+            raise ConfigError(
+                f"compression.gzip_level must be between 1 and 9, got {self.compression.gzip_level}"
+            )
+        if not 0 <= self.compression.brotli_quality <= 11:
+            raise ConfigError(
+                "compression.brotli_quality must be between 0 and 11, "
+                f"got {self.compression.brotli_quality}"
+            )
+        if not 0 <= self.profiling.sample_rate <= 1:
+            raise ConfigError(
+                f"profiling.sample_rate must be between 0 and 1, got {self.profiling.sample_rate}"
+            )
+        if self.profiling.max_profiles < 1:
+            raise ConfigError(
+                f"profiling.max_profiles must be at least 1, got {self.profiling.max_profiles}"
+            )
+        if not 0 < self.server.local_port < 65536:
+            raise ConfigError(
+                f"server.local_port must be a port number, got {self.server.local_port}"
+            )
+
+    def validate_client(self, client: ClientConfig) -> None:
+        if client.name == DEFAULT_CLIENT:
+            section, api_section = "oauth", "public_api"
+        else:
+            section = api_section = CLIENT_SECTION_PREFIX + client.name
+        if not CLIENT_NAME_PATTERN.match(client.name):
+            raise ConfigError(f"[{section}] client names may only use letters, digits, _ and -")
+        for name, url in (
+            (f"{section}.authorization_url", client.oauth.authorization_url),
+            (f"{section}.token_url", client.oauth.token_url),
+            (f"{api_section}.list_athletes_endpoint", client.public_api.list_athletes_endpoint),
+        ):
+            parts = urlsplit(url)
+            if parts.scheme not in ("http", "https") or not parts.netloc:
+                raise ConfigError(f"{name} must be an http(s) url, got {url!r}")
+        if not client.oauth.client_id or not client.oauth.client_secret:
+            raise ConfigError(f"{section}.client_id and {section}.client_secret must be set")
+
+def apply_env_overrides(config: configparser.ConfigParser, environ: Mapping[str, str]) -> None:
+    for name, value in environ.items():
+        if not name.startswith(ENV_PREFIX) or ENV_SEPARATOR not in name:
+            continue
+        section, key = name[len(ENV_PREFIX):].lower().split(ENV_SEPARATOR, 1)
+        # Variable names cannot hold a dot, TP_OAUTH_SANDBOX__KEY sets [oauth.sandbox]
+        if section.startswith("oauth_"):
+            section = CLIENT_SECTION_PREFIX + section[len("oauth_"):]
+        if not config.has_section(section):
+            config.add_section(section)
+        # Secrets may contain %, which configparser would otherwise read as interpolation
+        config.set(section, key, value.replace("%", "%%"))
@@ -0,0 +1,105 @@
+"""Module providing hot reloading of config.ini as atomically swapped snapshots"""
+
+import os
+import threading
+from typing import Callable, List, Mapping, Optional, Tuple
+from services.config_loader import Config, ConfigError
+
+ConfigListener = Callable[[Config, Config], None]
+
+
+class ConfigManager:
+    """Holds the current Config snapshot and swaps in a new one when the file changes
+
+    Readers take ``current`` without locking. A snapshot is never modified once
+    published, so a request that read one keeps a consistent view until it
+    finishes even if a reload lands meanwhile. A file that fails to parse or
+    validate is recorded in ``last_error`` and the previous snapshot stays.
+    """
+
+    def __init__(
+        self,
+        config_file: str = "./config/config.ini",
+        interval_seconds: float = None,
+        environ: Mapping[str, str] = None,
+    ) -> None:
+        self.config_file = config_file
+        # None follows config_reload.interval_seconds of the current snapshot
+        self.interval_seconds = interval_seconds
+        self.environ = environ
+        self.reloads = 0
+        self.failures = 0
+        self.last_error: Optional[ConfigError] = None
+        self._stamp = self._get_stamp()
+        self._current = Config(config_file, environ)
+        self._listeners: List[ConfigListener] = []
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread: threading.Thread = None
+
+    @property
+    def current(self) -> Config:
+        return self._current
+
+    def subscribe(self, listener: ConfigListener) -> None:
+        """Call listener(old, new) after every successful reload"""
+        with self._lock:
+            self._listeners.append(listener)
+
+    def reload(self) -> bool:
+        """Load the file again, returns whether a new snapshot was published"""
+        with self._lock:
+            try:
+                snapshot = Config(self.config_file, self.environ)
+            except ConfigError as error:
+                self.failures += 1
+                self.last_error = error
+                return False
+            previous, self._current = self._current, snapshot
+            self.reloads += 1
+            self.last_error = None
+            listeners = list(self._listeners)
+        for listener in listeners:
+            listener(previous, snapshot)
+        return True
+
+    def check(self) -> bool:
+        """Reload if the file changed since it was last read"""
+        stamp = self._get_stamp()
+        if stamp == self._stamp:
+            return False
+        self._stamp = stamp
+        return self.reload()
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="config-reload", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = None) -> None:
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.get_interval()):
+            try:
+                self.check()
+            except Exception:  # pylint: disable=broad-except
+                # A failing listener must not stop later reloads
+                self.failures += 1
+
+    def get_interval(self) -> float:
+        if self.interval_seconds is not None:
+            return self.interval_seconds
+        return self._current.config_reload.interval_seconds
+
+    def _get_stamp(self) -> Optional[Tuple[int, int, int]]:
+        try:
+            stat = os.stat(self.config_file)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size, stat.st_ino
@@ -0,0 +1,108 @@
+"""Module providing warm-up and idle keep-alive of pooled upstream connections"""
+
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from urllib3.exceptions import HTTPError
+from services.http_client import HttpClient, get_host
+
+WarmTarget = Tuple[HttpClient, str]
+
+
+class ConnectionWarmer:
+    """Keep ``connections_per_host`` pooled connections open to every upstream host
+
+    ``warm`` takes that many connections out of a host's pool at once, so each
+    one is a different connection, and connects those that are not connected:
+    DNS lookup, TCP connect and TLS handshake, without sending a request. Calls
+    made afterwards find them in the pool and skip all three.
+
+    While started, hosts without a call for ``keepalive_interval_seconds`` get
+    their pooled connections opened afresh, so connections an upstream closes
+    for idling are replaced before a user's call would have to.
+    """
+
+    def __init__(
+        self,
+        get_targets: Callable[[], Iterable[WarmTarget]],
+        connections_per_host: int = 2,
+        keepalive_interval_seconds: float = 30,
+    ) -> None:
+        self.get_targets = get_targets
+        self.connections_per_host = connections_per_host
+        self.keepalive_interval_seconds = keepalive_interval_seconds
+        self.warmed = 0
+        self.failures = 0
+        self.last_error: Optional[Exception] = None
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread: threading.Thread = None
+
+    def warm(self, idle_only: bool = False) -> int:
+        """Connect the pooled connections of every target host, returns how many are open
+
+        With ``idle_only`` only hosts without a call within the keep-alive
+        interval are warmed, and their connections are opened afresh.
+        """
+        warmed = 0
+        for http_client, url in self.get_hosts():
+            if idle_only and http_client.idle_seconds(url) < self.keepalive_interval_seconds:
+                continue
+            warmed += self.warm_host(http_client, url, reconnect=idle_only)
+        return warmed
+
+    def get_hosts(self) -> List[WarmTarget]:
+        """One target url per client and host, clients with their own pools are warmed apart"""
+        hosts: Dict[Tuple[int, str], WarmTarget] = {}
+        for http_client, url in self.get_targets():
+            hosts.setdefault((id(http_client), get_host(url)), (http_client, url))
+        return list(hosts.values())
+
+    def warm_host(self, http_client: HttpClient, url: str, reconnect: bool = False) -> int:
+        pool = http_client.get_pool(url)
+        connect_timeout = http_client.http_config.connect_timeout_seconds
+        taken = []
+        warmed = 0
+        try:
+            for _ in range(min(self.connections_per_host, http_client.http_config.pool_maxsize)):
+                # Connections held here are not handed out again, so the next one is another
+                connection = pool._get_conn(timeout=connect_timeout)  # pylint: disable=protected-access
+                taken.append(connection)
+                if connection.sock is None or reconnect:
+                    connection.close()
+                    connection.timeout = connect_timeout
+                    connection.connect()
+                warmed += 1
+        except (HTTPError, OSError) as error:
+            with self._lock:
+                self.failures += 1
+                self.last_error = error
+        finally:
+            for connection in taken:
+                pool._put_conn(connection)  # pylint: disable=protected-access
+        http_client.mark_used(url)
+        with self._lock:
+            self.warmed += warmed
+        return warmed
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="connection-keepalive", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = None) -> None:
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self) -> None:
+        # Checking twice per interval keeps a host from idling much longer than the interval
+        while not self._stopped.wait(self.keepalive_interval_seconds / 2):
+            try:
+                self.warm(idle_only=True)
+            except Exception:  # pylint: disable=broad-except
+                # A failing round must not stop later ones
+                with self._lock:
+                    self.failures += 1
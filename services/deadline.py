@@ -0,0 +1,28 @@
+"""Module providing a time budget that upstream calls of one request share"""
+
+import time
+from typing import Callable, Tuple
+
+
+class Deadline:
+    """Point in time by which a request must be answered
+
+    Each upstream call made on its behalf gets at most the remaining budget as
+    its connect and read timeouts, so a slow first call leaves less time for the
+    next one instead of every call waiting for its full timeout.
+    """
+
+    def __init__(self, seconds: float, clock: Callable[[], float] = time.monotonic) -> None:
+        self.clock = clock
+        self.expires_at = clock() + seconds
+
+    def remaining(self) -> float:
+        return max(self.expires_at - self.clock(), 0.0)
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def get_timeout(self, connect_seconds: float, read_seconds: float) -> Tuple[float, float]:
+        """Connect and read timeouts capped by the remaining budget"""
+        remaining = self.remaining()
+        return min(connect_seconds, remaining), min(read_seconds, remaining)
@@ -1,45 +1,130 @@
 from dataclasses import dataclass, field
+from functools import lru_cache
+import json
+import textwrap
 import time
-from services.application_state import ApplicationState
-from services.config_loader import Config
+from typing import Any, Dict, Iterable, Iterator, Optional, Tuple
+from services.application_state import ApplicationState, Status
+from services.config_loader import DEFAULT_CLIENT, Config
+from services.models import ApiError
+
+PAGE_HEAD = """
+            <!DOCTYPE html>
+            <html>
+                <head>
+                    <title>Example OAuth 2.0 Authentication</title>
+                    <style>
+                        table {
+                            width: 100%;
+                            max-width: 100%
+                            border-collapse: collapse;
+                            text-align: left;
+                            font-family: Arial, sans-serif;
+                            box-shadow: 0 2px 3px rgba(0,0,0,0.1);
+                        }
+                        th, td {
+                            padding: 8px;
+                            border: 1px solid #ddd;
+                            word-break: break-word;
+                        }
+                        th {
+                            background-color: #f2f2f2;
+                            color: #333;
+                        }
+                        tr:nth-child(even) {
+                            background-color: #f9f9f9;
+                        }
+                        tr:hover {
+                            background-color: #f1f1f1;
+                        }
+                        @media screen and (max-width: 600px) {
+                            table, th, td {
+                                font-size: 0.8em;
+                            }
+                        }
+                    </style>
+                </head>
+                <body>
+                    """
+
+# Placeholder for the List Athletes value when the page is split around it
+LIST_ATHLETES_SLOT = "\0list-athletes\0"
+
+PAGE_END = """</td>
+                        </tr>
+                    </table>
+                </body>
+            </html>
+        """
+
+@lru_cache(maxsize=1024)
+def format_expiration(access_token_expire: float) -> str:
+    """A token's expiry only changes when it is refreshed, so format it once"""
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(access_token_expire))
+
+def build_auth_link(authorization_url, client_id, redirect_uri, scopes):
+    auth_url = (
+        f"{authorization_url}?response_type=code"
+        f"&client_id={client_id}"
+        f"&redirect_uri={redirect_uri}"
+        f"&scope={scopes}"
+    )
+    return f'<a href="{auth_url}">Authorize</a>'
+
+@dataclass(frozen=True)
+class RenderLinks:
+    """Links that only depend on Config, built once instead of on every render"""
+    authorize: str
+    get_token: str
+    refresh_token: str
+    list_athletes: str
+
+    @classmethod
+    def from_config(cls, config: Config, client: str = DEFAULT_CLIENT) -> "RenderLinks":
+        local_url = config.server.get_local_url(client)
+        oauth = config.get_client(client).oauth
+        return cls(
+            authorize=build_auth_link(
+                oauth.authorization_url,
+                oauth.client_id,
+                config.server.get_redirect_uri(client),
+                oauth.scopes
+            ),
+            get_token=f'<a href="{local_url}/get-token">Get Token</a>',
+            refresh_token=f'<a href="{local_url}/refresh-token">Refresh Token</a>',
+            list_athletes=f'<a href="{local_url}/get-test-data">Make Example Call</a>',
+        )
 
 @dataclass
 class HtmlRenderer:
     config: Config
     state: ApplicationState = field(default_factory=ApplicationState)
+    links: RenderLinks = None
+
+    def __post_init__(self):
+        if self.links is None:
+            self.links = RenderLinks.from_config(self.config)
 
     def get_auth_link(self, authorization_url, client_id, redirect_uri, scopes):
-        auth_url = (
-            f"{authorization_url}?response_type=code"
-            f"&client_id={client_id}"
-            f"&redirect_uri={redirect_uri}"
-            f"&scope={scopes}"
-        )
-        return f'<a href="{auth_url}">Authorize</a>'
+        return build_auth_link(authorization_url, client_id, redirect_uri, scopes)
     
     def get_authorization_value(self):
         """Get the the HTML for the Value column of the Authoization Code Row"""
         if self.state.is_authorization_complete():
             return self.state.authorization_code_response.authorization_code
-        return self.get_auth_link(
-            self.config.oauth.authorization_url,
-            self.config.oauth.client_id,
-            self.config.server.get_redirect_uri(),
-            self.config.oauth.scopes
-        )
+        return self.links.authorize
 
     def get_token_value(self):
         """Get a HTML Link to the Get Token endpoint"""
         if not self.state.is_authorization_complete():
             return ""
         if not self.state.is_token_complete():
-            return f'<a href="{self.config.server.get_local_url()}/get-token">Get Token</a>'
+            return self.links.get_token
         if self.state.token_code_response.is_token_expired():
-            return f'<a href="{self.config.server.get_local_url()}/refresh-token">Refresh Token</a>'
+            return self.links.refresh_token
 
-        human_readable_expire = time.strftime(
-            "%Y-%m-%d %H:%M:%S", 
-            time.gmtime(self.state.token_code_response.access_token_expire)
+        human_readable_expire = format_expiration(
+            self.state.token_code_response.access_token_expire
         )
         return (
             f'''
@@ -48,7 +133,7 @@ class HtmlRenderer:
                 "Refresh Token": "{self.state.token_code_response.refresh_token}",<br /><br />
                 "Token Expiration": "{human_readable_expire}"<br /><br />
             }}<br />
-            <a href="{self.config.server.get_local_url()}/refresh-token">Refresh Token</a>
+            {self.links.refresh_token}
             '''
         )
 
@@ -61,7 +146,7 @@ class HtmlRenderer:
         if self.state.token_code_response.is_token_expired():
             return "Token Expired, Refresh Token."
         if not self.state.is_list_athletes_complete():
-            return f'<a href="{self.config.server.get_local_url()}/get-test-data">Make Example Call</a>'
+            return self.links.list_athletes
         return self.state.list_athletes_response.data
 
     def set_authorization_exception(self):
@@ -96,49 +181,72 @@ class HtmlRenderer:
             f"<p>Body: {body}</p>"
         )
 
+    def set_upstream_unavailable_exception(self, failure: ApiError):
+        self.state.exception_text = (
+            f"<h3>Upstream Unavailable</h3>"
+            f"<p>TrainingPeaks did not answer in time or is failing, please try again shortly</p>"
+            f"<p>Status: {failure.status_code}</p>"
+            f"<p>Reason: {failure.description}</p>"
+        )
+
+    def set_token_failure(self, failure: ApiError = None):
+        """Show a failed Get/Refresh Token call, telling an unavailable upstream apart"""
+        if failure is not None and failure.is_upstream_unavailable():
+            self.state.token_code_request_status = Status.UNAVAILABLE.value
+            self.set_upstream_unavailable_exception(failure)
+        else:
+            self.state.token_code_request_status = Status.FAILURE.value
+            self.set_token_exception()
+
+    def set_list_athletes_failure(self, failure: ApiError):
+        """Show a failed List Athletes call, telling an unavailable upstream apart"""
+        if failure.is_upstream_unavailable():
+            self.state.list_athletes_request_status = Status.UNAVAILABLE.value
+            self.set_upstream_unavailable_exception(failure)
+        else:
+            self.state.list_athletes_request_status = Status.FAILURE.value
+            self.set_list_athlete_exception(failure.status_code, failure.message)
+
     def clear_exceptions(self):
         self.state.exception_text = ""
 
     def render(self):
         """Get HTML response based on current session state"""
-        return f"""
-            <!DOCTYPE html>
-            <html>
-                <head>
-                    <title>Example OAuth 2.0 Authentication</title>
-                    <style>
-                        table {{
-                            width: 100%;
-                            max-width: 100%
-                            border-collapse: collapse;
-                            text-align: left;
-                            font-family: Arial, sans-serif;
-                            box-shadow: 0 2px 3px rgba(0,0,0,0.1);
-                        }}
-                        th, td {{
-                            padding: 8px;
-                            border: 1px solid #ddd;
-                            word-break: break-word;
-                        }}
-                        th {{
-                            background-color: #f2f2f2;
-                            color: #333;
-                        }}
-                        tr:nth-child(even) {{
-                            background-color: #f9f9f9;
-                        }}
-                        tr:hover {{
-                            background-color: #f1f1f1;
-                        }}
-                        @media screen and (max-width: 600px) {{
-                            table, th, td {{
-                                font-size: 0.8em;
-                            }}
-                        }}
-                    </style>
-                </head>
-                <body>
-                    {self.state.exception_text}
+        return self.render_page(
+            self.state.list_athletes_request_status, self.get_list_athletes_value()
+        )
+
+    def render_stream(self, athletes: Iterable[Dict[str, Any]]) -> Iterator[str]:
+        """Get HTML response with athletes streamed into the List Athletes row
+
+        The rest of the page is rendered from the current state straight away, so
+        the session does not need to stay locked while the athletes stream.
+        """
+        page_start, page_end = self.get_page_parts(Status.SUCCESS.value)
+        return self._stream_page(page_start, athletes, page_end)
+
+    def _stream_page(
+        self, page_start: str, athletes: Iterable[Dict[str, Any]], page_end: str
+    ) -> Iterator[str]:
+        yield page_start
+        # Matches json.dumps(athletes, indent=4) one record at a time
+        separator = "[\n"
+        for athlete in athletes:
+            yield separator + textwrap.indent(json.dumps(athlete, indent=4), "    ")
+            separator = ",\n"
+        yield "[]" if separator == "[\n" else "\n]"
+        yield page_end
+
+    def get_page_parts(self, list_athletes_status: str) -> Tuple[str, str]:
+        """Get the page before and after the value of the List Athletes row"""
+        page_start, _, page_end = self.render_page(
+            list_athletes_status, LIST_ATHLETES_SLOT
+        ).partition(LIST_ATHLETES_SLOT)
+        return page_start, page_end
+
+    def render_page(self, list_athletes_status: str, list_athletes_value: str) -> str:
+        """Fill the dynamic fragments into the precompiled page shell"""
+        return f"""{PAGE_HEAD}{self.state.exception_text}
                     <table>
                         <tr>
                             <th width="25%">Step</th>
@@ -157,11 +265,24 @@ class HtmlRenderer:
                         </tr>
                         <tr>
                             <td>List Athletes Request</td>
-                            <td>{self.state.list_athletes_request_status}</td>
-                            <td>{self.get_list_athletes_value()}</td>
-                        </tr>
-                    </table>
-                </body>
-            </html>
-        """
-    
\ No newline at end of file
+                            <td>{list_athletes_status}</td>
+                            <td>{list_athletes_value}{PAGE_END}"""
+    
+
+
+@dataclass
+class TimedHtmlRenderer(HtmlRenderer):
+    """HtmlRenderer that keeps the duration and page status of its last render
+
+    The servers record it once per request after the view returned, so
+    rendering itself does not pay for the metrics.
+    """
+    render_timing: Optional[Tuple[float, str]] = field(default=None, init=False, repr=False)
+
+    def render(self):
+        started = time.perf_counter()
+        page = super().render()
+        self.render_timing = (
+            time.perf_counter() - started, self.state.list_athletes_request_status
+        )
+        return page
@@ -0,0 +1,363 @@
+"""Module providing a pooled, keep-alive HTTP transport for Public API and OAuth calls"""
+
+from contextlib import nullcontext
+from http.cookiejar import DefaultCookiePolicy
+import json
+import threading
+import time
+from typing import Dict, Optional, Tuple, Union
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool
+from urllib3.exceptions import MaxRetryError, ReadTimeoutError, ResponseError
+from urllib3.util.retry import Retry
+from urllib3.util.timeout import Timeout
+from services.circuit_breaker import CircuitBreaker
+from services.config_loader import HttpConfig
+from services.deadline import Deadline
+from services.metrics import UPSTREAM_CALLS, UPSTREAM_PHASE_DURATION, UPSTREAM_REQUEST_DURATION
+from services.models import CIRCUIT_OPEN_ERROR, DEADLINE_EXCEEDED_ERROR
+from services.rate_limiter import RateLimiter
+from services.upstream_timing import SlowCallLog, TimedHTTPAdapter, UpstreamTiming, measure
+
+RETRY_STATUS_CODES = (502, 503, 504)
+# Responses that count against an endpoint's circuit, along with errors that got no response
+CIRCUIT_FAILURE_STATUS_CODES = (500, 502, 503, 504)
+# Shortest timeout an attempt gets, a zero timeout would make its socket non-blocking
+MIN_ATTEMPT_TIMEOUT_SECONDS = 0.001
+
+# Deadline of the call the current thread is sending, read by DeadlineRetry
+_current_call = threading.local()
+
+
+class DeadlineRetry(Retry):
+    """Retry that gives up once the wait before the next attempt would outlast the call's deadline
+
+    The adapter's Retry is shared by every call, so the deadline of the call
+    being retried is taken from the sending thread.
+    """
+
+    def increment(
+        self, method=None, url=None, response=None, error=None, _pool=None, _stacktrace=None
+    ) -> "DeadlineRetry":
+        retry = super().increment(method, url, response, error, _pool, _stacktrace)
+        deadline: Optional[Deadline] = getattr(_current_call, "deadline", None)
+        if deadline is not None and retry.get_wait(response) >= deadline.remaining():
+            if isinstance(error, ReadTimeoutError):
+                # Reported as the timeout it is, like a read urllib3 does not retry
+                raise error
+            # Like running out of retries, a status retry then returns the last response
+            raise MaxRetryError(
+                _pool, url, error or ResponseError("no time left before the deadline to retry")
+            )
+        return retry
+
+    def get_wait(self, response=None) -> float:
+        """Seconds sleep() waits before the next attempt"""
+        if response is not None and self.respect_retry_after_header:
+            retry_after = self.get_retry_after(response)
+            if retry_after is not None:
+                return retry_after
+        return self.get_backoff_time()
+
+
+class DeadlineTimeout(Timeout):
+    """Connect and read timeouts capped by what is left of a deadline when they are used
+
+    urllib3 clones the timeout for every attempt, so a retried call's attempts
+    get less time as the deadline nears instead of the full timeouts each.
+    """
+
+    def __init__(self, connect: float, read: float, deadline: Deadline) -> None:
+        super().__init__(connect=connect, read=read)
+        self.deadline = deadline
+
+    def clone(self) -> "DeadlineTimeout":
+        return DeadlineTimeout(self._connect, self._read, self.deadline)
+
+    @property
+    def connect_timeout(self) -> float:
+        return self._cap(super().connect_timeout)
+
+    @property
+    def read_timeout(self) -> float:
+        return self._cap(super().read_timeout)
+
+    def _cap(self, seconds: float) -> float:
+        return min(seconds, max(self.deadline.remaining(), MIN_ATTEMPT_TIMEOUT_SECONDS))
+
+
+class HttpClient:
+    """Thread-safe wrapper around a pooled requests.Session
+
+    Connections are kept alive and reused per host, so token exchanges and API
+    calls only pay the DNS lookup, TCP connect and TLS handshake once per pooled
+    connection instead of once per call.
+    """
+
+    def __init__(
+        self,
+        http_config: HttpConfig = None,
+        client_id: str = "default",
+        rate_limiter: RateLimiter = None,
+        circuit_breaker: CircuitBreaker = None,
+        slow_call_log: SlowCallLog = None,
+    ) -> None:
+        self.http_config: HttpConfig = http_config or HttpConfig()
+        self.client_id = client_id
+        self.rate_limiter = rate_limiter
+        self.circuit_breaker = circuit_breaker
+        self.slow_call_log = slow_call_log
+        # When each host was last called, read by the connection keep-alive
+        self._last_used: Dict[str, float] = {}
+        self.session: requests.Session = requests.Session()
+        # Tokens are per user, so never share cookies between callers
+        self.session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+
+        adapter_class = TimedHTTPAdapter if self.http_config.phase_timing else HTTPAdapter
+        adapter = adapter_class(
+            pool_connections=self.http_config.pool_connections,
+            pool_maxsize=self.http_config.pool_maxsize,
+            pool_block=self.http_config.pool_block,
+            max_retries=self.get_retry(),
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def get_retry(self) -> Retry:
+        """Retry connection errors for every method, but only replay idempotent requests"""
+        return DeadlineRetry(
+            total=self.http_config.max_retries,
+            backoff_factor=self.http_config.backoff_factor,
+            status_forcelist=RETRY_STATUS_CODES,
+            allowed_methods=Retry.DEFAULT_ALLOWED_METHODS,
+            raise_on_status=False,
+        )
+
+    def request(
+        self,
+        method: str,
+        url: str,
+        operation: str = "http",
+        endpoint: str = None,
+        deadline: Deadline = None,
+        **kwargs,
+    ) -> requests.Response:
+        """Send a request, ``operation`` and ``endpoint`` label its latency metrics
+
+        ``endpoint`` defaults to the url without its query, pass a template for
+        urls that embed ids to keep the number of series bounded. It also keys
+        the rate limit and the circuit breaker. Without an explicit ``timeout``
+        the configured connect and read timeouts apply, capped by what is left of
+        ``deadline`` when each attempt connects and reads. Retries stop once the
+        wait before the next attempt would outlast ``deadline``.
+        With phase timing enabled, the response's ``timing`` tells where the
+        time of the call went.
+        """
+        endpoint = endpoint or get_endpoint(url)
+        self.mark_used(url)
+        timing = UpstreamTiming(operation, endpoint) if self.http_config.phase_timing else None
+        started = time.perf_counter()
+        status = "error"
+        try:
+            with nullcontext() if timing is None else measure(timing):
+                response = self._send(method, url, endpoint, deadline, **kwargs)
+            status = str(response.status_code)
+            if timing is not None:
+                response.timing = timing
+            return response
+        finally:
+            finished = time.perf_counter()
+            UPSTREAM_REQUEST_DURATION.observe(finished - started, operation, endpoint, status)
+            if timing is not None:
+                self.record_timing(timing, status, finished - started, finished, kwargs.get("stream"))
+
+    def record_timing(
+        self, timing: UpstreamTiming, status: str, elapsed: float, finished: float, streamed: bool
+    ) -> None:
+        timing.status = status
+        timing.total_seconds = elapsed
+        if timing.headers_received_at and not streamed:
+            timing.body_seconds = finished - timing.headers_received_at
+        if timing.reused_connection is not None:
+            UPSTREAM_CALLS.inc(timing.endpoint, str(timing.reused_connection).lower())
+            for phase, seconds in timing.phases().items():
+                if seconds > 0:
+                    UPSTREAM_PHASE_DURATION.observe(seconds, timing.operation, timing.endpoint, phase)
+        if self.slow_call_log is not None:
+            self.slow_call_log.record(timing)
+
+    def mark_used(self, url: str) -> None:
+        self._last_used[get_host(url)] = time.monotonic()
+
+    def idle_seconds(self, url: str) -> float:
+        """Seconds since the last call to the url's host, infinite if there was none"""
+        last_used = self._last_used.get(get_host(url))
+        return float("inf") if last_used is None else time.monotonic() - last_used
+
+    def get_pool(self, url: str) -> HTTPConnectionPool:
+        """The connection pool calls to the url's host are sent through"""
+        return self.session.get_adapter(url).poolmanager.connection_from_url(url)
+
+    def get_timeout(self, deadline: Deadline = None) -> Union[Tuple[float, float], Timeout]:
+        timeout = (self.http_config.connect_timeout_seconds, self.http_config.read_timeout_seconds)
+        return timeout if deadline is None else DeadlineTimeout(*timeout, deadline)
+
+    def _send(
+        self, method: str, url: str, endpoint: str, deadline: Deadline, **kwargs
+    ) -> requests.Response:
+        if deadline is not None and deadline.expired():
+            return self.get_deadline_exceeded_response(url)
+        if self.circuit_breaker is not None:
+            retry_after = self.circuit_breaker.allow(endpoint)
+            if retry_after is not None:
+                return self.get_unavailable_response(
+                    url, 503, "Service Unavailable", CIRCUIT_OPEN_ERROR,
+                    f"{endpoint} is failing, calls to it are paused", retry_after,
+                )
+        delay = self.wait_for_turn(endpoint, deadline)
+        if delay is not None or (deadline is not None and deadline.expired()):
+            if self.circuit_breaker is not None:
+                # Nothing was sent, a half-open probe is given back
+                self.circuit_breaker.cancel(endpoint)
+            return self.get_refused_response(url, delay)
+        # Only now, the wait for a turn used up part of the budget
+        if "timeout" not in kwargs:
+            kwargs["timeout"] = self.get_timeout(deadline)
+        if self.circuit_breaker is None:
+            return self._send_observed(method, url, endpoint, deadline, **kwargs)
+
+        try:
+            response = self._send_observed(method, url, endpoint, deadline, **kwargs)
+        except requests.RequestException:
+            self.circuit_breaker.record_failure(endpoint)
+            raise
+        if response.status_code in CIRCUIT_FAILURE_STATUS_CODES:
+            self.circuit_breaker.record_failure(endpoint)
+        elif response.status_code == 429:
+            # Says nothing about the endpoint's health, a half-open probe is given back
+            self.circuit_breaker.cancel(endpoint)
+        else:
+            self.circuit_breaker.record_success(endpoint)
+        return response
+
+    def wait_for_turn(self, endpoint: str, deadline: Deadline = None) -> Optional[float]:
+        """Wait until the rate limiter allows a call, returns the delay if it is too long to wait"""
+        if self.rate_limiter is None:
+            return None
+        return self.rate_limiter.acquire(
+            (self.client_id, endpoint), get_max_wait(self.rate_limiter, deadline)
+        )
+
+    def _send_observed(
+        self, method: str, url: str, endpoint: str, deadline: Deadline, **kwargs
+    ) -> requests.Response:
+        _current_call.deadline = deadline
+        try:
+            response = self.session.request(method, url, **kwargs)
+        finally:
+            _current_call.deadline = None
+        if self.rate_limiter is not None:
+            self.rate_limiter.observe(
+                (self.client_id, endpoint), response.status_code, response.headers
+            )
+        return response
+
+    def get_refused_response(self, url: str, delay: Optional[float]) -> requests.Response:
+        """The local failure of a call that did not get its turn in time
+
+        A 429 when the rate limiter would not wait that long, a 504 when it would
+        have but the request's deadline would not.
+        """
+        if delay is not None and delay > self.rate_limiter.max_wait_seconds:
+            return self.get_rate_limited_response(url, delay)
+        return self.get_deadline_exceeded_response(url)
+
+    def get_deadline_exceeded_response(self, url: str) -> requests.Response:
+        return self.get_unavailable_response(
+            url, 504, "Gateway Timeout", DEADLINE_EXCEEDED_ERROR,
+            "The request ran out of time before this call could be made",
+        )
+
+    def get_rate_limited_response(self, url: str, delay: float) -> requests.Response:
+        """A local 429 for calls that would have to wait longer than the limiter allows"""
+        response = requests.Response()
+        response.status_code = 429
+        response.reason = "Too Many Requests"
+        response.url = url
+        response.headers["Retry-After"] = str(max(1, round(delay)))
+        response._content = b""
+        return response
+
+    def get_unavailable_response(
+        self,
+        url: str,
+        status_code: int,
+        reason: str,
+        error: str,
+        description: str,
+        retry_after: float = None,
+    ) -> requests.Response:
+        """A local failure for calls that are not sent, with an OAuth style error body"""
+        response = requests.Response()
+        response.status_code = status_code
+        response.reason = reason
+        response.url = url
+        response.headers["Content-Type"] = "application/json"
+        if retry_after is not None:
+            response.headers["Retry-After"] = str(max(1, round(retry_after)))
+        response._content = json.dumps(
+            {"error": error, "error_description": description}
+        ).encode()
+        return response
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+
+    def close(self) -> None:
+        self.session.close()
+
+
+def get_max_wait(rate_limiter: RateLimiter, deadline: Deadline = None) -> float:
+    """Longest a call waits for its turn, never past the deadline of its request"""
+    if deadline is None:
+        return rate_limiter.max_wait_seconds
+    return min(rate_limiter.max_wait_seconds, deadline.remaining())
+
+
+def get_endpoint(url: str) -> str:
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}{parts.path}"
+
+
+def get_host(url: str) -> str:
+    """Scheme and host of a url, which share one connection pool"""
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}"
+
+
+_default_client: HttpClient = None
+_default_client_lock = threading.Lock()
+
+
+def get_default_client() -> HttpClient:
+    """Get the process wide client used when no client is passed explicitly"""
+    global _default_client
+    if _default_client is None:
+        with _default_client_lock:
+            if _default_client is None:
+                _default_client = HttpClient()
+    return _default_client
+
+
+def set_default_client(client: HttpClient) -> None:
+    """Replace the process wide client, e.g. with one built from config.ini"""
+    global _default_client
+    with _default_client_lock:
+        previous, _default_client = _default_client, client
+    if previous is not None and previous is not client:
+        previous.close()
@@ -0,0 +1,66 @@
+"""Module providing compact JSON bodies for the /api routes, built straight from the response models"""
+
+import json
+import time
+from typing import Any, Dict, Optional
+from services.models import ApiError
+from services.public_api import GetTokenResponse, ListAthleteResponse
+
+API_PATH = "/api"
+JSON_CONTENT_TYPE = "application/json"
+
+# Error codes of requests the current session cannot serve yet
+AUTHORIZATION_REQUIRED_ERROR = "authorization_required"
+TOKEN_REQUIRED_ERROR = "token_required"
+TOKEN_EXPIRED_ERROR = "token_expired"
+# Error code of a failed upstream call whose body named none
+UPSTREAM_ERROR = "upstream_error"
+
+
+def dumps(payload: Any) -> str:
+    """Serialize without whitespace, athletes are written like the JSON objects they were decoded from"""
+    return json.dumps(payload, separators=(",", ":"), default=dict)
+
+
+def token_body(response: GetTokenResponse, now: float = None) -> str:
+    now = time.time() if now is None else now
+    return dumps({
+        "access_token": response.access_token,
+        "refresh_token": response.refresh_token,
+        "expires_at": int(response.access_token_expire),
+        "expires_in": max(int(response.access_token_expire - now), 0),
+    })
+
+
+def athletes_body(response: ListAthleteResponse) -> str:
+    return dumps({"athletes": response.athletes})
+
+
+def error_body(error: str, description: str = None, status_code: int = None) -> str:
+    body: Dict[str, Any] = {"error": error}
+    if description:
+        body["error_description"] = description
+    if status_code is not None:
+        body["status_code"] = status_code
+    return dumps(body)
+
+
+def failure_body(failure: Optional[ApiError]) -> str:
+    """Error body of a failed upstream call, with the status it failed with"""
+    if failure is None:
+        return error_body(UPSTREAM_ERROR)
+    return error_body(failure.error or UPSTREAM_ERROR, failure.description, failure.status_code)
+
+
+def failure_status(failure: Optional[ApiError]) -> int:
+    """Status an /api route answers a failed upstream call with
+
+    Client errors are passed on, so a rejected code is a 400 and a revoked token
+    a 401. Timeouts, connection errors, open circuits and exceeded deadlines keep
+    their 502/503/504, and any other upstream failure is a 502.
+    """
+    if failure is None:
+        return 502
+    if failure.is_upstream_unavailable() or 400 <= failure.status_code < 500:
+        return failure.status_code
+    return 502
@@ -0,0 +1,86 @@
+"""Module providing incremental parsing of large JSON array payloads"""
+
+import codecs
+import json
+import re
+from typing import Any, Iterable, Iterator, Tuple
+
+WHITESPACE = " \t\n\r"
+# Everything after a decoded value that could still be the rest of a split number
+NUMBER_TAIL = re.compile(r"[0-9eE.+\-]*\Z")
+
+
+def iter_json_array(chunks: Iterable[bytes], encoding: str = "utf-8") -> Iterator[Any]:
+    """Yield the items of a top level JSON array as its bytes arrive
+
+    Only the item being decoded is buffered, so memory stays bounded by the
+    largest single item rather than the whole payload.
+    """
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder(encoding)()
+    buffer = ""
+    position = 0
+    started = False
+    empty = True
+    expect_item = True
+    chunks = iter(chunks)
+    final = False
+
+    while True:
+        position = _skip_whitespace(buffer, position)
+        if position == len(buffer):
+            if final:
+                raise ValueError("Unexpected end of JSON array")
+            buffer, final = _read_more(buffer, position, chunks, text_decoder)
+            position = 0
+            continue
+
+        if not started:
+            if buffer[position] != "[":
+                raise ValueError("Expected a JSON array")
+            started = True
+            position += 1
+            continue
+
+        if buffer[position] == "]" and (not expect_item or empty):
+            return
+
+        if not expect_item:
+            if buffer[position] != ",":
+                raise ValueError(f"Expected ',' or ']' at offset {position}")
+            expect_item = True
+            position += 1
+            continue
+
+        try:
+            item, end = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            end = None
+        if end is None or (not final and NUMBER_TAIL.match(buffer, end)):
+            if final:
+                raise ValueError("Unexpected end of JSON array")
+            buffer, final = _read_more(buffer, position, chunks, text_decoder)
+            position = 0
+            continue
+
+        yield item
+        expect_item = False
+        empty = False
+        position = end
+
+
+def _skip_whitespace(buffer: str, position: int) -> int:
+    while position < len(buffer) and buffer[position] in WHITESPACE:
+        position += 1
+    return position
+
+
+def _read_more(
+    buffer: str, position: int, chunks: Iterator[bytes], text_decoder: codecs.IncrementalDecoder
+) -> Tuple[str, bool]:
+    """Append the next chunk to the unparsed tail, flags when the input is exhausted"""
+    for chunk in chunks:
+        text = text_decoder.decode(chunk)
+        if text:
+            return buffer[position:] + text, False
+    return buffer[position:] + text_decoder.decode(b"", final=True), True
@@ -0,0 +1,238 @@
+"""Module providing a low overhead metrics registry with Prometheus text exposition"""
+
+from bisect import bisect_left
+import math
+import threading
+from typing import Callable, Dict, Iterator, List, Sequence, Tuple
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+RENDER_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.005, 0.01)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Label name and value pairs
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+def _split_labels(
+    constant_labels: Labels, labelnames: Tuple[str, ...] = ()
+) -> Tuple[Tuple[str, ...], Tuple[str, ...]]:
+    names = tuple(name for name, _ in constant_labels) + labelnames
+    return names, tuple(value for _, value in constant_labels)
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    metric_type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def render(self, constant_labels: Labels = ()) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} {self.metric_type}"
+        yield from self.render_samples(constant_labels)
+
+    def render_samples(self, constant_labels: Labels = ()) -> Iterator[str]:
+        """Samples of the metric, with constant_labels before the metric's own labels"""
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    metric_type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labelvalues: str, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def get(self, *labelvalues: str) -> float:
+        with self._lock:
+            return self._values.get(labelvalues, 0)
+
+    def render_samples(self, constant_labels: Labels = ()) -> Iterator[str]:
+        with self._lock:
+            values = list(self._values.items())
+        names, constant_values = _split_labels(constant_labels, self.labelnames)
+        for labelvalues, value in values:
+            labels = _format_labels(names, constant_values + labelvalues)
+            yield f"{self.name}{labels} {_format_value(value)}"
+
+
+class Gauge(Counter):
+    metric_type = "gauge"
+
+    def set(self, value: float, *labelvalues: str) -> None:
+        with self._lock:
+            self._values[labelvalues] = value
+
+
+class FunctionMetric(Metric):
+    """Metric read from a callback at scrape time, e.g. stats kept by another component"""
+
+    def __init__(
+        self, name: str, documentation: str, metric_type: str, function: Callable[[], float]
+    ) -> None:
+        super().__init__(name, documentation)
+        self.metric_type = metric_type
+        self.function = function
+
+    def render_samples(self, constant_labels: Labels = ()) -> Iterator[str]:
+        names, values = _split_labels(constant_labels)
+        yield f"{self.name}{_format_labels(names, values)} {_format_value(self.function())}"
+
+
+class Histogram(Metric):
+    """Fixed bucket histogram, observing costs one bisect and a few increments"""
+
+    metric_type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label values: count per bucket (last one is +Inf), sum, count
+        self._series: Dict[Tuple[str, ...], List] = {}
+
+    def observe(self, value: float, *labelvalues: str) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                series = [[0] * (len(self.buckets) + 1), 0.0, 0]
+                self._series[labelvalues] = series
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def get_count(self, *labelvalues: str) -> int:
+        with self._lock:
+            series = self._series.get(labelvalues)
+            return series[2] if series else 0
+
+    def render_samples(self, constant_labels: Labels = ()) -> Iterator[str]:
+        with self._lock:
+            series = [
+                (labelvalues, list(counts), total, count)
+                for labelvalues, (counts, total, count) in self._series.items()
+            ]
+        labelnames, constant_values = _split_labels(constant_labels, self.labelnames)
+        bucket_labelnames = labelnames + ("le",)
+        for labelvalues, counts, total, count in series:
+            labelvalues = constant_values + labelvalues
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+                cumulative += bucket_count
+                labels = _format_labels(bucket_labelnames, labelvalues + (_format_value(bound),))
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(labelnames, labelvalues)
+            yield f"{self.name}_sum{labels} {_format_value(total)}"
+            yield f"{self.name}_count{labels} {count}"
+
+
+class MetricsRegistry:
+    def __init__(self) -> None:
+        self._metrics: Dict[str, Metric] = {}
+        self._lock = threading.Lock()
+        self._constant_labels: Labels = ()
+
+    def set_constant_labels(self, **labels: str) -> None:
+        """Labels added to every sample, e.g. the worker process the metrics were kept in"""
+        with self._lock:
+            self._constant_labels = tuple((name, str(value)) for name, value in labels.items())
+
+    def register(self, metric: Metric) -> Metric:
+        """Register a metric, registering the same name again returns the existing one"""
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def function(
+        self, name: str, documentation: str, function: Callable[[], float], metric_type: str = "gauge"
+    ) -> FunctionMetric:
+        """Register a metric read from a callback, replacing an earlier callback of the same name"""
+        metric = FunctionMetric(name, documentation, metric_type, function)
+        with self._lock:
+            self._metrics[name] = metric
+        return metric
+
+    def render(self) -> str:
+        """Render every metric in the Prometheus text exposition format"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+            constant_labels = self._constant_labels
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render(constant_labels))
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+UPSTREAM_REQUEST_DURATION = registry.histogram(
+    "tp_upstream_request_duration_seconds",
+    "Duration of calls to the OAuth server and Public API",
+    ("request", "endpoint", "status"),
+)
+UPSTREAM_PHASE_DURATION = registry.histogram(
+    "tp_upstream_phase_duration_seconds",
+    "Duration of the DNS, connect, TLS, time to first byte and body phases of upstream calls",
+    ("request", "endpoint", "phase"),
+)
+UPSTREAM_CALLS = registry.counter(
+    "tp_upstream_calls_total",
+    "Upstream calls sent, by whether they reused a pooled connection",
+    ("endpoint", "reused_connection"),
+)
+RENDER_DURATION = registry.histogram(
+    "tp_render_duration_seconds",
+    "Duration of HtmlRenderer.render",
+    ("page",),
+    buckets=RENDER_BUCKETS,
+)
+ROUTE_REQUEST_DURATION = registry.histogram(
+    "tp_route_request_duration_seconds",
+    "Duration of Flask route handlers",
+    ("route", "method", "status"),
+)
@@ -0,0 +1,152 @@
+"""Module providing compact models that OAuth and Public API bodies are decoded into once"""
+
+from collections.abc import Mapping
+import json
+from typing import Any, Dict, Iterator, Optional
+
+# Athletes of a payload usually share one set of keys, index dicts are shared per key set
+MAX_SHARED_KEY_SETS = 1024
+_key_indexes: Dict[tuple, Dict[str, int]] = {}
+
+# Error codes of failures raised locally, in the same place as OAuth's "error"
+CIRCUIT_OPEN_ERROR = "circuit_open"
+DEADLINE_EXCEEDED_ERROR = "deadline_exceeded"
+TIMEOUT_ERROR = "timeout"
+CONNECTION_ERROR = "connection_error"
+UPSTREAM_UNAVAILABLE_ERRORS = (
+    CIRCUIT_OPEN_ERROR, DEADLINE_EXCEEDED_ERROR, TIMEOUT_ERROR, CONNECTION_ERROR
+)
+# OAuth's error for a refresh token that was revoked, expired or already used
+INVALID_GRANT_ERROR = "invalid_grant"
+
+
+class TokenPayload:
+    """Body of a successful authorization code exchange or token refresh"""
+
+    __slots__ = ("access_token", "refresh_token", "expires_in", "token_type", "scope")
+
+    def __init__(
+        self,
+        access_token: str,
+        refresh_token: str,
+        expires_in: int,
+        token_type: str = None,
+        scope: str = None,
+    ) -> None:
+        self.access_token = access_token
+        self.refresh_token = refresh_token
+        self.expires_in = expires_in
+        self.token_type = token_type
+        self.scope = scope
+
+    @classmethod
+    def from_json(cls, payload: Mapping) -> "TokenPayload":
+        return cls(
+            access_token=payload.get("access_token"),
+            refresh_token=payload.get("refresh_token"),
+            expires_in=int(payload.get("expires_in")),
+            token_type=payload.get("token_type"),
+            scope=payload.get("scope"),
+        )
+
+    def __repr__(self) -> str:
+        return f"TokenPayload(token_type={self.token_type!r}, expires_in={self.expires_in!r})"
+
+
+class Athlete(Mapping):
+    """One athlete of a List Athletes payload, read-only and shaped like the JSON object
+
+    The values live in a tuple and the key to position index is shared by every
+    athlete with the same keys, which takes a fraction of a dict per athlete.
+    """
+
+    __slots__ = ("_index", "_values")
+
+    def __init__(self, index: Dict[str, int], values: tuple) -> None:
+        self._index = index
+        self._values = values
+
+    @classmethod
+    def from_json(cls, payload: Dict[str, Any]) -> "Athlete":
+        keys = tuple(payload)
+        index = _key_indexes.get(keys)
+        if index is None:
+            index = {key: position for position, key in enumerate(keys)}
+            if len(_key_indexes) < MAX_SHARED_KEY_SETS:
+                _key_indexes[keys] = index
+        return cls(index, tuple(payload.values()))
+
+    def __getitem__(self, key: str) -> Any:
+        return self._values[self._index[key]]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._index)
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def __repr__(self) -> str:
+        return f"Athlete({dict(self)!r})"
+
+
+class ApiError:
+    """Status and body of a failed call, with the OAuth/API error code when the body has one"""
+
+    __slots__ = ("status_code", "message", "error", "description")
+
+    def __init__(
+        self, status_code: int, message: str = "", error: str = None, description: str = None
+    ) -> None:
+        self.status_code = status_code
+        self.message = message
+        self.error = error
+        self.description = description
+
+    @classmethod
+    def from_body(cls, status_code: int, text: str) -> "ApiError":
+        error = description = None
+        try:
+            payload = json.loads(text) if isinstance(text, str) and text else None
+        except ValueError:
+            payload = None
+        if isinstance(payload, dict):
+            error = payload.get("error") or payload.get("Error")
+            description = (
+                payload.get("error_description") or payload.get("Message") or payload.get("message")
+            )
+        return cls(status_code, text, error, description)
+
+    @classmethod
+    def from_exception(cls, error: Exception, timed_out: bool) -> "ApiError":
+        """A call that got no response, as a 504 when it timed out and a 502 otherwise"""
+        if timed_out:
+            return cls(504, str(error), TIMEOUT_ERROR, "The upstream call timed out")
+        return cls(502, str(error), CONNECTION_ERROR, "The upstream call could not connect")
+
+    def is_upstream_unavailable(self) -> bool:
+        """Whether the call failed without an answer from upstream, as opposed to being refused"""
+        return self.error in UPSTREAM_UNAVAILABLE_ERRORS
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, ApiError):
+            return NotImplemented
+        return (self.status_code, self.message, self.error, self.description) == (
+            other.status_code, other.message, other.error, other.description
+        )
+
+    def __repr__(self) -> str:
+        return f"ApiError(status_code={self.status_code!r}, error={self.error!r})"
+
+
+def decode_athletes(payload: Any) -> Any:
+    """Athletes of a List Athletes body, anything that is not a list of objects is kept as is"""
+    if not isinstance(payload, list):
+        return payload
+    return tuple(
+        Athlete.from_json(item) if isinstance(item, dict) else item for item in payload
+    )
+
+
+def dumps_athletes(athletes: Any, indent: Optional[int] = 4) -> str:
+    """Serialize decoded athletes exactly like the JSON body they were decoded from"""
+    return json.dumps(athletes, indent=indent, default=dict)
@@ -0,0 +1,145 @@
+"""Module providing sampled cProfile profiles of route handlers and a report of their hot functions
+
+Usage:
+    python -m services.profiler
+    python -m services.profiler ./profiles --top 30 --sort tottime
+"""
+
+import argparse
+import cProfile
+from functools import wraps
+import glob
+import hmac
+import io
+import itertools
+import os
+import pstats
+import random
+import threading
+import time
+from typing import Callable, List, Mapping, Optional, Tuple
+
+PROFILE_SUFFIX = ".prof"
+
+
+class RouteProfiler:
+    """Profile a sampled fraction of route calls, one .prof file per call
+
+    A call is profiled when the random sample picks it or when the request
+    carries ``header`` set to ``header_secret``. Without a secret the header
+    is ignored, so clients cannot make the server profile. Only the newest ``max_profiles`` files are kept in
+    ``directory``. Views are only wrapped when profiling is enabled, so a
+    disabled profiler costs nothing.
+    """
+
+    def __init__(
+        self,
+        directory: str = "./profiles",
+        sample_rate: float = 0.0,
+        header: str = "X-Profile",
+        max_profiles: int = 100,
+        random_value: Callable[[], float] = random.random,
+        header_secret: str = "",
+    ) -> None:
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.header = header
+        self.header_secret = header_secret
+        self.max_profiles = max_profiles
+        self.random_value = random_value
+        self.written = 0
+        # Calls that were picked while another profiler was active on the interpreter
+        self.skipped = 0
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def should_profile(self, headers: Mapping[str, str]) -> bool:
+        if self.header and self.header_secret:
+            value = headers.get(self.header)
+            if value and hmac.compare_digest(value.encode(), self.header_secret.encode()):
+                return True
+        return self.sample_rate > 0 and self.random_value() < self.sample_rate
+
+    def wrap(self, view: Callable, get_headers: Callable[[], Mapping[str, str]]) -> Callable:
+        """Profile calls of view that should_profile picks from the headers get_headers returns"""
+        @wraps(view)
+        def profiled(*args, **kwargs):
+            if not self.should_profile(get_headers()):
+                return view(*args, **kwargs)
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+            except ValueError:
+                # Python 3.12+ allows a single active profiler, e.g. a concurrent request's
+                with self._lock:
+                    self.skipped += 1
+                return view(*args, **kwargs)
+            try:
+                return view(*args, **kwargs)
+            finally:
+                profile.disable()
+                self.save(profile, view.__name__)
+        return profiled
+
+    def save(self, profile: cProfile.Profile, name: str) -> str:
+        """Write a profile and drop the oldest ones beyond max_profiles"""
+        stamp = time.strftime("%Y%m%dT%H%M%S")
+        # The pid keeps files of serve.py's workers apart
+        path = os.path.join(
+            self.directory,
+            f"{stamp}-{os.getpid()}-{next(self._sequence)}-{name}{PROFILE_SUFFIX}",
+        )
+        profile.dump_stats(path)
+        with self._lock:
+            self.written += 1
+            self.rotate()
+        return path
+
+    def rotate(self) -> None:
+        for path in list_profiles(self.directory)[:-self.max_profiles or None]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+def list_profiles(directory: str) -> List[str]:
+    """Profiles in directory, oldest first"""
+    paths = glob.glob(os.path.join(directory, f"*{PROFILE_SUFFIX}"))
+
+    def modified(path: str) -> Tuple[float, str]:
+        try:
+            return os.path.getmtime(path), path
+        except FileNotFoundError:
+            return 0.0, path
+
+    return sorted(paths, key=modified)
+
+
+def top_functions(directory: str, top: int = 20, sort: str = "cumulative") -> Optional[str]:
+    """Hot functions over every profile in directory, None if there is none"""
+    paths = list_profiles(directory)
+    if not paths:
+        return None
+    output = io.StringIO()
+    stats = pstats.Stats(paths[0], stream=output)
+    for path in paths[1:]:
+        stats.add(path)
+    output.write(f"{len(paths)} profiles in {directory}\n")
+    stats.strip_dirs().sort_stats(sort).print_stats(top)
+    return output.getvalue()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Top functions over the profiles written by RouteProfiler")
+    parser.add_argument("directory", nargs="?", default="./profiles")
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--sort", default="cumulative", help="pstats sort key, e.g. tottime")
+    args = parser.parse_args()
+    report = top_functions(args.directory, args.top, args.sort)
+    print(report if report is not None else f"No profiles in {args.directory}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,14 @@
-from dataclasses import asdict, dataclass
-import json
+from dataclasses import dataclass, field
 import time
 import requests
+from typing import Any, Callable, Dict, Iterator, Optional
 from requests.auth import HTTPBasicAuth
+from services.deadline import Deadline
+from services.http_client import HttpClient, get_default_client
+from services.json_stream import iter_json_array
+from services.models import ApiError, TokenPayload, decode_athletes, dumps_athletes
+from services.response_cache import ResponseCache
+from services.upstream_timing import UpstreamTiming
 
 @dataclass
 class AuthorizationCodeResponse:
@@ -13,17 +19,68 @@ class GetTokenResponse:
     refresh_token: str = ""
     access_token: str = ""
     access_token_expire: int = -1
+    # Phases of the call that issued the token, not persisted with it
+    timing: Optional[UpstreamTiming] = field(default=None, compare=False, repr=False)
 
     def is_token_expired(self):
         return False if self.access_token_expire > time.time() else True
 
+    @classmethod
+    def from_payload(
+        cls, payload: TokenPayload, timing: UpstreamTiming = None
+    ) -> "GetTokenResponse":
+        return cls(
+            refresh_token = payload.refresh_token,
+            access_token = payload.access_token,
+            access_token_expire = time.time() + payload.expires_in,
+            timing = timing
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "refresh_token": self.refresh_token,
+            "access_token": self.access_token,
+            "access_token_expire": self.access_token_expire,
+        }
+
+def _send(
+    request: Any, send: Callable[..., requests.Response], url: str, **kwargs
+) -> Optional[requests.Response]:
+    """Send a request class's call, one that got no response becomes its failure"""
+    try:
+        return send(url, operation=type(request).__name__, **kwargs)
+    except requests.RequestException as error:
+        request.failure = ApiError.from_exception(
+            error, timed_out=isinstance(error, requests.Timeout)
+        )
+        return None
+
+def _token_response(request: Any, response: Optional[requests.Response]) -> GetTokenResponse:
+    if response is None:
+        return None
+    if not response.ok:
+        request.failure = ApiError.from_body(response.status_code, response.text)
+        return None
+    return GetTokenResponse.from_payload(
+        TokenPayload.from_json(response.json()), timing=getattr(response, "timing", None)
+    )
+
 @dataclass
 class GetTokenRequest:
     code: str
     redirect_uri: str = "http://localhost:8080/callback"
     grant_type: str = "authorization_code"
+    # Status and body of the last failed call, e.g. a 503 while the circuit is open
+    failure: ApiError = field(default=None, init=False, repr=False)
 
-    def execute(self, token_url: str, client_id: str, client_secret: str) -> GetTokenResponse:
+    def execute(
+        self,
+        token_url: str,
+        client_id: str,
+        client_secret: str,
+        http_client: HttpClient = None,
+        deadline: Deadline = None,
+    ) -> GetTokenResponse:
         body = {
             "grant_type": self.grant_type,
             "code": self.code,
@@ -31,59 +88,216 @@ class GetTokenRequest:
             "client_id": client_id,
             "client_secret": client_secret,
         }
-        response: requests.Response = requests.post(
+        response = _send(
+            self,
+            (http_client or get_default_client()).post,
             token_url,
             data=body,
             headers={"Accept": "application/json"},
-            timeout=120,
-        )
-        return None if not response.ok else GetTokenResponse(
-            refresh_token = response.json().get("refresh_token"),
-            access_token = response.json().get("access_token"),
-            access_token_expire = time.time() + int(response.json().get("expires_in"))
+            deadline=deadline,
         )
+        return _token_response(self, response)
 
 @dataclass
 class RefreshTokenRequest:
     refresh_token: str
     grant_type: str = "refresh_token"
+    failure: ApiError = field(default=None, init=False, repr=False)
 
-    def execute(self, token_url, client_id, client_secret):
+    def execute(
+        self,
+        token_url,
+        client_id,
+        client_secret,
+        http_client: HttpClient = None,
+        deadline: Deadline = None,
+    ):
         body = {
             "grant_type": self.grant_type,
             "refresh_token": self.refresh_token,
             "client_id": client_id,
             "client_secret": client_secret,
         }
-        response: requests.Response = requests.post(
+        response = _send(
+            self,
+            (http_client or get_default_client()).post,
             token_url,
             data=body,
             headers={"Accept": "application/json"},
-            timeout=120,
-        )
-        return None if not response.ok else GetTokenResponse(
-            refresh_token = response.json().get("refresh_token"),
-            access_token = response.json().get("access_token"),
-            access_token_expire = time.time() + int(response.json().get("expires_in"))
+            deadline=deadline,
         )
+        return _token_response(self, response)
+
+STREAM_CHUNK_SIZE = 64 * 1024
 
-@dataclass
 class ListAthleteResponse:
-    data: str = ""
-    status_code: int = -1
-    message: str = ""
+    """List Athletes result, the pretty-printed ``data`` is only built once a view reads it"""
+
+    __slots__ = ("athletes", "status_code", "message", "timing", "_data")
+
+    def __init__(
+        self,
+        data: str = None,
+        status_code: int = -1,
+        message: str = "",
+        athletes: Any = None,
+        timing: UpstreamTiming = None,
+    ) -> None:
+        self.athletes = athletes
+        self.status_code = status_code
+        self.message = message
+        # Phases of the call that fetched the athletes, a cached response keeps those of its call
+        self.timing = timing
+        self._data = data
+
+    @property
+    def data(self) -> str:
+        if self._data is None:
+            self._data = "" if self.athletes is None else dumps_athletes(self.athletes)
+        return self._data
+
+    @data.setter
+    def data(self, value: str) -> None:
+        self._data = value
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"data": self.data, "status_code": self.status_code, "message": self.message}
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, ListAthleteResponse):
+            return NotImplemented
+        return self.to_dict() == other.to_dict()
+
+    def __repr__(self) -> str:
+        return (
+            f"ListAthleteResponse(status_code={self.status_code!r}, message={self.message!r})"
+        )
 
 @dataclass
 class ListAthleteRequest:
-    def execute(self, list_athlete_url: str, access_token: str) -> ListAthleteResponse:
-        response: requests.Response = requests.get(
+    # Status and body of the last failed call, e.g. a 429 while rate limited
+    failure: ApiError = field(default=None, init=False, repr=False)
+
+    def execute(
+        self,
+        list_athlete_url: str,
+        access_token: str,
+        http_client: HttpClient = None,
+        cache: ResponseCache = None,
+        deadline: Deadline = None,
+    ) -> ListAthleteResponse:
+        headers = {"Authorization": f"Bearer {access_token}"}
+        if cache is not None:
+            cache_key = cache.make_key(list_athlete_url, access_token)
+            cached = cache.fresh_response(cache_key)
+            if cached is not None:
+                return cached
+            headers.update(cache.conditional_headers(cache_key))
+
+        response = _send(
+            self,
+            (http_client or get_default_client()).get,
             list_athlete_url,
-            headers={"Authorization": f"Bearer {access_token}"},
-            timeout=120
+            headers=headers,
+            deadline=deadline,
         )
+        if response is None:
+            return None
+
+        if cache is not None and response.status_code == 304:
+            cached = cache.revalidated(cache_key)
+            if cached is not None:
+                return cached
+        if not response.ok or response.status_code == 304:
+            self.failure = ApiError.from_body(response.status_code, response.text)
+            return None
 
-        return None if not response.ok else ListAthleteResponse(
-            data = json.dumps(response.json(), indent=4),
+        result = ListAthleteResponse(
+            athletes = decode_athletes(response.json()),
             status_code = response.status_code,
-            message = response.raw
+            message = response.reason,
+            timing = getattr(response, "timing", None)
         )
+        if cache is not None:
+            cache.store(
+                cache_key,
+                result,
+                etag=response.headers.get("ETag"),
+                last_modified=response.headers.get("Last-Modified"),
+            )
+        return result
+
+    def execute_stream(
+        self,
+        list_athlete_url: str,
+        access_token: str,
+        http_client: HttpClient = None,
+        chunk_size: int = STREAM_CHUNK_SIZE,
+        deadline: Deadline = None,
+    ) -> Optional[Iterator[Dict[str, Any]]]:
+        """Get the athletes as a generator that parses the body while it downloads"""
+        try:
+            response: requests.Response = (http_client or get_default_client()).get(
+                list_athlete_url,
+                headers={"Authorization": f"Bearer {access_token}"},
+                stream=True,
+                operation="ListAthleteStreamRequest",
+                deadline=deadline,
+            )
+        except requests.RequestException as error:
+            self.failure = ApiError.from_exception(
+                error, timed_out=isinstance(error, requests.Timeout)
+            )
+            return None
+        if not response.ok:
+            self.failure = ApiError.from_body(response.status_code, response.text)
+            response.close()
+            return None
+        return _iter_athletes(response, chunk_size)
+
+
+@dataclass
+class AthleteDataResponse:
+    athlete_id: str = ""
+    data: Any = None
+    status_code: int = -1
+
+@dataclass
+class AthleteDataRequest:
+    """GET a per-athlete endpoint, url_template contains an {athlete_id} placeholder"""
+    url_template: str
+    failure: ApiError = field(default=None, init=False, repr=False)
+
+    def get_url(self, athlete_id) -> str:
+        return self.url_template.format(athlete_id=athlete_id)
+
+    def execute(
+        self,
+        athlete_id,
+        access_token: str,
+        http_client: HttpClient = None,
+        deadline: Deadline = None,
+    ) -> AthleteDataResponse:
+        response = _send(
+            self,
+            (http_client or get_default_client()).get,
+            self.get_url(athlete_id),
+            headers={"Authorization": f"Bearer {access_token}"},
+            endpoint=self.url_template,
+            deadline=deadline,
+        )
+        if response is None:
+            return None
+        if not response.ok:
+            self.failure = ApiError.from_body(response.status_code, response.text)
+            return None
+        return AthleteDataResponse(
+            athlete_id = athlete_id,
+            data = response.json(),
+            status_code = response.status_code
+        )
+
+
+def _iter_athletes(response: requests.Response, chunk_size: int) -> Iterator[Dict[str, Any]]:
+    with response:
+        yield from iter_json_array(response.iter_content(chunk_size=chunk_size))
@@ -0,0 +1,155 @@
+"""Module providing a client-side token bucket rate limiter driven by upstream feedback"""
+
+from email.utils import parsedate_to_datetime
+import threading
+import time
+from typing import Callable, Dict, Hashable, Mapping, Optional
+
+# Headers announcing how many calls are left and when the window resets, most specific first
+REMAINING_HEADERS = ("X-RateLimit-Remaining", "RateLimit-Remaining")
+RESET_HEADERS = ("X-RateLimit-Reset", "RateLimit-Reset")
+# Reset values above this are epoch timestamps rather than seconds from now
+EPOCH_THRESHOLD = 10 ** 9
+
+
+class TokenBucket:
+    """Token bucket whose rate backs off on 429 and recovers on success"""
+
+    def __init__(self, rate: float, burst: float, clock: Callable[[], float]) -> None:
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self.tokens = burst
+        self.updated = clock()
+        self.blocked_until = 0.0
+
+    def delay(self) -> float:
+        """Seconds until a call may go out, 0 if it may go out now"""
+        now = self.clock()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def take(self) -> None:
+        self.tokens -= 1
+
+    def block_for(self, seconds: float) -> None:
+        self.blocked_until = max(self.blocked_until, self.clock() + seconds)
+
+    def back_off(self, minimum_rate: float) -> None:
+        self.rate = max(minimum_rate, self.rate / 2)
+        self.tokens = min(self.tokens, 0)
+
+    def recover(self) -> None:
+        self.rate = min(self.max_rate, self.rate + self.max_rate / 10)
+
+
+class RateLimiter:
+    """Token buckets per key, e.g. per client_id and endpoint
+
+    Callers queue in ``acquire`` until their bucket has a token. Responses fed
+    to ``observe`` adjust the bucket: a 429 or 503 halves its rate and honors
+    Retry-After, rate limit headers pause it until the window resets when no
+    calls are left, and successful calls restore the rate step by step.
+    """
+
+    def __init__(
+        self,
+        requests_per_second: float = 10,
+        burst: float = 20,
+        max_wait_seconds: float = 30,
+        clock: Callable[[], float] = time.monotonic,
+        wall_clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.requests_per_second = requests_per_second
+        self.burst = burst
+        self.max_wait_seconds = max_wait_seconds
+        self.minimum_rate = requests_per_second / 64
+        self.clock = clock
+        self.wall_clock = wall_clock
+        self._buckets: Dict[Hashable, TokenBucket] = {}
+        self._condition = threading.Condition()
+
+    def acquire(self, key: Hashable, timeout: float = None) -> Optional[float]:
+        """Wait for a token, returns None once taken or the remaining delay if it exceeds the timeout"""
+        timeout = self.max_wait_seconds if timeout is None else timeout
+        deadline = self.clock() + timeout
+        with self._condition:
+            bucket = self._get_bucket(key)
+            while True:
+                delay = bucket.delay()
+                if delay <= 0:
+                    bucket.take()
+                    return None
+                if self.clock() + delay > deadline:
+                    return delay
+                self._condition.wait(delay)
+
+    def observe(self, key: Hashable, status_code: int, headers: Mapping[str, str]) -> None:
+        with self._condition:
+            bucket = self._get_bucket(key)
+            retry_after = self.parse_retry_after(headers.get("Retry-After"))
+            if status_code in (429, 503):
+                bucket.back_off(self.minimum_rate)
+                if retry_after is not None:
+                    bucket.block_for(retry_after)
+            elif status_code < 400:
+                bucket.recover()
+
+            remaining = _first_header(headers, REMAINING_HEADERS)
+            reset = self.parse_reset(_first_header(headers, RESET_HEADERS))
+            if remaining is not None and reset is not None:
+                try:
+                    remaining = int(remaining)
+                except ValueError:
+                    remaining = None
+                if remaining is not None and remaining <= 0:
+                    bucket.block_for(reset)
+                elif remaining is not None and reset > 0:
+                    # Spread what is left of the window instead of bursting into the limit
+                    bucket.rate = max(self.minimum_rate, min(bucket.rate, remaining / reset))
+            self._condition.notify_all()
+
+    def parse_retry_after(self, value: Optional[str]) -> Optional[float]:
+        """Retry-After is either a number of seconds or an HTTP date"""
+        if value is None:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - self.wall_clock())
+        except (TypeError, ValueError):
+            return None
+
+    def parse_reset(self, value: Optional[str]) -> Optional[float]:
+        if value is None:
+            return None
+        try:
+            reset = float(value)
+        except ValueError:
+            return None
+        if reset > EPOCH_THRESHOLD:
+            reset -= self.wall_clock()
+        return max(0.0, reset)
+
+    def _get_bucket(self, key: Hashable) -> TokenBucket:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = TokenBucket(self.requests_per_second, self.burst, self.clock)
+            self._buckets[key] = bucket
+        return bucket
+
+
+def _first_header(headers: Mapping[str, str], names) -> Optional[str]:
+    for name in names:
+        value = headers.get(name)
+        if value is not None:
+            return value
+    return None
@@ -0,0 +1,114 @@
+"""Module providing a conditional-request aware TTL cache for Public API responses"""
+
+from collections import OrderedDict
+from dataclasses import dataclass, replace
+import hashlib
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+
+@dataclass
+class ResponseCacheStats:
+    hits: int = 0
+    revalidations: int = 0
+    misses: int = 0
+    evictions: int = 0
+
+
+@dataclass
+class CacheEntry:
+    response: Any
+    etag: str = None
+    last_modified: str = None
+    stored_at: float = 0.0
+
+    def conditional_headers(self) -> Dict[str, str]:
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class ResponseCache:
+    """Size bounded LRU of parsed responses keyed by endpoint and token subject
+
+    Entries younger than ``ttl_seconds`` are served without a request. Older
+    entries are revalidated with If-None-Match/If-Modified-Since, and a 304
+    serves the already parsed response again.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1000,
+        ttl_seconds: float = 60,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.clock = clock
+        self._entries: "OrderedDict[Tuple[str, str], CacheEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = ResponseCacheStats()
+
+    @staticmethod
+    def make_key(endpoint: str, access_token: str) -> Tuple[str, str]:
+        """Key by a digest of the token so raw bearer tokens are not kept as keys"""
+        return endpoint, hashlib.sha256(access_token.encode()).hexdigest()
+
+    def fresh_response(self, key: Tuple[str, str]) -> Optional[Any]:
+        """Get the cached response if it is still within its TTL"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or self.clock() - entry.stored_at >= self.ttl_seconds:
+                return None
+            self._entries.move_to_end(key)
+            self._stats.hits += 1
+            return entry.response
+
+    def conditional_headers(self, key: Tuple[str, str]) -> Dict[str, str]:
+        """Get the validators to send for a stale entry, empty if nothing is cached"""
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry.conditional_headers() if entry is not None else {}
+
+    def revalidated(self, key: Tuple[str, str]) -> Optional[Any]:
+        """Mark an entry fresh again after a 304 and get its response"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            entry.stored_at = self.clock()
+            self._entries.move_to_end(key)
+            self._stats.revalidations += 1
+            return entry.response
+
+    def store(
+        self, key: Tuple[str, str], response: Any, etag: str = None, last_modified: str = None
+    ) -> None:
+        with self._lock:
+            self._stats.misses += 1
+            self._entries[key] = CacheEntry(
+                response=response,
+                etag=etag,
+                last_modified=last_modified,
+                stored_at=self.clock(),
+            )
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> ResponseCacheStats:
+        with self._lock:
+            return replace(self._stats)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
@@ -0,0 +1,196 @@
+"""Module providing incremental sync of coach rosters against a local athlete index"""
+
+from collections import OrderedDict
+from dataclasses import dataclass
+import hashlib
+import json
+import threading
+from typing import (
+    Any, Callable, Dict, Hashable, Iterable, Iterator, List, Mapping, Optional, Tuple
+)
+
+RosterListener = Callable[[Hashable, "RosterDelta"], None]
+
+
+@dataclass(frozen=True)
+class RosterDelta:
+    """Athletes added and changed, and ids of those removed
+
+    A roster synced from a stream keeps no athletes, its delta lists the ids
+    of the added and changed ones instead.
+    """
+    added: Tuple[Any, ...] = ()
+    changed: Tuple[Any, ...] = ()
+    removed: Tuple[Any, ...] = ()
+    unchanged: int = 0
+    # Same athletes as before, listed in a different order
+    reordered: bool = False
+
+    def is_empty(self) -> bool:
+        return not (self.added or self.changed or self.removed)
+
+
+def content_hash(athlete: Mapping[str, Any]) -> bytes:
+    """Digest of an athlete's content, independent of key order"""
+    encoded = json.dumps(athlete, sort_keys=True, separators=(",", ":"), default=dict)
+    return hashlib.blake2b(encoded.encode(), digest_size=16).digest()
+
+
+def identify(athlete: Mapping[str, Any], id_field: str) -> Tuple[Any, bytes]:
+    """Id and content hash of an athlete, athletes without an id are tracked by their content"""
+    digest = content_hash(athlete)
+    return athlete.get(id_field, digest), digest
+
+
+class RosterIndex:
+    """Athletes of one roster keyed by id, each with the hash of its content
+
+    A roster applied from its hashes alone, e.g. a streamed one, keeps no athletes.
+    """
+
+    def __init__(self, id_field: str = "Id") -> None:
+        self.id_field = id_field
+        self._athletes: Dict[Any, Mapping[str, Any]] = {}
+        self._hashes: Dict[Any, bytes] = {}
+        # The payload the index was built from, applying the very same object again is a
+        # no-op. A payload with the same athletes in the same order keeps the earlier one.
+        self._last_payload: Any = None
+        self._lock = threading.Lock()
+
+    def get(self, athlete_id: Any) -> Mapping[str, Any]:
+        return self._athletes.get(athlete_id)
+
+    def __len__(self) -> int:
+        return len(self._hashes)
+
+    def is_built_from(self, athletes: Any) -> bool:
+        """Whether the index holds this very payload, e.g. the one a page was rendered from"""
+        with self._lock:
+            return athletes is not None and athletes is self._last_payload
+
+    def __iter__(self) -> Iterator[Mapping[str, Any]]:
+        return iter(self._athletes.values())
+
+    def apply(self, athletes: Iterable[Mapping[str, Any]]) -> RosterDelta:
+        """Replace the index with a full roster, returns what changed"""
+        with self._lock:
+            return self._apply(athletes)
+
+    def apply_hashes(self, hashes: Mapping[Any, bytes]) -> RosterDelta:
+        """Replace the index with a roster known by the id and content hash of each athlete"""
+        with self._lock:
+            delta = self._replace(dict(hashes), None)
+            if not delta.is_empty() or delta.reordered:
+                self._last_payload = None
+            return delta
+
+    def _apply(self, athletes: Iterable[Mapping[str, Any]]) -> RosterDelta:
+        if athletes is self._last_payload:
+            return RosterDelta(unchanged=len(self._hashes))
+        athletes_by_id: Dict[Any, Mapping[str, Any]] = {}
+        hashes: Dict[Any, bytes] = {}
+        for athlete in athletes:
+            athlete_id, hashes[athlete_id] = identify(athlete, self.id_field)
+            athletes_by_id[athlete_id] = athlete
+        delta = self._replace(hashes, athletes_by_id)
+        if not delta.is_empty() or delta.reordered or self._last_payload is None:
+            self._last_payload = athletes
+        return delta
+
+    def _replace(
+        self, hashes: Dict[Any, bytes], athletes_by_id: Optional[Dict[Any, Mapping[str, Any]]]
+    ) -> RosterDelta:
+        added: List[Any] = []
+        changed: List[Any] = []
+        for athlete_id, digest in hashes.items():
+            athlete = athlete_id if athletes_by_id is None else athletes_by_id[athlete_id]
+            previous = self._hashes.get(athlete_id)
+            if previous is None:
+                added.append(athlete)
+            elif previous != digest:
+                changed.append(athlete)
+        removed = tuple(athlete_id for athlete_id in self._hashes if athlete_id not in hashes)
+        reordered = not (added or removed) and list(hashes) != list(self._hashes)
+        self._athletes, self._hashes = athletes_by_id or {}, hashes
+        return RosterDelta(
+            added=tuple(added),
+            changed=tuple(changed),
+            removed=removed,
+            unchanged=len(hashes) - len(added) - len(changed),
+            reordered=reordered,
+        )
+
+
+class RosterSync:
+    """A RosterIndex per roster, e.g. per session, publishing each non-empty delta
+
+    Rosters beyond ``max_rosters`` are dropped least recently synced first, the
+    next sync of a dropped roster reports every athlete as added.
+    """
+
+    def __init__(self, id_field: str = "Id", max_rosters: int = 10000) -> None:
+        self.id_field = id_field
+        self.max_rosters = max_rosters
+        self._rosters: "OrderedDict[Hashable, RosterIndex]" = OrderedDict()
+        self._listeners: List[RosterListener] = []
+        self._lock = threading.Lock()
+
+    def subscribe(self, listener: RosterListener) -> Callable[[], None]:
+        """Call listener(roster_key, delta) after every sync that changed something"""
+        with self._lock:
+            self._listeners.append(listener)
+
+        def unsubscribe() -> None:
+            with self._lock:
+                if listener in self._listeners:
+                    self._listeners.remove(listener)
+
+        return unsubscribe
+
+    def get_index(self, roster_key: Hashable) -> RosterIndex:
+        with self._lock:
+            index = self._rosters.get(roster_key)
+            if index is None:
+                index = RosterIndex(self.id_field)
+                self._rosters[roster_key] = index
+                while len(self._rosters) > self.max_rosters:
+                    self._rosters.popitem(last=False)
+            else:
+                self._rosters.move_to_end(roster_key)
+            return index
+
+    def sync(self, roster_key: Hashable, athletes: Iterable[Mapping[str, Any]]) -> RosterDelta:
+        return self._publish(roster_key, self.get_index(roster_key).apply(athletes))
+
+    def _publish(self, roster_key: Hashable, delta: RosterDelta) -> RosterDelta:
+        if delta.is_empty():
+            return delta
+        with self._lock:
+            listeners = list(self._listeners)
+        for listener in listeners:
+            listener(roster_key, delta)
+        return delta
+
+    def is_built_from(self, roster_key: Hashable, athletes: Any) -> bool:
+        """Whether the roster was last synced from this very payload, or one just like it"""
+        with self._lock:
+            index = self._rosters.get(roster_key)
+        return index is not None and index.is_built_from(athletes)
+
+    def track(
+        self, roster_key: Hashable, athletes: Iterable[Mapping[str, Any]]
+    ) -> Iterator[Mapping[str, Any]]:
+        """Pass a streamed roster through, syncing it once the stream completed
+
+        Only the id and content hash of each athlete are kept while it streams,
+        so the athletes are not held in memory until the end.
+        """
+        hashes: Dict[Any, bytes] = {}
+        for athlete in athletes:
+            athlete_id, hashes[athlete_id] = identify(athlete, self.id_field)
+            yield athlete
+        self._publish(roster_key, self.get_index(roster_key).apply_hashes(hashes))
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._rosters)
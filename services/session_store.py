@@ -0,0 +1,117 @@
+"""Module providing a bounded, thread-safe store of per-user ApplicationState"""
+
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+import secrets
+import threading
+import time
+from typing import Callable, Iterator, Optional
+from services.application_state import ApplicationState
+
+
+@dataclass
+class SessionEntry:
+    state: ApplicationState = field(default_factory=ApplicationState)
+    lock: threading.Lock = field(default_factory=threading.Lock)
+    last_access: float = 0.0
+
+
+class SessionStore:
+    """LRU/TTL bounded map of session id to ApplicationState
+
+    The store lock is only held for the O(1) lookup, each session has its own
+    lock, so concurrent users never wait on each other while a request for one
+    user runs its upstream calls.
+    """
+
+    def __init__(
+        self,
+        max_sessions: int = 10000,
+        ttl_seconds: float = 3600,
+        clock: Callable[[], float] = time.monotonic,
+        restore: Callable[[str], Optional[ApplicationState]] = None,
+    ) -> None:
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self.clock = clock
+        # Rebuilds a session that is not in memory, e.g. from tokens persisted before a restart
+        self.restore = restore
+        self._entries: "OrderedDict[str, SessionEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def new_session_id() -> str:
+        return secrets.token_urlsafe(32)
+
+    @contextmanager
+    def session(self, session_id: str) -> Iterator[ApplicationState]:
+        """Get the state for a session, holding its lock until the block exits"""
+        entry = self._get_or_create(session_id)
+        with entry.lock:
+            yield entry.state
+
+    @contextmanager
+    def existing_session(self, session_id: str) -> Iterator[Optional[ApplicationState]]:
+        """Lock an existing session without creating it or counting it as user activity"""
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is not None and self._is_expired(entry, self.clock()):
+                entry = None
+        if entry is None:
+            yield None
+            return
+        with entry.lock:
+            yield entry.state
+
+    def get(self, session_id: str) -> Optional[ApplicationState]:
+        """Get the state for a session without creating or refreshing it"""
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is None or self._is_expired(entry, self.clock()):
+                return None
+            return entry.state
+
+    def discard(self, session_id: str) -> None:
+        with self._lock:
+            self._entries.pop(session_id, None)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def _get_or_create(self, session_id: str) -> SessionEntry:
+        with self._lock:
+            self._evict_expired(self.clock())
+            entry = self._entries.get(session_id)
+            if entry is not None:
+                return self._touch(session_id, entry)
+        # Restoring may read from disk, so it runs without holding up other sessions
+        state = self.restore(session_id) if self.restore is not None else None
+        with self._lock:
+            self._evict_expired(self.clock())
+            # A concurrent request may have created the session meanwhile, its entry wins
+            entry = self._entries.setdefault(
+                session_id, SessionEntry(state=state or ApplicationState())
+            )
+            self._touch(session_id, entry)
+            while len(self._entries) > self.max_sessions:
+                self._entries.popitem(last=False)
+            return entry
+
+    def _touch(self, session_id: str, entry: SessionEntry) -> SessionEntry:
+        """Mark an entry as the most recently used, called with the store lock held"""
+        entry.last_access = self.clock()
+        self._entries.move_to_end(session_id)
+        return entry
+
+    def _is_expired(self, entry: SessionEntry, now: float) -> bool:
+        return now - entry.last_access > self.ttl_seconds
+
+    def _evict_expired(self, now: float) -> None:
+        # Entries are kept in access order, so expired ones are always at the front
+        while self._entries:
+            oldest = next(iter(self._entries.values()))
+            if not self._is_expired(oldest, now):
+                break
+            self._entries.popitem(last=False)
@@ -0,0 +1,205 @@
+"""Module providing a SQLite backed session store shared by every worker process"""
+
+from contextlib import contextmanager
+import json
+import os
+import secrets
+import sqlite3
+import threading
+import time
+import weakref
+from typing import Callable, Iterator, Optional, Tuple
+from services.application_state import ApplicationState
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS sessions (
+        session_id TEXT PRIMARY KEY,
+        state TEXT NOT NULL,
+        last_access REAL NOT NULL,
+        lease_owner TEXT,
+        lease_until REAL NOT NULL DEFAULT 0
+    )
+"""
+LAST_ACCESS_INDEX = "CREATE INDEX IF NOT EXISTS sessions_last_access ON sessions (last_access)"
+
+
+class SharedSessionStore:
+    """Drop-in replacement for SessionStore whose sessions live in SQLite
+
+    Any worker process can serve any request of a user. While a block holds a
+    session, the row is leased to this worker so requests of the same user on
+    other workers wait for it, like the per-session lock of SessionStore. A
+    lease outlives the longest upstream call, so a crashed worker cannot hold
+    a session forever. The state is written back only when the block changed it.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        max_sessions: int = 10000,
+        ttl_seconds: float = 3600,
+        lease_seconds: float = 150,
+        clock: Callable[[], float] = time.time,
+        restore: Callable[[str], Optional[ApplicationState]] = None,
+    ) -> None:
+        self.path = path
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self.lease_seconds = lease_seconds
+        self.clock = clock
+        self.restore = restore
+        self._owner = f"{os.getpid()}-{secrets.token_hex(4)}"
+        self._local = threading.local()
+        # Threads of this process wait on a lock instead of polling the lease
+        self._session_locks: "weakref.WeakValueDictionary[str, threading.Lock]" = (
+            weakref.WeakValueDictionary()
+        )
+        self._locks_lock = threading.Lock()
+        connection = self._connection()
+        connection.execute(SCHEMA)
+        connection.execute(LAST_ACCESS_INDEX)
+
+    @staticmethod
+    def new_session_id() -> str:
+        return secrets.token_urlsafe(32)
+
+    @contextmanager
+    def session(self, session_id: str) -> Iterator[ApplicationState]:
+        """Get the state for a session, holding its lease until the block exits"""
+        with self._get_session_lock(session_id):
+            state, stored = self._lease(session_id, create=True)
+            try:
+                yield state
+            finally:
+                self._release(session_id, state, stored, touch=True)
+
+    @contextmanager
+    def existing_session(self, session_id: str) -> Iterator[Optional[ApplicationState]]:
+        """Lease an existing session without creating it or counting it as user activity"""
+        with self._get_session_lock(session_id):
+            leased = self._lease(session_id, create=False)
+            if leased is None:
+                yield None
+                return
+            state, stored = leased
+            try:
+                yield state
+            finally:
+                self._release(session_id, state, stored, touch=False)
+
+    def get(self, session_id: str) -> Optional[ApplicationState]:
+        """Get a copy of the state for a session without creating or refreshing it"""
+        row = self._connection().execute(
+            "SELECT state FROM sessions WHERE session_id = ? AND last_access >= ?",
+            (session_id, self.clock() - self.ttl_seconds),
+        ).fetchone()
+        return None if row is None else ApplicationState.from_dict(json.loads(row[0]))
+
+    def discard(self, session_id: str) -> None:
+        with self._connection() as connection:
+            connection.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+
+    def __len__(self) -> int:
+        return self._connection().execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+    def close(self) -> None:
+        connection = getattr(self._local, "connection", None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+
+    def _lease(self, session_id: str, create: bool) -> Optional[Tuple[ApplicationState, str]]:
+        """Wait for another worker's lease to be released, or to expire at the latest"""
+        delay = 0.005
+        while True:
+            leased = self._try_lease(session_id, create)
+            if leased is not False:
+                return leased
+            time.sleep(delay)
+            delay = min(delay * 2, 0.1)
+
+    def _try_lease(self, session_id: str, create: bool):
+        """The state and its stored form, None if missing and not created, False if leased"""
+        now = self.clock()
+        connection = self._connection()
+        with connection:
+            connection.execute("BEGIN IMMEDIATE")
+            row = connection.execute(
+                "SELECT state, last_access, lease_until FROM sessions WHERE session_id = ?",
+                (session_id,),
+            ).fetchone()
+            if row is not None and row[1] < now - self.ttl_seconds and row[2] < now:
+                connection.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+                row = None
+            if row is None:
+                if not create:
+                    return None
+                state = self.restore(session_id) if self.restore is not None else None
+                stored = json.dumps((state or ApplicationState()).to_dict())
+                connection.execute(
+                    "INSERT INTO sessions "
+                    "(session_id, state, last_access, lease_owner, lease_until) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (session_id, stored, now, self._owner, now + self.lease_seconds),
+                )
+                self._evict(connection, now)
+            else:
+                stored, _, lease_until = row
+                if lease_until > now:
+                    return False
+                connection.execute(
+                    "UPDATE sessions SET lease_owner = ?, lease_until = ? WHERE session_id = ?",
+                    (self._owner, now + self.lease_seconds, session_id),
+                )
+        return ApplicationState.from_dict(json.loads(stored)), stored
+
+    def _release(self, session_id: str, state: ApplicationState, stored: str, touch: bool) -> None:
+        updated = json.dumps(state.to_dict())
+        assignments = ["lease_owner = NULL", "lease_until = 0"]
+        values = []
+        if updated != stored:
+            assignments.append("state = ?")
+            values.append(updated)
+        if touch:
+            assignments.append("last_access = ?")
+            values.append(self.clock())
+        with self._connection() as connection:
+            connection.execute(
+                f"UPDATE sessions SET {', '.join(assignments)} "
+                "WHERE session_id = ? AND lease_owner = ?",
+                (*values, session_id, self._owner),
+            )
+
+    def _evict(self, connection: sqlite3.Connection, now: float) -> None:
+        connection.execute(
+            "DELETE FROM sessions WHERE last_access < ? AND lease_until < ?",
+            (now - self.ttl_seconds, now),
+        )
+        connection.execute(
+            "DELETE FROM sessions WHERE session_id IN ("
+            "SELECT session_id FROM sessions WHERE lease_until < ? "
+            "ORDER BY last_access LIMIT max(0, (SELECT COUNT(*) FROM sessions) - ?))",
+            (now, self.max_sessions),
+        )
+
+    def _get_session_lock(self, session_id: str) -> threading.Lock:
+        with self._locks_lock:
+            lock = self._session_locks.get(session_id)
+            if lock is None:
+                lock = threading.Lock()
+                self._session_locks[session_id] = lock
+            return lock
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = self._connect()
+            self._local.connection = connection
+        return connection
+
+    def _connect(self) -> sqlite3.Connection:
+        # Transactions are opened explicitly, with BEGIN IMMEDIATE where rows are leased
+        connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
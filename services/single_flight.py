@@ -0,0 +1,106 @@
+"""Module providing single-flight coalescing of concurrent identical calls"""
+
+from collections import deque
+from dataclasses import dataclass, replace
+import threading
+import time
+from typing import Any, Callable, Deque, Dict, Hashable, Tuple
+
+
+@dataclass
+class SingleFlightStats:
+    calls: int = 0
+    executions: int = 0
+    coalesced: int = 0
+    in_flight: int = 0
+
+
+class _Call:
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: BaseException = None
+        self.finished_at: float = 0.0
+
+
+class SingleFlight:
+    """Run at most one call per key, every concurrent caller shares its result
+
+    With ``linger_seconds`` a result is also handed to callers that arrive
+    shortly after the call finished, e.g. callers still holding a refresh token
+    that the winning call just rotated. Only results ``should_linger`` accepts
+    linger, by default every one that was returned rather than raised.
+    """
+
+    def __init__(
+        self,
+        linger_seconds: float = 0,
+        clock: Callable[[], float] = time.monotonic,
+        should_linger: Callable[[Any], bool] = None,
+    ) -> None:
+        self.linger_seconds = linger_seconds
+        self.clock = clock
+        self.should_linger = should_linger
+        self._calls: Dict[Hashable, _Call] = {}
+        # Finished calls in completion order, so expired results are dropped cheaply
+        self._lingering: Deque[Tuple[Hashable, _Call]] = deque()
+        self._lock = threading.Lock()
+        self._stats = SingleFlightStats()
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            self._stats.calls += 1
+            self._drop_expired()
+            call = self._calls.get(key)
+            if call is not None:
+                self._stats.coalesced += 1
+                leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                self._stats.executions += 1
+                self._stats.in_flight += 1
+                leader = True
+
+        if leader:
+            self._execute(key, call, fn)
+        else:
+            call.done.wait()
+
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def stats(self) -> SingleFlightStats:
+        with self._lock:
+            return replace(self._stats)
+
+    def _execute(self, key: Hashable, call: _Call, fn: Callable[[], Any]) -> None:
+        try:
+            call.result = fn()
+        except BaseException as error:  # pylint: disable=broad-except
+            call.error = error
+        finally:
+            with self._lock:
+                self._stats.in_flight -= 1
+                call.finished_at = self.clock()
+                if self._lingers(call):
+                    self._lingering.append((key, call))
+                else:
+                    del self._calls[key]
+                call.done.set()
+
+    def _lingers(self, call: _Call) -> bool:
+        if call.error is not None or self.linger_seconds <= 0:
+            return False
+        return self.should_linger is None or self.should_linger(call.result)
+
+    def _drop_expired(self) -> None:
+        now = self.clock()
+        while self._lingering:
+            key, call = self._lingering[0]
+            if now - call.finished_at < self.linger_seconds:
+                break
+            self._lingering.popleft()
+            if self._calls.get(key) is call:
+                del self._calls[key]
@@ -0,0 +1,170 @@
+"""Module providing a background scheduler that refreshes tokens before they expire"""
+
+import heapq
+import random
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+from services.public_api import GetTokenResponse
+
+
+class RefreshFailed(Exception):
+    """A refresh that may succeed when tried again, e.g. while upstream is unavailable"""
+
+
+class TokenRefreshScheduler:
+    """Min-heap of access token deadlines, refreshed a margin before they expire
+
+    Every scheduled key is refreshed ``margin_seconds`` plus a random share of
+    ``jitter_seconds`` before its ``access_token_expire`` so tokens issued
+    together are not all refreshed in the same instant. ``refresh`` returns the
+    new token, which is scheduled again, or None to stop refreshing the key.
+    A refresh that raises, e.g. ``RefreshFailed``, is retried after
+    ``retry_seconds``, doubling up to ``max_retry_seconds``, for as long as the
+    current token has not expired.
+    """
+
+    def __init__(
+        self,
+        refresh: Callable[[str], Optional[GetTokenResponse]],
+        margin_seconds: float = 60,
+        jitter_seconds: float = 15,
+        clock: Callable[[], float] = time.time,
+        rng: Callable[[], float] = random.random,
+        retry_seconds: float = 5,
+        max_retry_seconds: float = 60,
+    ) -> None:
+        self.refresh = refresh
+        self.margin_seconds = margin_seconds
+        self.jitter_seconds = jitter_seconds
+        self.clock = clock
+        self.rng = rng
+        self.retry_seconds = retry_seconds
+        self.max_retry_seconds = max_retry_seconds
+        self._heap: List[Tuple[float, int, str]] = []
+        # Latest heap entry per key, older entries are skipped when popped
+        self._scheduled: Dict[str, int] = {}
+        # Token each key was scheduled for, and the failed refreshes since it was
+        self._tokens: Dict[str, GetTokenResponse] = {}
+        self._failures: Dict[str, int] = {}
+        self._sequence = 0
+        self._condition = threading.Condition()
+        self._thread: threading.Thread = None
+        self._running = False
+
+    def schedule(self, key: str, token: GetTokenResponse) -> float:
+        """Schedule a refresh for the token, replacing any pending refresh for the key"""
+        deadline = (
+            token.access_token_expire
+            - self.margin_seconds
+            - self.jitter_seconds * self.rng()
+        )
+        with self._condition:
+            self._tokens[key] = token
+            self._failures.pop(key, None)
+            self._push(key, deadline)
+        return deadline
+
+    def is_due(self, token: GetTokenResponse) -> bool:
+        """Whether the token is in its refresh window, a token issued meanwhile is not"""
+        return token.access_token_expire - self.margin_seconds - self.jitter_seconds <= self.clock()
+
+    def cancel(self, key: str) -> None:
+        with self._condition:
+            self._scheduled.pop(key, None)
+            self._tokens.pop(key, None)
+            self._failures.pop(key, None)
+
+    def next_deadline(self) -> Optional[float]:
+        with self._condition:
+            self._discard_cancelled()
+            return self._heap[0][0] if self._heap else None
+
+    def __len__(self) -> int:
+        with self._condition:
+            return len(self._scheduled)
+
+    def run_pending(self) -> int:
+        """Refresh every key whose deadline has passed, returns the number refreshed"""
+        refreshed = 0
+        for key in self._pop_due():
+            try:
+                token = self.refresh(key)
+            except Exception:  # pylint: disable=broad-except
+                self._retry(key)
+                continue
+            if token:
+                refreshed += 1
+                self.schedule(key, token)
+            else:
+                self.cancel(key)
+        return refreshed
+
+    def start(self) -> None:
+        with self._condition:
+            if self._running:
+                return
+            self._running = True
+        self._thread = threading.Thread(
+            target=self._run, name="token-refresh-scheduler", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self, timeout: float = None) -> None:
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                if not self._running:
+                    return
+                self._discard_cancelled()
+                wait = self._heap[0][0] - self.clock() if self._heap else None
+                if wait is None or wait > 0:
+                    self._condition.wait(wait)
+                    continue
+            self.run_pending()
+
+    def _retry(self, key: str) -> None:
+        """Try a failed refresh again later, unless the token expires before then"""
+        with self._condition:
+            token = self._tokens.get(key)
+            if token is None or key in self._scheduled:
+                # Cancelled or scheduled for a new token while the refresh ran
+                return
+            failures = self._failures.get(key, 0)
+            retry_at = self.clock() + min(
+                self.retry_seconds * 2 ** failures, self.max_retry_seconds
+            )
+            if retry_at >= token.access_token_expire:
+                self._tokens.pop(key, None)
+                self._failures.pop(key, None)
+                return
+            self._failures[key] = failures + 1
+            self._push(key, retry_at)
+
+    def _push(self, key: str, deadline: float) -> None:
+        self._sequence += 1
+        self._scheduled[key] = self._sequence
+        heapq.heappush(self._heap, (deadline, self._sequence, key))
+        self._condition.notify()
+
+    def _pop_due(self) -> List[str]:
+        due = []
+        with self._condition:
+            now = self.clock()
+            while self._heap and self._heap[0][0] <= now:
+                _, sequence, key = heapq.heappop(self._heap)
+                if self._scheduled.get(key) == sequence:
+                    del self._scheduled[key]
+                    due.append(key)
+        return due
+
+    def _discard_cancelled(self) -> None:
+        while self._heap and self._scheduled.get(self._heap[0][2]) != self._heap[0][1]:
+            heapq.heappop(self._heap)
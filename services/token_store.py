@@ -0,0 +1,202 @@
+"""Module providing a durable, write-behind store of tokens that survives restarts"""
+
+import secrets
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, Optional
+from services.public_api import GetTokenResponse
+
+SCHEMA_VERSION = 1
+
+SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS tokens (
+        session_id TEXT PRIMARY KEY,
+        refresh_token TEXT NOT NULL,
+        access_token TEXT NOT NULL,
+        access_token_expire REAL NOT NULL,
+        updated_at REAL NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS settings (
+        name TEXT PRIMARY KEY,
+        value TEXT NOT NULL
+    )
+    """,
+)
+
+# Steps to bring an older on-disk format up to date, keyed by the version they upgrade from
+MIGRATIONS: Dict[int, tuple] = {}
+
+
+class TokenStoreVersionError(Exception):
+    """The token store on disk was written by a newer version of the application"""
+
+
+class TokenStore:
+    """SQLite backed GetTokenResponse records keyed by session id
+
+    Every record is loaded into memory once at startup and reads never touch
+    disk. Writes update memory straight away and are batched to SQLite by a
+    background writer every ``flush_interval_seconds``, later writes for the
+    same session replacing earlier ones that were not flushed yet. A flush
+    never replaces a token on disk that expires later than the one written, so
+    processes sharing the file do not overwrite each other's newer tokens.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        flush_interval_seconds: float = 1.0,
+        max_age_seconds: float = 30 * 24 * 3600,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.path = path
+        self.flush_interval_seconds = flush_interval_seconds
+        self.max_age_seconds = max_age_seconds
+        self.clock = clock
+        self._tokens: Dict[str, GetTokenResponse] = {}
+        # Session id to token waiting to be written, None marks a delete
+        self._pending: Dict[str, Optional[GetTokenResponse]] = {}
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._wake = threading.Condition(self._lock)
+        self._running = False
+        self._thread: threading.Thread = None
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._migrate()
+
+    def load(self) -> int:
+        """Drop records older than max_age_seconds and warm the memory copy, returns the count"""
+        with self._db_lock, self._connection:
+            self._connection.execute(
+                "DELETE FROM tokens WHERE updated_at < ?",
+                (self.clock() - self.max_age_seconds,),
+            )
+            rows = self._connection.execute(
+                "SELECT session_id, refresh_token, access_token, access_token_expire FROM tokens"
+            ).fetchall()
+        with self._lock:
+            for session_id, refresh_token, access_token, access_token_expire in rows:
+                if session_id not in self._pending:
+                    self._tokens[session_id] = GetTokenResponse(
+                        refresh_token=refresh_token,
+                        access_token=access_token,
+                        access_token_expire=access_token_expire,
+                    )
+            return len(self._tokens)
+
+    def get(self, session_id: str) -> Optional[GetTokenResponse]:
+        with self._lock:
+            return self._tokens.get(session_id)
+
+    def put(self, session_id: str, token: GetTokenResponse) -> None:
+        with self._lock:
+            self._tokens[session_id] = token
+            self._pending[session_id] = token
+
+    def delete(self, session_id: str) -> None:
+        with self._lock:
+            self._tokens.pop(session_id, None)
+            self._pending[session_id] = None
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._tokens)
+
+    def get_setting(self, name: str, default_factory: Callable[[], str]) -> str:
+        """Get a persisted setting, creating it with default_factory on first use"""
+        with self._db_lock, self._connection:
+            self._connection.execute(
+                "INSERT OR IGNORE INTO settings (name, value) VALUES (?, ?)",
+                (name, default_factory()),
+            )
+            return self._connection.execute(
+                "SELECT value FROM settings WHERE name = ?", (name,)
+            ).fetchone()[0]
+
+    def get_secret_key(self) -> str:
+        """Flask secret key kept with the tokens, so session cookies survive restarts"""
+        return self.get_setting("secret_key", lambda: secrets.token_hex(24))
+
+    def flush(self) -> int:
+        """Write every pending change in one transaction, returns the number written"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+        now = self.clock()
+        upserts = [
+            (session_id, token.refresh_token, token.access_token, token.access_token_expire, now)
+            for session_id, token in pending.items()
+            if token is not None
+        ]
+        deletes = [(session_id,) for session_id, token in pending.items() if token is None]
+        with self._db_lock, self._connection:
+            # Another process sharing the file may have written a newer token meanwhile, keep it
+            self._connection.executemany(
+                "INSERT INTO tokens "
+                "(session_id, refresh_token, access_token, access_token_expire, updated_at) "
+                "VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (session_id) DO UPDATE SET "
+                "refresh_token = excluded.refresh_token, "
+                "access_token = excluded.access_token, "
+                "access_token_expire = excluded.access_token_expire, "
+                "updated_at = excluded.updated_at "
+                "WHERE excluded.access_token_expire >= tokens.access_token_expire",
+                upserts,
+            )
+            self._connection.executemany("DELETE FROM tokens WHERE session_id = ?", deletes)
+        return len(pending)
+
+    def start(self) -> None:
+        with self._lock:
+            if self._running:
+                return
+            self._running = True
+        self._thread = threading.Thread(target=self._run, name="token-store-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = None) -> None:
+        """Stop the background writer and flush what it has not written yet"""
+        with self._lock:
+            self._running = False
+            self._wake.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        self.flush()
+
+    def close(self) -> None:
+        self.stop()
+        with self._db_lock:
+            self._connection.close()
+
+    def _run(self) -> None:
+        while True:
+            with self._lock:
+                if not self._running:
+                    return
+                self._wake.wait(self.flush_interval_seconds)
+            self.flush()
+
+    def _migrate(self) -> None:
+        with self._db_lock, self._connection:
+            version = self._connection.execute("PRAGMA user_version").fetchone()[0]
+            if version > SCHEMA_VERSION:
+                raise TokenStoreVersionError(
+                    f"{self.path} uses token store format {version}, "
+                    f"this version supports up to {SCHEMA_VERSION}"
+                )
+            if version == 0:
+                for statement in SCHEMA:
+                    self._connection.execute(statement)
+            else:
+                for from_version in range(version, SCHEMA_VERSION):
+                    for statement in MIGRATIONS[from_version]:
+                        self._connection.execute(statement)
+            self._connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
@@ -0,0 +1,185 @@
+"""Module providing per-phase timing of upstream calls: DNS, connect, TLS, time to first byte and body
+
+The Timed* connection classes record into the UpstreamTiming of the call the
+current thread is making, so pooled connections need no knowledge of callers.
+"""
+
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+import socket
+import threading
+import time
+from typing import Any, Deque, Dict, Iterator, List, Optional
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import ConnectTimeoutError, NameResolutionError
+from urllib3.util.connection import allowed_gai_family
+
+_current = threading.local()
+
+
+@dataclass
+class UpstreamTiming:
+    """Where the time of one upstream call went, phases of retried attempts add up
+
+    ``reused_connection`` is None for calls that never reached the network, e.g.
+    ones failed locally by the rate limiter or circuit breaker. ``body_seconds``
+    stays 0 for streamed calls, whose body is read after the call returns.
+    """
+    operation: str = ""
+    endpoint: str = ""
+    status: str = ""
+    dns_seconds: float = 0.0
+    connect_seconds: float = 0.0
+    tls_seconds: float = 0.0
+    ttfb_seconds: float = 0.0
+    body_seconds: float = 0.0
+    total_seconds: float = 0.0
+    reused_connection: Optional[bool] = None
+    # perf_counter readings the phases are measured between
+    sent_at: float = field(default=0.0, repr=False, compare=False)
+    headers_received_at: float = field(default=0.0, repr=False, compare=False)
+
+    def phases(self) -> Dict[str, float]:
+        return {
+            "dns": self.dns_seconds,
+            "connect": self.connect_seconds,
+            "tls": self.tls_seconds,
+            "ttfb": self.ttfb_seconds,
+            "body": self.body_seconds,
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        values = asdict(self)
+        del values["sent_at"], values["headers_received_at"]
+        return values
+
+
+class SlowCallLog:
+    """The ``max_entries`` most recent upstream calls that took ``threshold_seconds`` or longer"""
+
+    def __init__(self, threshold_seconds: float = 1.0, max_entries: int = 100) -> None:
+        self.threshold_seconds = threshold_seconds
+        self.recorded = 0
+        self._entries: Deque[UpstreamTiming] = deque(maxlen=max_entries)
+        self._lock = threading.Lock()
+
+    def record(self, timing: UpstreamTiming) -> bool:
+        """Keep the call if it was slow, returns whether it was"""
+        if timing.total_seconds < self.threshold_seconds:
+            return False
+        with self._lock:
+            self._entries.append(timing)
+            self.recorded += 1
+        return True
+
+    def entries(self) -> List[UpstreamTiming]:
+        """Slow calls, oldest first"""
+        with self._lock:
+            return list(self._entries)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+
+@contextmanager
+def measure(timing: UpstreamTiming) -> Iterator[UpstreamTiming]:
+    """Record the phases of calls the current thread makes meanwhile into timing"""
+    previous = getattr(_current, "timing", None)
+    _current.timing = timing
+    try:
+        yield timing
+    finally:
+        _current.timing = previous
+
+
+def current_timing() -> Optional[UpstreamTiming]:
+    return getattr(_current, "timing", None)
+
+
+class TimedConnectionMixin:
+    """Time DNS and connect of new connections, and the wait for response headers"""
+
+    def _new_conn(self) -> socket.socket:
+        timing = current_timing()
+        if timing is None:
+            return super()._new_conn()
+        timing.reused_connection = False
+        started = time.perf_counter()
+        try:
+            addresses = socket.getaddrinfo(
+                self._dns_host, self.port, allowed_gai_family(), socket.SOCK_STREAM
+            )
+        except socket.gaierror as error:
+            raise NameResolutionError(self.host, self, error) from error
+        resolved = time.perf_counter()
+        timing.dns_seconds += resolved - started
+
+        # Connect to the resolved addresses in turn, like urllib3 does after its own lookup
+        host, error = self._dns_host, None
+        try:
+            for *_, address in addresses:
+                self._dns_host = address[0]
+                try:
+                    return super()._new_conn()
+                except ConnectTimeoutError as connect_error:
+                    error = connect_error
+            raise error
+        finally:
+            self._dns_host = host
+            timing.connect_seconds += time.perf_counter() - resolved
+
+    def request(self, *args, **kwargs) -> None:
+        super().request(*args, **kwargs)
+        timing = current_timing()
+        if timing is not None:
+            timing.sent_at = time.perf_counter()
+            if timing.reused_connection is None:
+                timing.reused_connection = True
+
+    def getresponse(self, *args, **kwargs):
+        response = super().getresponse(*args, **kwargs)
+        timing = current_timing()
+        if timing is not None:
+            timing.headers_received_at = time.perf_counter()
+            timing.ttfb_seconds += timing.headers_received_at - timing.sent_at
+        return response
+
+
+class TimedHTTPConnection(TimedConnectionMixin, HTTPConnection):
+    pass
+
+
+class TimedHTTPSConnection(TimedConnectionMixin, HTTPSConnection):
+    def connect(self) -> None:
+        timing = current_timing()
+        if timing is None:
+            return super().connect()
+        started = time.perf_counter()
+        before = timing.dns_seconds + timing.connect_seconds
+        super().connect()
+        # Whatever connect took beyond the lookup and TCP connect is the handshake
+        socket_seconds = timing.dns_seconds + timing.connect_seconds - before
+        timing.tls_seconds += time.perf_counter() - started - socket_seconds
+
+
+class TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = TimedHTTPConnection
+
+
+class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = TimedHTTPSConnection
+
+
+class TimedHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter whose pools open Timed* connections"""
+
+    def init_poolmanager(self, *args, **kwargs) -> None:
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": TimedHTTPConnectionPool,
+            "https": TimedHTTPSConnectionPool,
+        }
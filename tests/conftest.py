@@ -0,0 +1,107 @@
+"""Fixtures shared by the test modules"""
+
+import json
+import os
+import shutil
+import sys
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from benchmarks.stub_server import LIST_ATHLETES_PATH, TOKEN_PATH, StubTrainingPeaksServer
+
+TEST_CONFIG_PATH = os.path.join(os.path.dirname(__file__), "config", "test_config.ini")
+
+
+class FakeClock:
+    """A clock that only moves when a test sets or advances ``now``"""
+
+    def __init__(self, now: float = 0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def fake_clock():
+    return FakeClock()
+
+
+@pytest.fixture(scope="session")
+def stub_server():
+    server = StubTrainingPeaksServer().start()
+    yield server
+    server.stop()
+
+
+def make_workdir(workdir, stub_server) -> dict:
+    """Put the test config in workdir/config, returns the overrides pointing it at the stub server"""
+    os.makedirs(workdir / "config")
+    shutil.copy(TEST_CONFIG_PATH, workdir / "config" / "config.ini")
+    return {
+        "TP_OAUTH__TOKEN_URL": f"{stub_server.base_url}{TOKEN_PATH}",
+        "TP_PUBLIC_API__LIST_ATHLETES_ENDPOINT": f"{stub_server.base_url}{LIST_ATHLETES_PATH}",
+        "TP_SESSION__BACKEND": "memory",
+        "TP_PROFILING__ENABLED": "false",
+        "TP_ROSTER_SYNC__ENABLED": "true",
+        "TP_ROSTER_SYNC__ID_FIELD": "Id",
+        # Every call reaches the stub, so tests see the roster they set
+        "TP_RESPONSE_CACHE__TTL_SECONDS": "0",
+    }
+
+
+@pytest.fixture(scope="session")
+def main_module(stub_server, tmp_path_factory):
+    """main.py imported once, with the test config pointed at the stub server
+
+    main.py reads ./config/config.ini and the environment while it is imported,
+    so both are only swapped in for the import.
+    """
+    workdir = tmp_path_factory.mktemp("main")
+    environ = make_workdir(workdir, stub_server)
+    saved_environ, saved_cwd = dict(os.environ), os.getcwd()
+    os.environ.update(environ)
+    os.chdir(workdir)
+    try:
+        import main
+    finally:
+        os.chdir(saved_cwd)
+        os.environ.clear()
+        os.environ.update(saved_environ)
+    return main
+
+
+@pytest.fixture
+def app_workdir(stub_server, tmp_path):
+    """A directory to run the app in and the environment overrides it needs"""
+    return tmp_path, make_workdir(tmp_path, stub_server)
+
+
+@pytest.fixture
+def app_client(main_module):
+    """A Flask test client with a cookie jar of its own, i.e. a new user"""
+    return main_module.app.test_client()
+
+
+@pytest.fixture
+def set_roster(stub_server):
+    """Set the athletes the stub server lists, restored after the test"""
+    payload = stub_server.athletes_payload
+
+    def set_athletes(athletes):
+        stub_server.athletes_payload = json.dumps(athletes).encode()
+
+    yield set_athletes
+    stub_server.athletes_payload = payload
+
+
+@pytest.fixture
+def set_error_rate(stub_server):
+    """Set the share of stub server calls that fail with a 500, restored after the test"""
+    error_rate = stub_server.error_rate
+
+    def set_rate(rate):
+        stub_server.error_rate = rate
+
+    yield set_rate
+    stub_server.error_rate = error_rate
@@ -0,0 +1,224 @@
+import asyncio
+from contextlib import contextmanager
+import copy
+from dataclasses import replace
+from http.cookies import SimpleCookie
+import re
+import threading
+from types import SimpleNamespace
+import pytest
+from aiohttp.test_utils import TestClient, TestServer
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from benchmarks import stub_server as stub_server_module
+from services.application_state import Status
+from services.compression import Compressor
+from services.metrics import RENDER_DURATION
+
+# Tokens issued a moment apart may expire in different seconds
+TOKEN_EXPIRATION = re.compile(r'"Token Expiration": "[^"]*"')
+
+STEPS = [
+    "/",
+    "/callback",
+    "/callback?code=test-code",
+    "/get-test-data",
+    "/get-token",
+    "/get-test-data",
+    "/refresh-token",
+    "/get-test-data",
+    "/",
+]
+
+
+@pytest.fixture(scope="module")
+def async_main_module(main_module):
+    import async_main
+    return async_main
+
+
+@pytest.fixture
+def same_tokens(monkeypatch):
+    """The stub server issues the same tokens to both apps, so their pages can be compared"""
+    monkeypatch.setattr(
+        stub_server_module, "secrets", SimpleNamespace(token_urlsafe=lambda _: "stub-token")
+    )
+
+
+def normalize(body: str) -> str:
+    return TOKEN_EXPIRATION.sub('"Token Expiration": ""', body)
+
+
+def get_flask_pages(app_client, paths):
+    pages = []
+    for path in paths:
+        response = app_client.get(path)
+        pages.append((response.status_code, normalize(response.get_data(as_text=True))))
+    return pages
+
+
+def run_async_client(async_main_module, calls, cookies=None):
+    """Run calls(client) against the aiohttp app with an aiohttp test client"""
+    async def run():
+        client = TestClient(TestServer(async_main_module.create_app()))
+        await client.start_server()
+        if cookies:
+            client.session.cookie_jar.update_cookies(cookies)
+        try:
+            return await calls(client)
+        finally:
+            await client.close()
+            snapshot = async_main_module.main.config_manager.current
+            for name in snapshot.clients:
+                await async_main_module.main.clients.get(snapshot, name).async_http_client.close()
+
+    return asyncio.run(run())
+
+
+def get_async_pages(async_main_module, paths, cookies=None):
+    async def calls(client):
+        pages = []
+        for path in paths:
+            response = await client.get(path)
+            pages.append((response.status, normalize(await response.text())))
+        return pages
+
+    return run_async_client(async_main_module, calls, cookies)
+
+
+def cookie_settings(set_cookie: str):
+    (morsel,) = SimpleCookie(set_cookie).values()
+    return morsel.key, {key: value for key, value in morsel.items() if value}
+
+
+def test_pages_match_the_flask_app(app_client, async_main_module, same_tokens):
+    flask_pages = get_flask_pages(app_client, STEPS)
+    async_pages = get_async_pages(async_main_module, STEPS)
+
+    assert [status for status, _ in async_pages] == [200] * len(STEPS)
+    for path, flask_page, async_page in zip(STEPS, flask_pages, async_pages):
+        assert async_page == flask_page, path
+    assert "stub-token" in async_pages[-1][1]
+
+
+def test_failed_calls_match_the_flask_app(app_client, async_main_module, set_error_rate):
+    steps = ["/callback?code=test-code", "/get-token"]
+    set_error_rate(1.0)
+    flask_pages = get_flask_pages(app_client, steps)
+    async_pages = get_async_pages(async_main_module, steps)
+
+    assert async_pages == flask_pages
+    assert "Token Generation Failed" in async_pages[-1][1]
+
+
+def test_named_clients_match_the_flask_app(app_client, async_main_module):
+    steps = ["/clients/partner/callback?code=partner-code", "/clients/partner/"]
+    assert get_async_pages(async_main_module, steps) == get_flask_pages(app_client, steps)
+
+    async def unknown(client):
+        return (await client.get("/clients/unknown/")).status
+
+    assert run_async_client(async_main_module, unknown) == 404
+    assert app_client.get("/clients/unknown/").status_code == 404
+
+
+def test_cookie_is_set_like_the_flask_app(app_client, async_main_module):
+    flask_cookie = app_client.get("/").headers["Set-Cookie"]
+
+    async def calls(client):
+        first = await client.get("/")
+        second = await client.get("/")
+        return first.headers["Set-Cookie"], "Set-Cookie" in second.headers
+
+    async_cookie, set_again = run_async_client(async_main_module, calls)
+    assert cookie_settings(async_cookie) == cookie_settings(flask_cookie)
+    assert not set_again
+
+
+def test_flask_cookie_is_read_by_the_async_app(app_client, async_main_module, same_tokens):
+    app_client.get("/callback?code=test-code")
+    app_client.get("/get-token")
+    flask_page = app_client.get("/")
+    cookie = app_client.get_cookie("session").value
+
+    async def calls(client):
+        response = await client.get("/")
+        revalidated = await client.get("/", headers={"If-None-Match": flask_page.headers["ETag"]})
+        return response.status, await response.text(), "Set-Cookie" in response.headers, revalidated.status
+
+    status, body, set_cookie, revalidated = run_async_client(
+        async_main_module, calls, cookies={"session": cookie}
+    )
+    assert status == 200
+    assert body == flask_page.get_data(as_text=True)
+    assert not set_cookie
+    assert revalidated == 304
+
+
+def test_async_cookie_is_read_by_the_flask_app(app_client, async_main_module):
+    async def calls(client):
+        await client.get("/callback?code=async-code")
+        response = await client.get("/")
+        return await response.text(), client.session.cookie_jar.filter_cookies(client.make_url("/"))
+
+    body, cookies = run_async_client(async_main_module, calls)
+    app_client.set_cookie("session", cookies["session"].value)
+
+    assert "async-code" in body
+    assert app_client.get("/").get_data(as_text=True) == body
+
+
+def test_session_is_locked_and_unlocked_on_one_worker_thread(async_main_module, monkeypatch):
+    store = async_main_module.main.session_store
+    store_session = store.session
+    threads = []
+
+    @contextmanager
+    def session(state_key):
+        entered = threading.get_ident()
+        with store_session(state_key) as state:
+            yield state
+        threads.append((entered, threading.get_ident()))
+
+    monkeypatch.setattr(store, "session", session)
+
+    async def calls(client):
+        for path in ("/callback?code=test-code", "/get-token", "/get-test-data"):
+            await client.get(path)
+        return threading.get_ident()
+
+    loop_thread = run_async_client(async_main_module, calls)
+    assert len(threads) == 5
+    assert all(entered == exited != loop_thread for entered, exited in threads)
+
+
+def test_page_render_is_timed_once_per_request(async_main_module):
+    status = Status.NOT_RUN.value
+    rendered = RENDER_DURATION.get_count(status)
+    assert get_async_pages(async_main_module, ["/"])[0][0] == 200
+    assert RENDER_DURATION.get_count(status) == rendered + 1
+
+
+def test_deadline_follows_a_reloaded_config(async_main_module, monkeypatch):
+    snapshot = copy.copy(async_main_module.main.config_manager.current)
+    snapshot.http = replace(snapshot.http, deadline_seconds=7)
+    monkeypatch.setattr(async_main_module.main.config_manager, "_current", snapshot)
+    budgets = []
+    monkeypatch.setattr(async_main_module, "Deadline", lambda seconds: budgets.append(seconds))
+
+    assert get_async_pages(async_main_module, ["/"])[0][0] == 200
+    assert budgets == [7]
+
+
+def test_pages_are_not_compressed_by_default(async_main_module, monkeypatch):
+    monkeypatch.setattr(async_main_module.main, "compressor", Compressor(min_size_bytes=1))
+
+    async def calls(client):
+        response = await client.get("/callback?code=reflected", headers={"Accept-Encoding": "gzip"})
+        return response.headers
+
+    headers = run_async_client(async_main_module, calls)
+    assert "Content-Encoding" not in headers
+    assert "Accept-Encoding" not in headers.get("Vary", "")
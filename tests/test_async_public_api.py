@@ -0,0 +1,256 @@
+import asyncio
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import threading
+from urllib.parse import parse_qs
+import pytest
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from services.async_http_client import AsyncHttpClient
+from services.async_public_api import (
+    AsyncGetTokenRequest,
+    AsyncListAthleteRequest,
+    AsyncRefreshTokenRequest,
+)
+from services.config_loader import HttpConfig
+from services.deadline import Deadline
+from services.metrics import UPSTREAM_REQUEST_DURATION
+from services.rate_limiter import RateLimiter
+from services.response_cache import ResponseCache
+
+ATHLETES = [{"id": 1, "name": "Athlete One"}, {"id": 2, "name": "Athlete Two"}]
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def send_json(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        self.server.clients.add(self.client_address)
+        length = int(self.headers["Content-Length"])
+        form = parse_qs(self.rfile.read(length).decode())
+        self.server.forms.append(form)
+        if form.get("client_secret") != ["secret"]:
+            self.send_json(401, {"error": "invalid_client"})
+            return
+        self.send_json(200, {
+            "access_token": "access",
+            "refresh_token": "refresh-" + form["grant_type"][0],
+            "expires_in": 3600,
+        })
+
+    def do_GET(self):
+        self.server.clients.add(self.client_address)
+        self.server.gets += 1
+        if self.headers["Authorization"] != "Bearer access":
+            self.send_json(401, {"error": "invalid_token"})
+            return
+        self.send_json(200, ATHLETES)
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+
+@pytest.fixture
+def stub_server():
+    server = StubServer(("127.0.0.1", 0), StubHandler)
+    server.clients = set()
+    server.forms = []
+    server.gets = 0
+    thread = threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def base_url(stub_server):
+    return f"http://127.0.0.1:{stub_server.server_address[1]}"
+
+
+def run(coroutine_factory, client=None):
+    client = client or AsyncHttpClient(HttpConfig())
+
+    async def main():
+        try:
+            return await coroutine_factory(client)
+        finally:
+            await client.close()
+
+    return asyncio.run(main())
+
+
+def test_get_token(base_url, stub_server):
+    response = run(lambda client: AsyncGetTokenRequest("code", "http://localhost/callback").execute(
+        f"{base_url}/token", "id", "secret", http_client=client
+    ))
+
+    assert response.access_token == "access"
+    assert response.refresh_token == "refresh-authorization_code"
+    assert response.is_token_expired() is False
+    assert stub_server.forms[0]["code"] == ["code"]
+
+
+def test_refresh_token(base_url):
+    response = run(lambda client: AsyncRefreshTokenRequest("refresh").execute(
+        f"{base_url}/token", "id", "secret", http_client=client
+    ))
+
+    assert response.refresh_token == "refresh-refresh_token"
+
+
+def test_failed_token_request_returns_none(base_url):
+    response = run(lambda client: AsyncGetTokenRequest("code").execute(
+        f"{base_url}/token", "id", "wrong", http_client=client
+    ))
+
+    assert response is None
+
+
+def test_list_athletes(base_url):
+    response = run(lambda client: AsyncListAthleteRequest().execute(
+        f"{base_url}/athletes", "access", http_client=client
+    ))
+
+    assert response.data == json.dumps(ATHLETES, indent=4)
+    assert response.status_code == 200
+
+
+def test_failed_list_athletes_returns_none(base_url):
+    response = run(lambda client: AsyncListAthleteRequest().execute(
+        f"{base_url}/athletes", "expired", http_client=client
+    ))
+
+    assert response is None
+
+
+def test_failed_list_athletes_records_failure(base_url):
+    request = AsyncListAthleteRequest()
+    run(lambda client: request.execute(f"{base_url}/athletes", "expired", http_client=client))
+
+    assert request.failure.status_code == 401
+    assert request.failure.error == "invalid_token"
+
+
+def test_fresh_cached_athletes_skip_the_request(base_url, stub_server):
+    cache = ResponseCache(ttl_seconds=60)
+
+    async def calls(client):
+        first = await AsyncListAthleteRequest().execute(
+            f"{base_url}/athletes", "access", http_client=client, cache=cache
+        )
+        second = await AsyncListAthleteRequest().execute(
+            f"{base_url}/athletes", "access", http_client=client, cache=cache
+        )
+        return first, second
+
+    first, second = run(calls)
+    assert second is first
+    assert stub_server.gets == 1
+
+
+def test_rate_limited_call_fails_locally(base_url, stub_server):
+    limiter = RateLimiter(requests_per_second=0.01, burst=1, max_wait_seconds=0)
+    client = AsyncHttpClient(HttpConfig(), client_id="id", rate_limiter=limiter)
+    request = AsyncListAthleteRequest()
+
+    async def calls(client):
+        await request.execute(f"{base_url}/athletes", "access", http_client=client)
+        return await request.execute(f"{base_url}/athletes", "access", http_client=client)
+
+    assert run(calls, client) is None
+    assert request.failure.status_code == 429
+    assert stub_server.gets == 1
+
+
+def test_rate_limit_wait_is_capped_by_the_deadline(base_url, stub_server):
+    limiter = RateLimiter(requests_per_second=0.5, burst=1, max_wait_seconds=30)
+    client = AsyncHttpClient(HttpConfig(), client_id="id", rate_limiter=limiter)
+    request = AsyncListAthleteRequest()
+    before = stub_server.gets
+
+    async def calls(client):
+        await request.execute(f"{base_url}/athletes", "access", http_client=client)
+        return await request.execute(
+            f"{base_url}/athletes", "access", http_client=client, deadline=Deadline(0.2)
+        )
+
+    assert run(calls, client) is None
+    assert request.failure.status_code == 504
+    assert stub_server.gets == before + 1
+
+
+def test_rate_limited_call_waits_without_blocking(base_url):
+    limiter = RateLimiter(requests_per_second=20, burst=1, max_wait_seconds=5)
+    client = AsyncHttpClient(HttpConfig(), client_id="id", rate_limiter=limiter)
+
+    async def calls(client):
+        return await asyncio.gather(*(
+            AsyncListAthleteRequest().execute(f"{base_url}/athletes", "access", http_client=client)
+            for _ in range(3)
+        ))
+
+    assert all(response.status_code == 200 for response in run(calls, client))
+
+
+def test_calls_are_timed(base_url):
+    endpoint = f"{base_url}/athletes"
+    before = UPSTREAM_REQUEST_DURATION.get_count("AsyncListAthleteRequest", endpoint, "200")
+    run(lambda client: AsyncListAthleteRequest().execute(endpoint, "access", http_client=client))
+    assert UPSTREAM_REQUEST_DURATION.get_count("AsyncListAthleteRequest", endpoint, "200") == before + 1
+
+
+def test_sequential_calls_reuse_connection(base_url, stub_server):
+    async def calls(client):
+        for _ in range(5):
+            await AsyncListAthleteRequest().execute(
+                f"{base_url}/athletes", "access", http_client=client
+            )
+
+    run(calls)
+    assert len(stub_server.clients) == 1
+
+
+def test_concurrent_calls_share_pool(base_url):
+    async def calls(client):
+        return await asyncio.gather(*(
+            AsyncListAthleteRequest().execute(f"{base_url}/athletes", "access", http_client=client)
+            for _ in range(50)
+        ))
+
+    responses = run(calls)
+    assert len(responses) == 50
+    assert all(response.status_code == 200 for response in responses)
+
+
+def test_session_is_per_event_loop():
+    client = AsyncHttpClient()
+
+    async def session():
+        session = client.get_session()
+        await client.close()
+        return session
+
+    async def same_loop():
+        first = client.get_session()
+        second = client.get_session()
+        await client.close()
+        return first is second
+
+    assert asyncio.run(same_loop()) is True
+    assert asyncio.run(session()) is not asyncio.run(session())
@@ -0,0 +1,132 @@
+import threading
+import time
+from unittest.mock import MagicMock
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from services.bulk import BulkExecutor
+from services.deadline import Deadline
+from services.http_client import HttpClient
+from services.public_api import AthleteDataRequest
+
+WORKOUTS_URL = "https://api.example.com/v2/workouts/{athlete_id}"
+
+
+def test_all_items_complete():
+    executor = BulkExecutor(max_workers=4)
+    results = list(executor.run(range(20), lambda item: "https://api.example.com", lambda item: item * 2))
+
+    assert sorted(result.response for result in results) == [item * 2 for item in range(20)]
+    assert all(result.ok for result in results)
+
+
+def test_results_arrive_in_completion_order():
+    executor = BulkExecutor(max_workers=2)
+    delays = {"slow": 0.2, "fast": 0.0}
+
+    def call(item):
+        time.sleep(delays[item])
+        return item
+
+    results = executor.run(["slow", "fast"], lambda item: "https://api.example.com", call)
+    assert [result.item for result in results] == ["fast", "slow"]
+
+
+def test_failures_do_not_abort_the_batch():
+    def call(item):
+        if item == 3:
+            raise ConnectionError("reset")
+        return item
+
+    results = {result.item: result for result in BulkExecutor(max_workers=3).run(
+        range(6), lambda item: "https://api.example.com", call
+    )}
+
+    assert len(results) == 6
+    assert isinstance(results[3].error, ConnectionError)
+    assert results[3].ok is False
+    assert results[4].ok is True
+
+
+def test_concurrency_is_capped_per_host():
+    lock = threading.Lock()
+    active = {"a": 0, "b": 0}
+    peak = {"a": 0, "b": 0}
+
+    def call(item):
+        host = item[0]
+        with lock:
+            active[host] += 1
+            peak[host] = max(peak[host], active[host])
+        time.sleep(0.02)
+        with lock:
+            active[host] -= 1
+
+    items = [f"{host}{index}" for index in range(8) for host in "ab"]
+    executor = BulkExecutor(max_workers=8, max_per_host=2)
+    list(executor.run(items, lambda item: f"https://{item[0]}.example.com/x", call))
+
+    assert peak == {"a": 2, "b": 2}
+
+
+def test_input_is_consumed_lazily():
+    consumed = []
+
+    def items():
+        for index in range(100):
+            consumed.append(index)
+            yield index
+
+    results = BulkExecutor(max_workers=4).run(items(), lambda item: "https://h", lambda item: item)
+    next(results)
+    assert len(consumed) <= 5
+    results.close()
+
+
+def test_execute_for_athletes():
+    http_client = MagicMock()
+    http_client.get.side_effect = lambda url, **kwargs: MagicMock(
+        ok=not url.endswith("/2"),
+        status_code=404 if url.endswith("/2") else 200,
+        text='{"Message": "No such athlete"}',
+        json=lambda: {"url": url},
+    )
+    athletes = [{"Id": 1}, {"Id": 2}, {"Id": 3}]
+    deadline = Deadline(30)
+
+    results = {
+        result.item["Id"]: result
+        for result in BulkExecutor(max_workers=2).execute_for_athletes(
+            athletes,
+            AthleteDataRequest(WORKOUTS_URL),
+            "token",
+            http_client=http_client,
+            deadline=deadline,
+        )
+    }
+
+    assert results[1].response.data == {"url": "https://api.example.com/v2/workouts/1"}
+    assert results[1].failure is None
+    assert results[2].ok is False
+    assert results[2].failure.status_code == 404
+    assert results[2].failure.description == "No such athlete"
+    assert results[3].ok
+    assert http_client.get.call_args.kwargs["headers"] == {"Authorization": "Bearer token"}
+    assert http_client.get.call_args.kwargs["deadline"] is deadline
+
+
+def test_athletes_left_after_the_deadline_fail_fast():
+    http_client = HttpClient()
+    http_client.session.request = MagicMock()
+    results = list(BulkExecutor(max_workers=2).execute_for_athletes(
+        [{"Id": 1}, {"Id": 2}],
+        AthleteDataRequest(WORKOUTS_URL),
+        "token",
+        http_client=http_client,
+        deadline=Deadline(0),
+    ))
+
+    assert [result.failure.status_code for result in results] == [504, 504]
+    assert all(result.error is None for result in results)
+    http_client.session.request.assert_not_called()
@@ -0,0 +1,69 @@
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from services.circuit_breaker import CircuitBreaker, CircuitState
+
+
+def open_breaker(clock, key="token"):
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout_seconds=10, clock=clock)
+    for _ in range(3):
+        assert breaker.allow(key) is None
+        breaker.record_failure(key)
+    return breaker
+
+
+def test_opens_after_consecutive_failures(fake_clock):
+    breaker = open_breaker(fake_clock)
+    assert breaker.get_state("token") is CircuitState.OPEN
+    assert breaker.allow("token") == 10
+    assert breaker.rejected == 1
+
+
+def test_success_resets_the_failure_count():
+    breaker = CircuitBreaker(failure_threshold=2)
+    breaker.record_failure("token")
+    breaker.record_success("token")
+    breaker.record_failure("token")
+    assert breaker.get_state("token") is CircuitState.CLOSED
+
+
+def test_circuits_are_per_key(fake_clock):
+    breaker = open_breaker(fake_clock)
+    assert breaker.allow("athletes") is None
+    assert breaker.count_open() == 1
+
+
+def test_half_open_lets_one_probe_through(fake_clock):
+    breaker = open_breaker(fake_clock)
+    fake_clock.now += 10
+    assert breaker.allow("token") is None
+    assert breaker.get_state("token") is CircuitState.HALF_OPEN
+    assert breaker.allow("token") == 0
+
+
+def test_successful_probe_closes(fake_clock):
+    breaker = open_breaker(fake_clock)
+    fake_clock.now += 10
+    breaker.allow("token")
+    breaker.record_success("token")
+    assert breaker.get_state("token") is CircuitState.CLOSED
+    assert breaker.allow("token") is None
+    assert breaker.count_open() == 0
+
+
+def test_failed_probe_opens_again(fake_clock):
+    breaker = open_breaker(fake_clock)
+    fake_clock.now += 10
+    breaker.allow("token")
+    breaker.record_failure("token")
+    assert breaker.get_state("token") is CircuitState.OPEN
+    assert breaker.allow("token") == 10
+
+
+def test_cancelled_probe_is_given_back(fake_clock):
+    breaker = open_breaker(fake_clock)
+    fake_clock.now += 10
+    breaker.allow("token")
+    breaker.cancel("token")
+    assert breaker.allow("token") is None
@@ -0,0 +1,58 @@
+import pytest
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from services.client_registry import ClientRegistry, make_state_key, split_state_key
+from services.config_loader import Config
+
+TEST_CONFIG_PATH = "tests/config/test_config.ini"
+
+
+@pytest.fixture
+def config():
+    return Config(TEST_CONFIG_PATH, environ={"TP_RATE_LIMIT__ENABLED": "true"})
+
+
+@pytest.fixture
+def registry(config):
+    registry = ClientRegistry(config.http)
+    yield registry
+    registry.close()
+
+
+def test_each_client_has_its_own_pool_and_rate_limit(registry, config):
+    default = registry.get(config)
+    partner = registry.get(config, "partner")
+    assert default.http_client is not partner.http_client
+    assert default.http_client.rate_limiter is not partner.http_client.rate_limiter
+    assert default.async_http_client.rate_limiter is default.http_client.rate_limiter
+    assert partner.http_client.rate_limiter.requests_per_second == 1
+    assert partner.http_client.client_id == "partner-client-id"
+    assert partner.oauth.client_id == "partner-client-id"
+    assert len(registry) == 2
+
+
+def test_pool_is_reused_across_snapshots(registry, config):
+    first = registry.get(config, "partner")
+    rotated = Config(TEST_CONFIG_PATH, environ={"TP_OAUTH_PARTNER__CLIENT_SECRET": "rotated"})
+    second = registry.get(rotated, "partner")
+    assert second.http_client is first.http_client
+    assert second.oauth.client_secret == "rotated"
+
+
+def test_unknown_client(registry, config):
+    assert registry.get(config, "missing") is None
+    assert len(registry) == 0
+
+
+def test_rate_limit_can_be_disabled(registry):
+    config = Config(TEST_CONFIG_PATH, environ={})
+    assert registry.get(config, "partner").http_client.rate_limiter is None
+
+
+def test_state_keys():
+    assert make_state_key("default", "abc") == "abc"
+    assert make_state_key("partner", "abc") == "partner:abc"
+    assert split_state_key("abc") == ("default", "abc")
+    assert split_state_key("partner:abc") == ("partner", "abc")
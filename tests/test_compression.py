@@ -0,0 +1,97 @@
+import gzip
+import pytest
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from services import compression
+from services.compression import (
+    BROTLI,
+    GZIP,
+    Compressor,
+    is_compressible,
+    parse_accept_encoding,
+)
+
+BODY = b"<pre>" + b'{"Id": 1, "FirstName": "Athlete"}, ' * 200 + b"</pre>"
+
+
+@pytest.fixture
+def compressor():
+    return Compressor(min_size_bytes=100, max_entries=2)
+
+
+def test_parse_accept_encoding():
+    assert parse_accept_encoding("gzip, br;q=0.5, *;q=0") == {"gzip": 1.0, "br": 0.5, "*": 0.0}
+    assert parse_accept_encoding("GZIP;q=bad") == {"gzip": 0.0}
+    assert parse_accept_encoding(None) == {}
+
+
+@pytest.mark.parametrize(
+    "accept_encoding, encoding",
+    [
+        ("gzip, deflate", GZIP),
+        ("*", GZIP),
+        ("gzip;q=0", None),
+        ("deflate", None),
+        ("identity", None),
+        ("", None),
+    ],
+)
+def test_negotiate_without_brotli(monkeypatch, accept_encoding, encoding):
+    monkeypatch.setattr(compression, "brotli", None)
+    assert Compressor().negotiate(accept_encoding) == encoding
+
+
+def test_negotiate_prefers_brotli_when_available(monkeypatch):
+    monkeypatch.setattr(compression, "brotli", object())
+    assert Compressor().negotiate("gzip, br") == BROTLI
+    assert Compressor().negotiate("gzip, br;q=0.5") == GZIP
+
+
+def test_compress_gzip(compressor):
+    compressed = compressor.compress(BODY, GZIP, etag="page")
+    assert gzip.decompress(compressed) == BODY
+    assert len(compressed) < len(BODY) / 10
+
+
+def test_unchanged_body_is_compressed_once(compressor):
+    first = compressor.compress(BODY, GZIP, etag="page")
+    assert compressor.compress(BODY, GZIP, etag="page") is first
+    stats = compressor.stats()
+    assert (stats.hits, stats.misses) == (1, 1)
+    assert stats.bytes_in == len(BODY)
+    assert stats.bytes_out == len(first)
+
+
+def test_body_without_etag_is_keyed_by_content(compressor):
+    first = compressor.compress(BODY, GZIP)
+    assert compressor.compress(bytes(BODY), GZIP) is first
+    assert gzip.decompress(compressor.compress(BODY + b"!", GZIP)) == BODY + b"!"
+    assert compressor.stats().misses == 2
+
+
+def test_least_recently_used_bodies_are_evicted(compressor):
+    for etag in ("a", "b", "c"):
+        compressor.compress(BODY, GZIP, etag=etag)
+    assert len(compressor) == 2
+    assert compressor.stats().evictions == 1
+
+
+def test_small_bodies_are_not_compressed(compressor):
+    assert not compressor.should_compress(b"x" * 99)
+    assert compressor.should_compress(b"x" * 100)
+
+
+def test_compressible_types():
+    assert is_compressible("text/html")
+    assert is_compressible("application/json")
+    assert not is_compressible("image/png")
+    assert not is_compressible(None)
+
+
+def test_html_is_only_compressed_when_enabled(compressor):
+    assert not compressor.compresses("text/html")
+    assert compressor.compresses("application/json")
+    assert not compressor.compresses("image/png")
+    assert Compressor(compress_html=True).compresses("text/html")
@@ -1,9 +1,10 @@
+from dataclasses import FrozenInstanceError
 import pytest
 import sys
 import os
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
-from services.config_loader import Config
+from services.config_loader import Config, ConfigError
 
 # Path to your test configuration file
 TEST_CONFIG_PATH = "tests/config/test_config.ini"
@@ -26,3 +27,181 @@ def test_server_config_loading(test_config):
 
 def test_public_api_config_loading(test_config):
     assert test_config.public_api.list_athletes_endpoint == "https://api.testsite.com/v1/test/athletes"
+
+def test_http_config_loading(test_config):
+    assert test_config.http.pool_connections == 4
+    assert test_config.http.pool_maxsize == 20
+    assert test_config.http.pool_block is True
+    assert test_config.http.max_retries == 5
+    assert test_config.http.backoff_factor == 0.25
+    assert test_config.http.connect_timeout_seconds == 2.5
+    assert test_config.http.read_timeout_seconds == 10
+    assert test_config.http.deadline_seconds == 20
+    assert test_config.http.phase_timing is False
+    assert test_config.http.slow_call_seconds == 0.5
+    assert test_config.http.max_slow_calls == 10
+
+def test_http_config_defaults(tmp_path):
+    config_file = tmp_path / "config.ini"
+    with open(TEST_CONFIG_PATH) as source:
+        config_file.write_text(source.read().split("[http]")[0])
+    config = Config(config_file=str(config_file))
+    assert config.http.pool_connections == 10
+    assert config.http.pool_maxsize == 10
+    assert config.http.pool_block is False
+    assert config.http.max_retries == 3
+
+def test_session_config_loading(test_config):
+    assert test_config.session.max_sessions == 50
+    assert test_config.session.ttl_seconds == 120
+    assert test_config.session.backend == "sqlite"
+    assert test_config.session.path == "./sessions-test.db"
+
+def test_token_refresh_config_loading(test_config):
+    assert test_config.token_refresh.enabled is False
+    assert test_config.token_refresh.margin_seconds == 30
+    assert test_config.token_refresh.jitter_seconds == 5
+    assert test_config.token_refresh.coalesce_seconds == 2
+
+def test_async_http_config_loading(test_config):
+    assert test_config.http.async_limit == 200
+    assert test_config.http.async_limit_per_host == 50
+
+def test_response_cache_config_loading(test_config):
+    assert test_config.response_cache.max_entries == 25
+    assert test_config.response_cache.ttl_seconds == 15
+
+def test_token_store_config_loading(test_config):
+    assert test_config.token_store.enabled is False
+    assert test_config.token_store.path == "./tokens-test.db"
+    assert test_config.token_store.flush_interval_seconds == 0.5
+    assert test_config.token_store.max_age_days == 7
+    assert test_config.server.secret_key is None
+
+def test_rate_limit_config_loading(test_config):
+    assert test_config.rate_limit.enabled is False
+    assert test_config.rate_limit.requests_per_second == 2.5
+    assert test_config.rate_limit.burst == 5
+    assert test_config.rate_limit.max_wait_seconds == 3
+
+def test_circuit_breaker_config_loading(test_config):
+    assert test_config.circuit_breaker.enabled is False
+    assert test_config.circuit_breaker.failure_threshold == 3
+    assert test_config.circuit_breaker.reset_timeout_seconds == 15
+
+def test_compression_config_loading(test_config):
+    assert test_config.compression.enabled is False
+    assert test_config.compression.min_size_bytes == 512
+    assert test_config.compression.gzip_level == 4
+    assert test_config.compression.brotli_quality == 7
+    assert test_config.compression.cache_entries == 16
+    assert test_config.compression.compress_html is True
+
+def test_profiling_config_loading(test_config):
+    assert test_config.profiling.enabled is True
+    assert test_config.profiling.sample_rate == 0.25
+    assert test_config.profiling.header == "X-Profile-Test"
+    assert test_config.profiling.header_secret == "profile-test-secret"
+    assert test_config.profiling.directory == "./profiles-test"
+    assert test_config.profiling.max_profiles == 5
+
+def test_connection_warmup_config_loading(test_config):
+    assert test_config.connection_warmup.enabled is False
+    assert test_config.connection_warmup.connections_per_host == 3
+    assert test_config.connection_warmup.keepalive_interval_seconds == 5
+
+def test_roster_sync_config_loading(test_config):
+    assert test_config.roster_sync.enabled is False
+    assert test_config.roster_sync.id_field == "AthleteId"
+
+def test_config_reload_config_loading(test_config):
+    assert test_config.config_reload.enabled is False
+    assert test_config.config_reload.interval_seconds == 0.5
+
+def test_named_client_config_loading(test_config):
+    partner = test_config.get_client("partner")
+    assert partner.oauth.client_id == "partner-client-id"
+    assert partner.oauth.client_secret == "partner-secret-key"
+    assert partner.oauth.token_url == "https://oauth.partner.testsite.com/OAuth/Token"
+    assert partner.public_api.list_athletes_endpoint == "https://api.partner.testsite.com/v1/test/athletes"
+    assert partner.rate_limit.requests_per_second == 1
+    assert test_config.server.get_redirect_uri("partner") == "http://localhost:9090/clients/partner/callback"
+
+def test_named_client_falls_back_to_default_sections(test_config):
+    partner = test_config.get_client("partner")
+    assert partner.oauth.authorization_url == test_config.oauth.authorization_url
+    assert partner.oauth.scopes == test_config.oauth.scopes
+    assert partner.rate_limit.burst == test_config.rate_limit.burst
+    assert partner.rate_limit.enabled is test_config.rate_limit.enabled
+
+def test_default_client_is_the_oauth_section(test_config):
+    assert list(test_config.clients) == ["default", "partner"]
+    default = test_config.get_client("default")
+    assert default.oauth is test_config.oauth
+    assert default.public_api is test_config.public_api
+    assert test_config.get_client("missing") is None
+
+def test_environment_overrides_named_client():
+    config = Config(
+        config_file=TEST_CONFIG_PATH,
+        environ={
+            "TP_OAUTH_PARTNER__CLIENT_SECRET": "rotated",
+            "TP_OAUTH_SANDBOX__CLIENT_ID": "sandbox-id",
+            "TP_OAUTH_SANDBOX__CLIENT_SECRET": "sandbox-secret",
+        },
+    )
+    assert config.get_client("partner").oauth.client_secret == "rotated"
+    assert config.get_client("sandbox").oauth.client_id == "sandbox-id"
+
+def test_environment_overrides_config_file():
+    config = Config(
+        config_file=TEST_CONFIG_PATH,
+        environ={
+            "TP_OAUTH__CLIENT_SECRET": "rotated%secret",
+            "TP_PUBLIC_API__LIST_ATHLETES_ENDPOINT": "https://api.example.com/athletes",
+            "TP_RATE_LIMIT__BURST": "9",
+            "OTHER__VALUE": "ignored",
+        },
+    )
+    assert config.oauth.client_secret == "rotated%secret"
+    assert config.public_api.list_athletes_endpoint == "https://api.example.com/athletes"
+    assert config.rate_limit.burst == 9
+    assert config.oauth.client_id == "test-client-id"
+
+def test_snapshot_sections_are_immutable(test_config):
+    with pytest.raises(FrozenInstanceError):
+        test_config.oauth.client_secret = "changed"
+
+@pytest.mark.parametrize(
+    "environ",
+    [
+        {"TP_OAUTH__TOKEN_URL": "not a url"},
+        {"TP_OAUTH__CLIENT_SECRET": ""},
+        {"TP_SERVER__LOCAL_PORT": "70000"},
+        {"TP_SESSION__BACKEND": "redis"},
+        {"TP_SESSION__MAX_SESSIONS": "many"},
+        {"TP_OAUTH_PARTNER__TOKEN_URL": "not a url"},
+        {"TP_OAUTH_PARTNER__CLIENT_SECRET": ""},
+        {"TP_OAUTH_SANDBOX__CLIENT_ID": "sandbox-id"},
+        {"TP_COMPRESSION__GZIP_LEVEL": "0"},
+        {"TP_COMPRESSION__BROTLI_QUALITY": "12"},
+        {"TP_PROFILING__SAMPLE_RATE": "1.5"},
+        {"TP_PROFILING__MAX_PROFILES": "0"},
+    ],
+)
+def test_invalid_config_is_rejected(environ):
+    with pytest.raises(ConfigError):
+        Config(config_file=TEST_CONFIG_PATH, environ=environ)
+
+def test_missing_setting_is_rejected(tmp_path):
+    config_file = tmp_path / "config.ini"
+    config_file.write_text("[oauth]\nclient_id = id\n")
+    with pytest.raises(ConfigError):
+        Config(config_file=str(config_file), environ={})
+
+def test_invalid_client_name_is_rejected(tmp_path):
+    config_file = tmp_path / "config.ini"
+    with open(TEST_CONFIG_PATH) as source:
+        config_file.write_text(source.read() + "\n[oauth.bad name]\nclient_id = id\nclient_secret = secret\n")
+    with pytest.raises(ConfigError):
+        Config(config_file=str(config_file), environ={})
@@ -0,0 +1,97 @@
+import pytest
+import sys
+import os
+import threading
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from services.config_loader import ConfigError
+from services.config_manager import ConfigManager
+
+TEST_CONFIG_PATH = "tests/config/test_config.ini"
+
+
+@pytest.fixture
+def config_file(tmp_path):
+    path = tmp_path / "config.ini"
+    with open(TEST_CONFIG_PATH) as source:
+        path.write_text(source.read())
+    return path
+
+
+def rewrite(path, old, new):
+    text = path.read_text()
+    path.write_text(text.replace(old, new))
+    # Make sure the change is visible even on filesystems with coarse mtimes
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+def test_unchanged_file_is_not_reloaded(config_file):
+    manager = ConfigManager(str(config_file), environ={})
+    snapshot = manager.current
+    assert manager.check() is False
+    assert manager.current is snapshot
+    assert manager.reloads == 0
+
+
+def test_changed_file_swaps_snapshot(config_file):
+    manager = ConfigManager(str(config_file), environ={})
+    old = manager.current
+    rewrite(config_file, "test-secret-key", "rotated-secret")
+    assert manager.check() is True
+    assert manager.current.oauth.client_secret == "rotated-secret"
+    # Readers holding the old snapshot keep their view
+    assert old.oauth.client_secret == "test-secret-key"
+
+
+def test_invalid_file_keeps_previous_snapshot(config_file):
+    manager = ConfigManager(str(config_file), environ={})
+    snapshot = manager.current
+    rewrite(config_file, "https://oauth.testsite.com/OAuth/Token", "nonsense")
+    assert manager.check() is False
+    assert manager.current is snapshot
+    assert manager.failures == 1
+    assert isinstance(manager.last_error, ConfigError)
+
+
+def test_deleted_file_keeps_previous_snapshot(config_file):
+    manager = ConfigManager(str(config_file), environ={})
+    snapshot = manager.current
+    os.remove(config_file)
+    assert manager.check() is False
+    assert manager.current is snapshot
+
+
+def test_listeners_get_old_and_new_snapshot(config_file):
+    manager = ConfigManager(str(config_file), environ={})
+    changes = []
+    manager.subscribe(lambda old, new: changes.append((old.oauth.scopes, new.oauth.scopes)))
+    rewrite(config_file, "test:scopes", "test:scopes more:scopes")
+    manager.check()
+    assert changes == [("test:scopes", "test:scopes more:scopes")]
+
+
+def test_environment_overrides_survive_reloads(config_file):
+    manager = ConfigManager(str(config_file), environ={"TP_OAUTH__CLIENT_ID": "from-env"})
+    rewrite(config_file, "test-secret-key", "rotated-secret")
+    manager.check()
+    assert manager.current.oauth.client_id == "from-env"
+    assert manager.current.oauth.client_secret == "rotated-secret"
+
+
+def test_background_watcher_reloads(config_file):
+    manager = ConfigManager(str(config_file), interval_seconds=0.01, environ={})
+    reloaded = threading.Event()
+    manager.subscribe(lambda old, new: reloaded.set())
+    manager.start()
+    try:
+        rewrite(config_file, "test-secret-key", "rotated-secret")
+        assert reloaded.wait(5)
+    finally:
+        manager.stop()
+    assert manager.current.oauth.client_secret == "rotated-secret"
+
+
+def test_interval_follows_current_snapshot(config_file):
+    manager = ConfigManager(str(config_file), environ={})
+    assert manager.get_interval() == 0.5
@@ -0,0 +1,152 @@
+import http.server
+import socket
+import threading
+import time
+import pytest
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from services.config_loader import HttpConfig
+from services.connection_warmer import ConnectionWarmer
+from services.http_client import HttpClient
+
+
+class StubHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"ok")
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(scope="module")
+def server_url():
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://localhost:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def http_client():
+    client = HttpClient(HttpConfig(max_retries=0, pool_maxsize=4))
+    yield client
+    client.close()
+
+
+def open_connections(http_client: HttpClient, url: str) -> int:
+    pool = http_client.get_pool(url)
+    return sum(1 for connection in list(pool.pool.queue) if connection is not None and connection.sock is not None)
+
+
+def test_warm_opens_connections_per_host(http_client, server_url):
+    url = f"{server_url}/OAuth/Token"
+    warmer = ConnectionWarmer(lambda: [(http_client, url)], connections_per_host=3)
+
+    assert warmer.warm() == 3
+    assert open_connections(http_client, url) == 3
+    assert http_client.get_pool(url).num_connections == 3
+    assert warmer.warmed == 3
+    assert warmer.failures == 0
+
+
+def test_calls_after_warm_reuse_a_warmed_connection(http_client, server_url):
+    url = f"{server_url}/v1/coach/athletes"
+    ConnectionWarmer(lambda: [(http_client, url)], connections_per_host=2).warm()
+
+    response = http_client.get(url)
+
+    assert response.status_code == 200
+    assert response.timing.reused_connection is True
+    assert http_client.get_pool(url).num_connections == 2
+
+
+def test_warm_is_capped_at_pool_maxsize(http_client, server_url):
+    url = f"{server_url}/OAuth/Token"
+    warmer = ConnectionWarmer(lambda: [(http_client, url)], connections_per_host=10)
+
+    assert warmer.warm() == 4
+    assert open_connections(http_client, url) == 4
+
+
+def test_warm_again_keeps_open_connections(http_client, server_url):
+    url = f"{server_url}/OAuth/Token"
+    warmer = ConnectionWarmer(lambda: [(http_client, url)], connections_per_host=2)
+    warmer.warm()
+
+    assert warmer.warm() == 2
+    assert http_client.get_pool(url).num_connections == 2
+
+
+def test_targets_on_one_host_are_warmed_once(http_client, server_url):
+    targets = [(http_client, f"{server_url}/OAuth/Token"), (http_client, f"{server_url}/v1/coach/athletes")]
+    warmer = ConnectionWarmer(lambda: targets, connections_per_host=2)
+
+    assert len(warmer.get_hosts()) == 1
+    assert warmer.warm() == 2
+
+
+def test_clients_are_warmed_apart(server_url):
+    clients = [HttpClient(HttpConfig(max_retries=0)) for _ in range(2)]
+    url = f"{server_url}/OAuth/Token"
+    warmer = ConnectionWarmer(lambda: [(client, url) for client in clients], connections_per_host=1)
+
+    assert warmer.warm() == 2
+    assert all(open_connections(client, url) == 1 for client in clients)
+    for client in clients:
+        client.close()
+
+
+def test_idle_only_skips_recently_used_hosts(http_client, server_url):
+    url = f"{server_url}/OAuth/Token"
+    warmer = ConnectionWarmer(lambda: [(http_client, url)], keepalive_interval_seconds=60)
+    http_client.get(url)
+
+    assert warmer.warm(idle_only=True) == 0
+
+
+def test_idle_only_reopens_connections_of_idle_hosts(http_client, server_url):
+    url = f"{server_url}/OAuth/Token"
+    warmer = ConnectionWarmer(lambda: [(http_client, url)], connections_per_host=2, keepalive_interval_seconds=0)
+    warmer.warm()
+    sockets = [connection.sock for connection in http_client.get_pool(url).pool.queue if connection is not None]
+
+    assert warmer.warm(idle_only=True) == 2
+    reopened = [connection.sock for connection in http_client.get_pool(url).pool.queue if connection is not None]
+    assert open_connections(http_client, url) == 2
+    assert not any(sock is old for sock in reopened for old in sockets)
+
+
+def test_refused_connection_is_counted_not_raised(http_client):
+    with socket.socket() as unused:
+        unused.bind(("127.0.0.1", 0))
+        url = f"http://127.0.0.1:{unused.getsockname()[1]}/OAuth/Token"
+    warmer = ConnectionWarmer(lambda: [(http_client, url)], connections_per_host=2)
+
+    assert warmer.warm() == 0
+    assert warmer.failures == 1
+    assert warmer.last_error is not None
+    # Connections are handed back so later calls are not starved of the pool
+    assert http_client.get_pool(url).pool.qsize() == 4
+
+
+def test_keepalive_thread_warms_idle_hosts(http_client, server_url):
+    url = f"{server_url}/OAuth/Token"
+    warmer = ConnectionWarmer(lambda: [(http_client, url)], connections_per_host=1, keepalive_interval_seconds=0.05)
+    warmer.start()
+    try:
+        deadline = time.monotonic() + 5
+        while warmer.warmed < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        warmer.stop(timeout=5)
+
+    assert warmer.warmed >= 2
+    assert warmer._thread is None
@@ -1,3 +1,4 @@
+import json
 import pytest
 from unittest.mock import patch, MagicMock
 import time
@@ -5,9 +6,10 @@ import sys
 import os
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
-from services.html_renderer import HtmlRenderer
+from services.html_renderer import HtmlRenderer, RenderLinks, format_expiration
 from services.application_state import ApplicationState
 from services.config_loader import Config
+from services.models import ApiError
 
 @pytest.fixture
 def mock_config():
@@ -94,6 +96,17 @@ def test_render_with_exception(html_renderer, mock_state):
     assert "Test exception" in html_renderer.render()
     assert 'Authorization Code Request' in html_renderer.render()
 
+def test_list_athletes_failure_when_upstream_unavailable(html_renderer, mock_state):
+    html_renderer.set_list_athletes_failure(ApiError.from_exception(TimeoutError("timed out"), timed_out=True))
+    assert mock_state.list_athletes_request_status == "Upstream Unavailable"
+    assert "Upstream Unavailable" in mock_state.exception_text
+    assert "504" in mock_state.exception_text
+
+def test_list_athletes_failure_when_refused(html_renderer, mock_state):
+    html_renderer.set_list_athletes_failure(ApiError.from_body(403, '{"Message": "Forbidden"}'))
+    assert mock_state.list_athletes_request_status == "Failure"
+    assert "403" in mock_state.exception_text
+
 def test_render_initial_state(html_renderer):
     rendered_html = html_renderer.render()
     assert "Authorize" in rendered_html
@@ -112,3 +125,54 @@ def test_render_after_token_acquisition(html_renderer, mock_state):
     rendered_html = html_renderer.render()
     assert "Make Example Call" in rendered_html
     assert "get-test-data" in rendered_html
+
+
+def test_render_stream_matches_render(html_renderer, mock_state):
+    athletes = [{"id": 1, "name": "Athlete One"}, {"id": 2, "name": "Athlete Two"}]
+    mock_state.is_authorization_complete = MagicMock(return_value=True)
+    mock_state.is_token_complete = MagicMock(return_value=True)
+    mock_state.token_code_response.is_token_expired = MagicMock(return_value=False)
+    mock_state.is_list_athletes_complete = MagicMock(return_value=True)
+    mock_state.list_athletes_request_status = "Success"
+    mock_state.list_athletes_response.data = json.dumps(athletes, indent=4)
+
+    assert "".join(html_renderer.render_stream(iter(athletes))) == html_renderer.render()
+
+def test_render_stream_empty_roster(html_renderer):
+    assert "<td>[]</td>" in "".join(html_renderer.render_stream(iter([])))
+
+def test_render_stream_is_lazy(html_renderer):
+    def athletes():
+        yield {"id": 1}
+        raise AssertionError("consumed past the first athlete")
+
+    page = html_renderer.render_stream(athletes())
+    assert "List Athletes Request" in next(page)
+    assert '"id": 1' in next(page)
+
+def test_render_links_from_config(mock_config):
+    links = RenderLinks.from_config(mock_config)
+    assert links.authorize == HtmlRenderer(config=mock_config).get_auth_link(
+        "https://oauth.testsite.com/OAuth/Authorize", "test-client-id",
+        "http://localhost:9090/callback", "test:scopes"
+    )
+    assert 'href="http://localhost:9090/get-token"' in links.get_token
+    assert 'href="http://localhost:9090/refresh-token"' in links.refresh_token
+    assert 'href="http://localhost:9090/get-test-data"' in links.list_athletes
+
+def test_render_links_for_named_client(mock_config):
+    links = RenderLinks.from_config(mock_config, "partner")
+    assert "client_id=partner-client-id" in links.authorize
+    assert "redirect_uri=http://localhost:9090/clients/partner/callback" in links.authorize
+    assert 'href="http://localhost:9090/clients/partner/get-token"' in links.get_token
+
+def test_render_uses_prebuilt_links(mock_config, mock_state):
+    links = RenderLinks("<a>auth</a>", "<a>token</a>", "<a>refresh</a>", "<a>list</a>")
+    renderer = HtmlRenderer(config=MagicMock(), state=mock_state, links=links)
+    assert "<a>auth</a>" in renderer.render()
+
+def test_render_is_deterministic(html_renderer):
+    assert html_renderer.render() == html_renderer.render()
+
+def test_format_expiration():
+    assert format_expiration(0) == "1970-01-01 00:00:00"
@@ -0,0 +1,291 @@
+import http.server
+import threading
+import time
+import pytest
+import requests
+from unittest.mock import patch, MagicMock
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from services import http_client as http_client_module
+from services.circuit_breaker import CircuitBreaker, CircuitState
+from services.deadline import Deadline
+from services.config_loader import HttpConfig
+from services.http_client import HttpClient, get_default_client, set_default_client
+from services.public_api import GetTokenRequest, ListAthleteRequest, RefreshTokenRequest
+from services.rate_limiter import RateLimiter
+
+TOKEN_URL = "https://oauth.example.com/token"
+LIST_ATHLETES_URL = "https://api.example.com/athletes"
+
+
+class UnavailableHandler(http.server.BaseHTTPRequestHandler):
+    """Answers every call with a 503 after server.latency_seconds"""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self.server.calls += 1
+        time.sleep(self.server.latency_seconds)
+        self.send_response(503)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def http_config():
+    return HttpConfig(
+        pool_connections=2, pool_maxsize=8, pool_block=True, max_retries=4, backoff_factor=0.1
+    )
+
+
+@pytest.fixture
+def token_response():
+    return MagicMock(
+        ok=True,
+        status_code=200,
+        json=lambda: {"access_token": "a", "refresh_token": "r", "expires_in": 60},
+    )
+
+
+@pytest.fixture
+def unavailable_server():
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), UnavailableHandler)
+    server.daemon_threads = True
+    server.calls = 0
+    server.latency_seconds = 0.05
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def reset_default_client():
+    previous = http_client_module._default_client
+    yield
+    http_client_module._default_client = previous
+
+
+def test_adapter_uses_pool_settings(http_config):
+    client = HttpClient(http_config)
+    adapter = client.session.get_adapter("https://api.example.com")
+
+    assert adapter._pool_connections == 2
+    assert adapter._pool_maxsize == 8
+    assert adapter._pool_block is True
+    assert client.session.get_adapter("http://localhost") is adapter
+
+
+def test_retry_settings(http_config):
+    retry = HttpClient(http_config).session.get_adapter(TOKEN_URL).max_retries
+
+    assert retry.total == 4
+    assert retry.backoff_factor == 0.1
+    assert 503 in retry.status_forcelist
+    assert "GET" in retry.allowed_methods
+    assert "POST" not in retry.allowed_methods
+
+
+def test_cookies_are_not_persisted():
+    client = HttpClient()
+    assert client.session.cookies.get_policy().allowed_domains() == ()
+
+
+def test_default_client_is_shared(reset_default_client):
+    http_client_module._default_client = None
+    assert get_default_client() is get_default_client()
+
+
+def test_set_default_client_closes_previous(reset_default_client):
+    previous = MagicMock()
+    http_client_module._default_client = previous
+    client = HttpClient()
+
+    set_default_client(client)
+
+    assert get_default_client() is client
+    previous.close.assert_called_once()
+
+
+def test_token_requests_use_given_client(token_response):
+    client = MagicMock()
+    client.post.return_value = token_response
+
+    GetTokenRequest("code").execute(TOKEN_URL, "id", "secret", http_client=client)
+    RefreshTokenRequest("refresh").execute(TOKEN_URL, "id", "secret", http_client=client)
+
+    assert client.post.call_count == 2
+    assert client.post.call_args.args[0] == TOKEN_URL
+
+
+def test_list_athlete_request_uses_given_client():
+    client = MagicMock()
+    client.get.return_value = MagicMock(ok=True, status_code=200, json=lambda: [])
+
+    ListAthleteRequest().execute(LIST_ATHLETES_URL, "token", http_client=client)
+
+    client.get.assert_called_once()
+    assert client.get.call_args.kwargs["headers"] == {"Authorization": "Bearer token"}
+
+
+@patch("requests.Session.request")
+def test_requests_reuse_one_session(mock_request, token_response):
+    mock_request.return_value = token_response
+    client = HttpClient()
+
+    for _ in range(3):
+        GetTokenRequest("code").execute(TOKEN_URL, "id", "secret", http_client=client)
+
+    assert mock_request.call_count == 3
+    assert mock_request.call_args.args == ("POST", TOKEN_URL)
+
+
+@patch("requests.Session.request")
+def test_configured_timeouts_apply(mock_request, token_response):
+    mock_request.return_value = token_response
+    client = HttpClient(HttpConfig(connect_timeout_seconds=2, read_timeout_seconds=7))
+
+    client.post(TOKEN_URL)
+
+    assert mock_request.call_args.kwargs["timeout"] == (2, 7)
+
+
+@patch("requests.Session.request")
+def test_deadline_caps_timeouts(mock_request, token_response):
+    mock_request.return_value = token_response
+    client = HttpClient(HttpConfig(connect_timeout_seconds=2, read_timeout_seconds=7))
+    deadline = Deadline(5, clock=lambda: 0)
+
+    client.post(TOKEN_URL, deadline=deadline)
+
+    timeout = mock_request.call_args.kwargs["timeout"]
+    assert (timeout.connect_timeout, timeout.read_timeout) == (2, 5)
+
+
+@patch("requests.Session.request")
+def test_expired_deadline_fails_without_a_call(mock_request):
+    response = HttpClient().post(TOKEN_URL, deadline=Deadline(0))
+
+    mock_request.assert_not_called()
+    assert response.status_code == 504
+    assert response.json()["error"] == "deadline_exceeded"
+
+
+@patch("requests.Session.request")
+def test_open_circuit_fails_fast(mock_request):
+    mock_request.return_value = MagicMock(ok=False, status_code=502, headers={})
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout_seconds=30)
+    client = HttpClient(circuit_breaker=breaker)
+
+    client.post(TOKEN_URL)
+    client.post(TOKEN_URL)
+    response = client.post(TOKEN_URL)
+
+    assert mock_request.call_count == 2
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "30"
+    assert response.json()["error"] == "circuit_open"
+    assert client.get(LIST_ATHLETES_URL).status_code == 502
+
+
+@patch("requests.Session.request", side_effect=requests.ConnectTimeout)
+def test_errors_without_response_count_against_the_circuit(_):
+    breaker = CircuitBreaker(failure_threshold=1)
+    client = HttpClient(circuit_breaker=breaker)
+
+    with pytest.raises(requests.ConnectTimeout):
+        client.post(TOKEN_URL)
+
+    assert breaker.get_state(TOKEN_URL) is CircuitState.OPEN
+
+
+@patch("requests.Session.request")
+def test_client_errors_do_not_open_the_circuit(mock_request):
+    mock_request.return_value = MagicMock(ok=False, status_code=401, headers={})
+    breaker = CircuitBreaker(failure_threshold=1)
+
+    HttpClient(circuit_breaker=breaker).post(TOKEN_URL)
+
+    assert breaker.get_state(TOKEN_URL) is CircuitState.CLOSED
+
+
+@patch("requests.Session.request")
+def test_rate_limit_wait_is_capped_by_the_deadline(mock_request, token_response):
+    mock_request.return_value = token_response
+    limiter = RateLimiter(requests_per_second=0.5, burst=1, max_wait_seconds=30)
+    client = HttpClient(rate_limiter=limiter)
+    client.post(TOKEN_URL)
+
+    started = time.monotonic()
+    response = client.post(TOKEN_URL, deadline=Deadline(0.2))
+
+    assert time.monotonic() - started < 1
+    assert mock_request.call_count == 1
+    assert response.status_code == 504
+    assert response.json()["error"] == "deadline_exceeded"
+
+
+@patch("requests.Session.request")
+def test_rate_limit_wait_beyond_max_wait_is_a_local_429(mock_request, token_response):
+    mock_request.return_value = token_response
+    limiter = RateLimiter(requests_per_second=0.01, burst=1, max_wait_seconds=1)
+    client = HttpClient(rate_limiter=limiter)
+    client.post(TOKEN_URL)
+
+    assert client.post(TOKEN_URL, deadline=Deadline(0.2)).status_code == 429
+    assert mock_request.call_count == 1
+
+
+@patch("requests.Session.request")
+def test_timeouts_are_computed_after_the_rate_limit_wait(mock_request):
+    # No rate limit headers, so only the configured rate decides the wait
+    mock_request.return_value = MagicMock(ok=True, status_code=200, headers={})
+    limiter = RateLimiter(requests_per_second=4, burst=1, max_wait_seconds=30)
+    client = HttpClient(HttpConfig(read_timeout_seconds=7), rate_limiter=limiter)
+    client.post(TOKEN_URL)
+
+    client.post(TOKEN_URL, deadline=Deadline(1))
+
+    assert mock_request.call_args.kwargs["timeout"].read_timeout <= 0.8
+
+
+def test_retries_stop_at_the_deadline(unavailable_server):
+    client = HttpClient(HttpConfig(max_retries=10, backoff_factor=0.2, read_timeout_seconds=5))
+    url = f"http://127.0.0.1:{unavailable_server.server_address[1]}/athletes"
+
+    started = time.monotonic()
+    response = client.get(url, deadline=Deadline(1))
+
+    assert time.monotonic() - started < 1.2
+    assert response.status_code == 503
+    assert 1 < unavailable_server.calls < 11
+    client.close()
+
+
+def test_retried_attempts_get_the_time_left(unavailable_server):
+    unavailable_server.latency_seconds = 2
+    client = HttpClient(HttpConfig(max_retries=3, backoff_factor=0, read_timeout_seconds=5))
+    url = f"http://127.0.0.1:{unavailable_server.server_address[1]}/athletes"
+
+    started = time.monotonic()
+    with pytest.raises(requests.ReadTimeout):
+        client.get(url, deadline=Deadline(0.5))
+
+    assert time.monotonic() - started < 1
+    assert unavailable_server.calls == 1
+    client.close()
+
+
+def test_retries_without_a_deadline_are_not_capped(unavailable_server):
+    unavailable_server.latency_seconds = 0
+    client = HttpClient(HttpConfig(max_retries=2, backoff_factor=0))
+    url = f"http://127.0.0.1:{unavailable_server.server_address[1]}/athletes"
+
+    assert client.get(url).status_code == 503
+    assert unavailable_server.calls == 3
+    client.close()
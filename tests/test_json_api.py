@@ -0,0 +1,78 @@
+import json
+import pytest
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from services.json_api import (
+    UPSTREAM_ERROR,
+    athletes_body,
+    error_body,
+    failure_body,
+    failure_status,
+    token_body,
+)
+from services.models import ApiError, decode_athletes
+from services.public_api import GetTokenResponse, ListAthleteResponse
+
+ATHLETES = [
+    {"Id": 1, "FirstName": "Ann", "Zones": {"hr": [120, 150]}},
+    {"Id": 2, "FirstName": "Bob", "Zones": None},
+]
+
+
+def test_token_body():
+    response = GetTokenResponse(
+        refresh_token="refresh", access_token="access", access_token_expire=1600.5
+    )
+    assert json.loads(token_body(response, now=1000)) == {
+        "access_token": "access",
+        "refresh_token": "refresh",
+        "expires_at": 1600,
+        "expires_in": 600,
+    }
+
+
+def test_expired_token_body_has_no_time_left():
+    response = GetTokenResponse(access_token_expire=900)
+    assert json.loads(token_body(response, now=1000))["expires_in"] == 0
+
+
+def test_athletes_body_is_compact():
+    body = athletes_body(ListAthleteResponse(athletes=decode_athletes(ATHLETES), status_code=200))
+    assert json.loads(body) == {"athletes": ATHLETES}
+    assert " " not in body
+    assert "\n" not in body
+
+
+def test_error_body_leaves_out_missing_fields():
+    assert json.loads(error_body("token_required")) == {"error": "token_required"}
+
+
+@pytest.mark.parametrize(
+    "failure, status",
+    [
+        (ApiError.from_body(400, '{"error": "invalid_grant"}'), 400),
+        (ApiError.from_body(401, ""), 401),
+        (ApiError.from_body(429, ""), 429),
+        (ApiError.from_body(500, "Internal Server Error"), 502),
+        (ApiError.from_body(503, '{"error": "circuit_open"}'), 503),
+        (ApiError.from_exception(TimeoutError("timed out"), timed_out=True), 504),
+        (ApiError.from_exception(ConnectionError("refused"), timed_out=False), 502),
+        (None, 502),
+    ],
+)
+def test_failure_status(failure, status):
+    assert failure_status(failure) == status
+
+
+def test_failure_body():
+    failure = ApiError.from_body(
+        400, '{"error": "invalid_grant", "error_description": "Code expired"}'
+    )
+    assert json.loads(failure_body(failure)) == {
+        "error": "invalid_grant",
+        "error_description": "Code expired",
+        "status_code": 400,
+    }
+    assert json.loads(failure_body(ApiError.from_body(500, "")))["error"] == UPSTREAM_ERROR
@@ -0,0 +1,48 @@
+import json
+import pytest
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from services.json_stream import iter_json_array
+
+ATHLETES = [
+    {"id": 1, "name": "Athlete One", "tags": ["run", "bike"], "ftp": 251.5},
+    {"id": 2, "name": "Athlète Deux", "coach": None, "active": True},
+    [],
+    {},
+    -12e3,
+    "text",
+]
+
+
+def chunked(payload, size):
+    return [payload[i:i + size] for i in range(0, len(payload), size)]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 5, 64, 1 << 20])
+def test_items_match_full_parse(chunk_size):
+    payload = json.dumps(ATHLETES, indent=4).encode()
+    assert list(iter_json_array(chunked(payload, chunk_size))) == ATHLETES
+
+
+def test_number_split_across_chunks():
+    assert list(iter_json_array([b"[12", b"34, 5", b"6]"])) == [1234, 56]
+
+
+def test_empty_array():
+    assert list(iter_json_array([b" [", b" ] "])) == []
+
+
+def test_items_are_yielded_before_the_payload_ends():
+    def chunks():
+        yield b'[{"id": 1}, '
+        raise AssertionError("read past the first item")
+
+    assert next(iter_json_array(chunks())) == {"id": 1}
+
+
+@pytest.mark.parametrize("payload", [b"", b"{}", b"[1, 2", b"[1 2]", b"[1,]"])
+def test_invalid_payload(payload):
+    with pytest.raises(ValueError):
+        list(iter_json_array([payload]))
@@ -0,0 +1,304 @@
+import copy
+from dataclasses import replace
+import gzip
+import time
+import sys
+import os
+from unittest.mock import patch
+import pytest
+import requests
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from services.application_state import Status
+from services.client_registry import make_state_key
+from services.compression import Compressor
+from services.metrics import RENDER_DURATION, ROUTE_REQUEST_DURATION
+from services.models import ApiError
+from services.public_api import GetTokenResponse
+from services.shared_session_store import SharedSessionStore
+from services.token_refresher import RefreshFailed, TokenRefreshScheduler
+from services.token_store import TokenStore
+
+ROSTER_A = [{"Id": 1, "FirstName": "Ann"}, {"Id": 2, "FirstName": "Bob"}]
+ROSTER_B = [{"Id": 1, "FirstName": "Ann"}, {"Id": 3, "FirstName": "Cat"}]
+
+
+def authorize(app_client, prefix=""):
+    app_client.get(f"{prefix}/callback?code=test-code")
+    app_client.get(f"{prefix}/get-token")
+
+
+def get_state(main_module, app_client, client="default"):
+    """The state the app keeps for the test client's session"""
+    with app_client.session_transaction() as flask_session:
+        session_id = flask_session["session_id"]
+    with main_module.session_store.session(make_state_key(client, session_id)) as state:
+        return state
+
+
+def test_roster_streamed_meanwhile_is_not_shown_stale(app_client, set_roster):
+    authorize(app_client)
+    set_roster(ROSTER_A)
+    assert "Bob" in app_client.get("/get-test-data").get_data(as_text=True)
+
+    set_roster(ROSTER_B)
+    streamed = app_client.get("/stream-test-data").get_data(as_text=True)
+    assert "Cat" in streamed
+
+    page = app_client.get("/get-test-data").get_data(as_text=True)
+    assert "Cat" in page
+    assert "Bob" not in page
+    assert "Cat" in app_client.get("/").get_data(as_text=True)
+
+
+def test_unchanged_roster_keeps_the_rendered_response(app_client, main_module, set_roster):
+    authorize(app_client)
+    set_roster(ROSTER_A)
+    app_client.get("/get-test-data")
+    rendered = get_state(main_module, app_client).list_athletes_response
+
+    app_client.get("/get-test-data")
+    assert get_state(main_module, app_client).list_athletes_response is rendered
+
+
+def test_failed_refresh_is_not_replayed_to_a_retry(app_client, main_module, set_error_rate):
+    authorize(app_client)
+    refresh_token = get_state(main_module, app_client).token_code_response.refresh_token
+
+    set_error_rate(1.0)
+    response, failure = main_module.refresh_access_token(refresh_token)
+    assert response is None
+    assert failure.status_code == 500
+
+    # Within the coalescing window of the failed refresh
+    set_error_rate(0.0)
+    response, failure = main_module.refresh_access_token(refresh_token)
+    assert response is not None
+    assert failure is None
+    # A late caller still holding the old refresh token shares the new token
+    assert main_module.refresh_access_token(refresh_token) == (response, None)
+
+
+def test_restored_session_is_scheduled_for_refresh(app_client, main_module, monkeypatch, tmp_path):
+    token_store = TokenStore(str(tmp_path / "tokens.db"))
+    token = GetTokenResponse("refresh", "access", time.time() + 3600)
+    state_key = make_state_key("default", "restored-session")
+    token_store.put(state_key, token)
+    scheduled = []
+    monkeypatch.setattr(main_module, "token_store", token_store)
+    monkeypatch.setattr(
+        main_module.token_refresher, "schedule", lambda *args: scheduled.append(args)
+    )
+    with app_client.session_transaction() as flask_session:
+        flask_session["session_id"] = "restored-session"
+
+    page = app_client.get("/").get_data(as_text=True)
+
+    assert '"Token": "access"' in page
+    assert scheduled == [(state_key, token)]
+    token_store.close()
+
+
+def test_sessions_are_kept_per_cookie(main_module):
+    first, second = main_module.app.test_client(), main_module.app.test_client()
+    first.get("/callback?code=first-code")
+    second.get("/callback?code=second-code")
+    first.get("/get-token")
+
+    first_state = get_state(main_module, first)
+    second_state = get_state(main_module, second)
+    assert first_state is not second_state
+    assert first_state.authorization_code_response.authorization_code == "first-code"
+    assert second_state.authorization_code_response.authorization_code == "second-code"
+    assert first_state.is_token_complete()
+    assert not second_state.is_token_complete()
+    assert "second-code" not in first.get("/").get_data(as_text=True)
+
+
+
+def test_unchanged_page_is_answered_with_304(app_client):
+    page = app_client.get("/")
+    etag = page.headers["ETag"]
+    assert page.headers["Cache-Control"] == "no-cache"
+
+    revalidated = app_client.get("/", headers={"If-None-Match": etag})
+    assert revalidated.status_code == 304
+    assert revalidated.get_data() == b""
+    assert revalidated.headers["ETag"] == etag
+
+    app_client.get("/callback?code=test-code")
+    changed = app_client.get("/", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
+    assert "test-code" in changed.get_data(as_text=True)
+
+
+def test_api_answers_missing_tokens_with_401(app_client):
+    token = app_client.get("/api/token")
+    assert token.status_code == 401
+    assert token.get_json() == {"error": "token_required", "error_description": "Get a token first"}
+
+    created = app_client.post("/api/token")
+    assert created.status_code == 401
+    assert created.get_json()["error"] == "authorization_required"
+
+    assert app_client.get("/api/athletes").get_json()["error"] == "token_required"
+
+
+def test_api_answers_an_expired_token_with_401(app_client, main_module):
+    authorize(app_client)
+    with app_client.session_transaction() as flask_session:
+        session_id = flask_session["session_id"]
+    with main_module.session_store.session(make_state_key("default", session_id)) as state:
+        state.token_code_response.access_token_expire = time.time() - 1
+
+    athletes = app_client.get("/api/athletes")
+    assert athletes.status_code == 401
+    assert athletes.get_json()["error"] == "token_expired"
+
+
+def test_api_answers_upstream_failures_with_502_and_504(app_client, set_error_rate):
+    authorize(app_client)
+    set_error_rate(1.0)
+    failed = app_client.get("/api/athletes")
+    assert failed.status_code == 502
+    assert failed.get_json() == {"error": "upstream_error", "status_code": 500}
+
+    set_error_rate(0.0)
+    with patch("requests.Session.request", side_effect=requests.ReadTimeout("read timed out")):
+        timed_out = app_client.get("/api/athletes")
+    assert timed_out.status_code == 504
+
+
+def test_api_athletes_are_revalidated_with_their_etag(app_client, set_roster):
+    authorize(app_client)
+    set_roster(ROSTER_A)
+    athletes = app_client.get("/api/athletes")
+    assert athletes.status_code == 200
+    assert athletes.mimetype == "application/json"
+    assert athletes.get_json() == {"athletes": ROSTER_A}
+
+    etag = athletes.headers["ETag"]
+    assert app_client.get("/api/athletes", headers={"If-None-Match": etag}).status_code == 304
+    set_roster(ROSTER_B)
+    assert app_client.get("/api/athletes", headers={"If-None-Match": etag}).status_code == 200
+
+
+def test_page_is_compressed_with_a_weak_etag(app_client, main_module, monkeypatch):
+    monkeypatch.setattr(main_module, "compressor", Compressor(min_size_bytes=1, compress_html=True))
+    plain = app_client.get("/")
+    assert "Content-Encoding" not in plain.headers
+    assert "Accept-Encoding" in plain.headers["Vary"]
+
+    compressed = app_client.get("/", headers={"Accept-Encoding": "gzip"})
+    assert compressed.headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in compressed.headers["Vary"]
+    assert gzip.decompress(compressed.get_data()) == plain.get_data()
+    etag = compressed.headers["ETag"]
+    assert etag == f"W/{plain.headers['ETag']}"
+
+    revalidated = app_client.get("/", headers={"Accept-Encoding": "gzip", "If-None-Match": etag})
+    assert revalidated.status_code == 304
+    assert "Content-Encoding" not in revalidated.headers
+    assert "Accept-Encoding" in revalidated.headers["Vary"]
+
+
+def test_pages_are_not_compressed_by_default(app_client, main_module, monkeypatch, set_roster):
+    monkeypatch.setattr(main_module, "compressor", Compressor(min_size_bytes=1))
+    authorize(app_client)
+    callback = app_client.get("/callback?code=reflected", headers={"Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in callback.headers
+    assert "Accept-Encoding" not in callback.headers.get("Vary", "")
+
+    set_roster(ROSTER_A)
+    athletes = app_client.get("/api/athletes", headers={"Accept-Encoding": "gzip"})
+    assert athletes.headers["Content-Encoding"] == "gzip"
+
+
+def test_small_bodies_are_sent_as_is(app_client, main_module, monkeypatch):
+    monkeypatch.setattr(
+        main_module, "compressor", Compressor(min_size_bytes=1 << 20, compress_html=True)
+    )
+    page = app_client.get("/", headers={"Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in page.headers
+    assert "Accept-Encoding" in page.headers["Vary"]
+    assert not page.headers["ETag"].startswith("W/")
+
+
+def test_page_render_is_timed_once_per_request(app_client):
+    status = Status.NOT_RUN.value
+    rendered = RENDER_DURATION.get_count(status)
+    routed = ROUTE_REQUEST_DURATION.get_count("/", "GET", "200")
+    app_client.get("/")
+    assert RENDER_DURATION.get_count(status) == rendered + 1
+    assert ROUTE_REQUEST_DURATION.get_count("/", "GET", "200") == routed + 1
+
+
+def test_session_refreshed_by_another_worker_is_not_refreshed_again(main_module, monkeypatch, tmp_path):
+    # Two stores on one file stand in for the session stores of two serve.py workers
+    path = str(tmp_path / "sessions.db")
+    worker_a, worker_b = SharedSessionStore(path), SharedSessionStore(path)
+    monkeypatch.setattr(main_module, "session_store", worker_a)
+    refreshed = []
+
+    def refresh_access_token(refresh_token, client, deadline=None):
+        refreshed.append(refresh_token)
+        return GetTokenResponse("refresh-a", "access-a", time.time() + 3600), None
+
+    monkeypatch.setattr(main_module, "refresh_access_token", refresh_access_token)
+    state_key = make_state_key("default", "shared-session")
+    old_token = GetTokenResponse("refresh-old", "access-old", time.time() + 10)
+    with worker_a.session(state_key) as state:
+        state.token_code_request_status = Status.SUCCESS.value
+        state.token_code_response = old_token
+    scheduler = TokenRefreshScheduler(main_module.refresh_session_token, rng=lambda: 0)
+    scheduler.schedule(state_key, old_token)
+
+    # Worker B refreshed the session before worker A's entry for the old token fired
+    new_token = GetTokenResponse("refresh-b", "access-b", time.time() + 3600)
+    with worker_b.session(state_key) as state:
+        state.token_code_response = new_token
+
+    assert scheduler.run_pending() == 1
+    assert refreshed == []
+    assert worker_a.get(state_key).token_code_response == new_token
+    assert scheduler.next_deadline() == new_token.access_token_expire - scheduler.margin_seconds
+
+    with worker_b.session(state_key) as state:
+        state.token_code_response = old_token
+    assert main_module.refresh_session_token(state_key).access_token == "access-a"
+    assert refreshed == ["refresh-old"]
+
+
+@pytest.mark.parametrize(
+    "failure, retried",
+    [
+        (ApiError(503, "unavailable"), True),
+        (ApiError(400, "", "invalid_grant"), False),
+    ],
+)
+def test_only_a_rejected_refresh_token_stops_background_refreshes(
+    main_module, monkeypatch, failure, retried
+):
+    monkeypatch.setattr(main_module, "refresh_access_token", lambda *args: (None, failure))
+    state_key = make_state_key("default", f"refresh-failed-{failure.status_code}")
+    with main_module.session_store.session(state_key) as state:
+        state.token_code_request_status = Status.SUCCESS.value
+        state.token_code_response = GetTokenResponse("refresh", "access", time.time() + 10)
+
+    if retried:
+        with pytest.raises(RefreshFailed):
+            main_module.refresh_session_token(state_key)
+    else:
+        assert main_module.refresh_session_token(state_key) is None
+
+
+def test_deadline_follows_a_reloaded_config(app_client, main_module, monkeypatch):
+    snapshot = copy.copy(main_module.config_manager.current)
+    snapshot.http = replace(snapshot.http, deadline_seconds=7)
+    monkeypatch.setattr(main_module.config_manager, "_current", snapshot)
+    budgets = []
+    monkeypatch.setattr(main_module, "Deadline", lambda seconds: budgets.append(seconds))
+
+    app_client.get("/")
+    assert budgets == [7]
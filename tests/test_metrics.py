@@ -0,0 +1,137 @@
+import pytest
+from unittest.mock import patch, MagicMock
+import sys
+import os
+
+import requests
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from services.application_state import ApplicationState
+from services.config_loader import Config
+from services.html_renderer import HtmlRenderer, TimedHtmlRenderer
+from services.http_client import HttpClient
+from services.metrics import (
+    MetricsRegistry,
+    RENDER_DURATION,
+    UPSTREAM_REQUEST_DURATION,
+)
+from services.public_api import AthleteDataRequest, GetTokenRequest
+
+TOKEN_URL = "https://oauth.example.com/token"
+
+
+@pytest.fixture
+def registry():
+    return MetricsRegistry()
+
+
+@pytest.fixture
+def config():
+    return Config("tests/config/test_config.ini")
+
+
+def test_counter_and_gauge(registry):
+    counter = registry.counter("calls_total", "Calls", ("kind",))
+    counter.inc("a")
+    counter.inc("a", amount=2)
+    gauge = registry.gauge("size", "Size")
+    gauge.set(7)
+    assert counter.get("a") == 3
+    assert counter.get("b") == 0
+    assert 'calls_total{kind="a"} 3' in registry.render()
+    assert "size 7" in registry.render()
+
+
+def test_registering_a_name_twice_returns_the_existing_metric(registry):
+    first = registry.counter("calls_total", "Calls")
+    assert registry.counter("calls_total", "Calls") is first
+
+
+def test_histogram_buckets_are_cumulative(registry):
+    histogram = registry.histogram("latency_seconds", "Latency", ("route",), buckets=(0.1, 1))
+    for value in (0.05, 0.1, 0.5, 3):
+        histogram.observe(value, "/")
+    lines = registry.render().splitlines()
+    assert "# TYPE latency_seconds histogram" in lines
+    assert 'latency_seconds_bucket{route="/",le="0.1"} 2' in lines
+    assert 'latency_seconds_bucket{route="/",le="1"} 3' in lines
+    assert 'latency_seconds_bucket{route="/",le="+Inf"} 4' in lines
+    assert 'latency_seconds_sum{route="/"} 3.65' in lines
+    assert 'latency_seconds_count{route="/"} 4' in lines
+
+
+def test_function_metric_is_read_at_render_time(registry):
+    sizes = [1]
+    registry.function("queue_size", "Queue size", lambda: sizes[-1])
+    sizes.append(5)
+    assert "queue_size 5" in registry.render()
+
+
+def test_label_values_are_escaped(registry):
+    registry.counter("calls_total", "Calls", ("path",)).inc('a"b\\c')
+    assert 'calls_total{path="a\\"b\\\\c"} 1' in registry.render()
+
+
+def test_constant_labels_are_added_to_every_sample(registry):
+    registry.set_constant_labels(worker="123")
+    registry.counter("calls_total", "Calls", ("kind",)).inc("a")
+    registry.gauge("size", "Size").set(7)
+    registry.histogram("latency_seconds", "Latency", buckets=(1,)).observe(0.5)
+    registry.function("queue_size", "Queue size", lambda: 2)
+    lines = registry.render().splitlines()
+    assert 'calls_total{worker="123",kind="a"} 1' in lines
+    assert 'size{worker="123"} 7' in lines
+    assert 'latency_seconds_bucket{worker="123",le="1"} 1' in lines
+    assert 'latency_seconds_count{worker="123"} 1' in lines
+    assert 'queue_size{worker="123"} 2' in lines
+
+
+@patch("requests.Session.request")
+def test_upstream_calls_are_timed_per_request_and_status(mock_request):
+    mock_request.return_value = MagicMock(
+        ok=True,
+        status_code=200,
+        json=lambda: {"access_token": "a", "refresh_token": "r", "expires_in": 60},
+    )
+    labels = ("GetTokenRequest", TOKEN_URL, "200")
+    before = UPSTREAM_REQUEST_DURATION.get_count(*labels)
+    GetTokenRequest("code", "uri").execute(
+        TOKEN_URL + "?ignored=1", "id", "secret", http_client=HttpClient()
+    )
+    assert UPSTREAM_REQUEST_DURATION.get_count(*labels) == before + 1
+    # The metric labels are not forwarded to requests
+    assert "operation" not in mock_request.call_args.kwargs
+
+
+@patch("requests.Session.request")
+def test_templated_endpoints_keep_one_series(mock_request):
+    mock_request.return_value = MagicMock(ok=True, status_code=200, json=lambda: {})
+    template = "https://api.example.com/athlete/{athlete_id}"
+    labels = ("AthleteDataRequest", template, "200")
+    before = UPSTREAM_REQUEST_DURATION.get_count(*labels)
+    request = AthleteDataRequest(template)
+    for athlete_id in (1, 2, 3):
+        request.execute(athlete_id, "token", http_client=HttpClient())
+    assert UPSTREAM_REQUEST_DURATION.get_count(*labels) == before + 3
+
+
+@patch("requests.Session.request", side_effect=requests.ConnectionError)
+def test_failed_upstream_calls_are_timed(_):
+    labels = ("http", TOKEN_URL, "error")
+    before = UPSTREAM_REQUEST_DURATION.get_count(*labels)
+    with pytest.raises(requests.ConnectionError):
+        HttpClient().post(TOKEN_URL)
+    assert UPSTREAM_REQUEST_DURATION.get_count(*labels) == before + 1
+
+
+def test_render_timing_is_kept_for_the_caller(config):
+    state = ApplicationState()
+    before = RENDER_DURATION.get_count(state.list_athletes_request_status)
+    html_renderer = TimedHtmlRenderer(config=config, state=state)
+    assert html_renderer.render() == HtmlRenderer(config=config, state=state).render()
+
+    seconds, status = html_renderer.render_timing
+    assert seconds >= 0
+    assert status == state.list_athletes_request_status
+    # Recorded by the servers once per request, not by render
+    assert RENDER_DURATION.get_count(state.list_athletes_request_status) == before
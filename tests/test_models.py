@@ -0,0 +1,105 @@
+import json
+import pytest
+from unittest.mock import patch, MagicMock
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from services.application_state import ApplicationState
+from services.models import ApiError, Athlete, TokenPayload, decode_athletes, dumps_athletes
+from services.public_api import GetTokenRequest, ListAthleteRequest, ListAthleteResponse
+
+ATHLETES = [
+    {"Id": 1, "FirstName": "Ann", "LastName": "One", "Zones": {"hr": [120, 150]}},
+    {"Id": 2, "FirstName": "Bob", "LastName": "Two", "Zones": None},
+]
+
+
+def test_athletes_read_like_the_json_objects():
+    athletes = decode_athletes(ATHLETES)
+    assert athletes[0]["FirstName"] == "Ann"
+    assert athletes[1].get("Missing", "default") == "default"
+    assert list(athletes[0]) == ["Id", "FirstName", "LastName", "Zones"]
+    assert athletes[0] == ATHLETES[0]
+
+
+def test_athletes_share_one_key_index():
+    first, second = decode_athletes(ATHLETES)
+    assert first._index is second._index
+
+
+def test_athletes_are_read_only():
+    athlete = Athlete.from_json(ATHLETES[0])
+    with pytest.raises(TypeError):
+        athlete["Id"] = 3
+    with pytest.raises(AttributeError):
+        athlete.extra = 1
+
+
+def test_serialization_matches_the_original_body():
+    assert dumps_athletes(decode_athletes(ATHLETES)) == json.dumps(ATHLETES, indent=4)
+
+
+def test_payload_that_is_not_a_list_is_kept():
+    assert decode_athletes({"Message": "no athletes"}) == {"Message": "no athletes"}
+
+
+def test_list_athlete_response_serializes_lazily():
+    response = ListAthleteResponse(athletes=decode_athletes(ATHLETES), status_code=200)
+    assert response._data is None
+    assert response.data == json.dumps(ATHLETES, indent=4)
+    assert response.data is response.data
+
+
+def test_state_with_decoded_athletes_round_trips():
+    state = ApplicationState()
+    state.list_athletes_response = ListAthleteResponse(
+        athletes=decode_athletes(ATHLETES), status_code=200, message="OK"
+    )
+    restored = ApplicationState.from_dict(json.loads(json.dumps(state.to_dict())))
+    assert restored.list_athletes_response == state.list_athletes_response
+
+
+def test_token_payload():
+    payload = TokenPayload.from_json(
+        {"access_token": "a", "refresh_token": "r", "expires_in": "60", "token_type": "bearer"}
+    )
+    assert (payload.access_token, payload.refresh_token, payload.expires_in) == ("a", "r", 60)
+    assert payload.token_type == "bearer"
+    assert payload.scope is None
+
+
+@patch("requests.Session.request")
+def test_token_body_is_parsed_once(mock_request):
+    body = MagicMock(
+        return_value={"access_token": "a", "refresh_token": "r", "expires_in": 60}
+    )
+    mock_request.return_value = MagicMock(ok=True, status_code=200, json=body)
+    response = GetTokenRequest("code").execute("https://oauth.example.com/token", "id", "secret")
+    assert response.access_token == "a"
+    body.assert_called_once()
+
+
+def test_error_with_oauth_body():
+    error = ApiError.from_body(
+        400, '{"error": "invalid_grant", "error_description": "code expired"}'
+    )
+    assert error.error == "invalid_grant"
+    assert error.description == "code expired"
+    assert error.message.startswith("{")
+
+
+def test_error_with_plain_body():
+    error = ApiError.from_body(502, "Bad Gateway")
+    assert (error.status_code, error.message, error.error) == (502, "Bad Gateway", None)
+
+
+@patch("requests.Session.request")
+def test_list_athletes_failure_is_decoded(mock_request):
+    mock_request.return_value = MagicMock(
+        ok=False, status_code=401, text='{"Message": "Authorization has been denied"}'
+    )
+    request = ListAthleteRequest()
+    assert request.execute("https://api.example.com/athletes", "token") is None
+    assert request.failure.status_code == 401
+    assert request.failure.description == "Authorization has been denied"
@@ -0,0 +1,101 @@
+import os
+import pytest
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from services.profiler import RouteProfiler, list_profiles, top_functions
+
+
+def render_page(size):
+    return "".join(str(i) for i in range(size))
+
+
+@pytest.fixture
+def profiler(tmp_path):
+    return RouteProfiler(
+        directory=str(tmp_path), sample_rate=0.5, header="X-Profile", max_profiles=3,
+        random_value=lambda: 0.9, header_secret="secret",
+    )
+
+
+def test_header_forces_a_profile(profiler):
+    assert profiler.should_profile({"X-Profile": "secret"})
+    assert not profiler.should_profile({"X-Profile": ""})
+    assert not profiler.should_profile({})
+
+
+def test_header_with_a_wrong_secret_is_not_profiled(profiler, tmp_path):
+    view = profiler.wrap(render_page, lambda: {"X-Profile": "guess"})
+
+    assert view(100) == render_page(100)
+    assert not profiler.should_profile({"X-Profile": "secre"})
+    assert list_profiles(str(tmp_path)) == []
+
+
+def test_header_is_ignored_without_a_secret(tmp_path):
+    profiler = RouteProfiler(directory=str(tmp_path), random_value=lambda: 0.9)
+    assert not profiler.should_profile({"X-Profile": "secret"})
+    assert not profiler.should_profile({"X-Profile": ""})
+
+
+def test_sampled_calls_are_profiled(profiler):
+    profiler.random_value = lambda: 0.1
+    assert profiler.should_profile({})
+
+
+def test_zero_sample_rate_only_profiles_on_header(tmp_path):
+    profiler = RouteProfiler(directory=str(tmp_path), random_value=lambda: 0.0)
+    assert not profiler.should_profile({})
+
+
+def test_wrapped_view_writes_a_profile(profiler, tmp_path):
+    view = profiler.wrap(render_page, lambda: {"X-Profile": "secret"})
+
+    assert view(100) == render_page(100)
+    assert view.__name__ == "render_page"
+    paths = list_profiles(str(tmp_path))
+    assert len(paths) == 1
+    assert paths[0].endswith("-render_page.prof")
+    assert profiler.written == 1
+
+
+def test_unsampled_view_writes_nothing(profiler, tmp_path):
+    view = profiler.wrap(render_page, lambda: {})
+
+    assert view(10) == render_page(10)
+    assert list_profiles(str(tmp_path)) == []
+
+
+def test_profile_is_written_when_the_view_raises(profiler, tmp_path):
+    def failing_view():
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError):
+        profiler.wrap(failing_view, lambda: {"X-Profile": "secret"})()
+    assert len(list_profiles(str(tmp_path))) == 1
+
+
+def test_only_newest_profiles_are_kept(profiler, tmp_path):
+    view = profiler.wrap(render_page, lambda: {"X-Profile": "secret"})
+    for _ in range(5):
+        view(10)
+
+    paths = list_profiles(str(tmp_path))
+    assert len(paths) == 3
+    assert profiler.written == 5
+    assert [path.rsplit("-", 2)[1] for path in paths] == ["2", "3", "4"]
+
+
+def test_top_functions_aggregates_every_profile(profiler, tmp_path):
+    view = profiler.wrap(render_page, lambda: {"X-Profile": "secret"})
+    view(10)
+    view(20)
+
+    report = top_functions(str(tmp_path), top=5)
+
+    assert report.startswith("2 profiles in")
+    assert "render_page" in report
+
+
+def test_top_functions_without_profiles(tmp_path):
+    assert top_functions(str(tmp_path)) is None
@@ -1,11 +1,17 @@
 import json
 import pytest
+import requests
 from unittest.mock import patch, MagicMock
 import sys
 import os
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
-from services.public_api import GetTokenRequest, ListAthleteRequest, RefreshTokenRequest
+from services.public_api import (
+    AthleteDataRequest,
+    GetTokenRequest,
+    ListAthleteRequest,
+    RefreshTokenRequest,
+)
 
 # Sample data for testing
 AUTHORIZATION_CODE = "test_code"
@@ -39,7 +45,7 @@ def athlete_list_response_mock():
     ]
 
 
-@patch("requests.post")
+@patch("requests.Session.request")
 def test_get_token_request(mock_post, token_response_mock):
     mock_post.return_value = MagicMock(
         status_code=200, json=lambda: token_response_mock
@@ -54,7 +60,7 @@ def test_get_token_request(mock_post, token_response_mock):
     mock_post.assert_called_once()
 
 
-@patch("requests.post")
+@patch("requests.Session.request")
 def test_refresh_token_request(mock_post, token_response_mock):
     mock_post.return_value = MagicMock(
         status_code=200, json=lambda: token_response_mock
@@ -69,7 +75,7 @@ def test_refresh_token_request(mock_post, token_response_mock):
     mock_post.assert_called_once()
 
 
-@patch("requests.get")
+@patch("requests.Session.request")
 def test_list_athlete_request(mock_get, athlete_list_response_mock):
     mock_get.return_value = MagicMock(
         status_code=200, json=lambda: athlete_list_response_mock
@@ -79,3 +85,71 @@ def test_list_athlete_request(mock_get, athlete_list_response_mock):
 
     assert response.data == json.dumps(athlete_list_response_mock, indent=4)
     mock_get.assert_called_once()
+
+
+@patch("requests.Session.request")
+def test_list_athlete_stream_request(mock_get, athlete_list_response_mock):
+    payload = json.dumps(athlete_list_response_mock).encode()
+    mock_get.return_value = MagicMock(
+        ok=True, iter_content=lambda chunk_size: [payload[:10], payload[10:]]
+    )
+
+    athletes = ListAthleteRequest().execute_stream(LIST_ATHLETES_URL, ACCESS_TOKEN)
+
+    assert list(athletes) == athlete_list_response_mock
+    assert mock_get.call_args.kwargs["stream"] is True
+    mock_get.return_value.__exit__.assert_called_once()
+
+
+@patch("requests.Session.request")
+def test_list_athlete_stream_request_failure(mock_get):
+    mock_get.return_value = MagicMock(ok=False, status_code=401)
+
+    assert ListAthleteRequest().execute_stream(LIST_ATHLETES_URL, ACCESS_TOKEN) is None
+    mock_get.return_value.close.assert_called_once()
+
+
+@patch("requests.Session.request")
+def test_failed_token_request_records_failure(mock_post):
+    mock_post.return_value = MagicMock(
+        ok=False, status_code=400, text='{"error": "invalid_grant"}'
+    )
+    request = GetTokenRequest(AUTHORIZATION_CODE, REDIRECT_URI)
+
+    assert request.execute(TOKEN_URL, CLIENT_ID, CLIENT_SECRET) is None
+    assert request.failure.error == "invalid_grant"
+    assert not request.failure.is_upstream_unavailable()
+
+
+@patch("requests.Session.request", side_effect=requests.ReadTimeout("read timed out"))
+def test_timed_out_request_records_unavailable_upstream(_):
+    request = RefreshTokenRequest(REFRESH_TOKEN)
+
+    assert request.execute(TOKEN_URL, CLIENT_ID, CLIENT_SECRET) is None
+    assert request.failure.status_code == 504
+    assert request.failure.is_upstream_unavailable()
+
+
+@patch("requests.Session.request", side_effect=requests.ConnectionError("refused"))
+def test_unreachable_api_records_unavailable_upstream(_):
+    request = ListAthleteRequest()
+
+    assert request.execute(LIST_ATHLETES_URL, ACCESS_TOKEN) is None
+    assert request.execute_stream(LIST_ATHLETES_URL, ACCESS_TOKEN) is None
+    assert request.failure.status_code == 502
+    assert request.failure.is_upstream_unavailable()
+
+
+@patch("requests.Session.request")
+def test_failed_athlete_data_request_records_failure(mock_get):
+    mock_get.return_value = MagicMock(ok=False, status_code=404, text='{"Message": "Not found"}')
+    request = AthleteDataRequest("https://api.example.com/athletes/{athlete_id}/workouts")
+
+    assert request.execute(1, ACCESS_TOKEN) is None
+    assert request.failure.status_code == 404
+    assert request.failure.description == "Not found"
+
+    mock_get.side_effect = requests.ConnectionError("refused")
+    assert request.execute(1, ACCESS_TOKEN) is None
+    assert request.failure.status_code == 502
+    assert request.failure.is_upstream_unavailable()
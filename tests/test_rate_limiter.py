@@ -0,0 +1,114 @@
+from email.utils import formatdate
+import threading
+import time
+import pytest
+from unittest.mock import patch, MagicMock
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from services.http_client import HttpClient
+from services.public_api import ListAthleteRequest
+from services.rate_limiter import RateLimiter
+
+KEY = ("client", "https://api.example.com/v1/coach/athletes")
+
+
+@pytest.fixture
+def limiter(fake_clock):
+    return RateLimiter(
+        requests_per_second=2, burst=2, max_wait_seconds=0, clock=fake_clock, wall_clock=lambda: 1_700_000_000
+    )
+
+
+def test_burst_then_rate(limiter, fake_clock):
+    assert limiter.acquire(KEY) is None
+    assert limiter.acquire(KEY) is None
+    assert limiter.acquire(KEY) == pytest.approx(0.5)
+
+    fake_clock.now = 0.5
+    assert limiter.acquire(KEY) is None
+
+
+def test_keys_have_separate_buckets(limiter):
+    limiter.acquire(KEY)
+    limiter.acquire(KEY)
+    assert limiter.acquire(("other-client", KEY[1])) is None
+
+
+def test_retry_after_seconds_blocks_bucket(limiter, fake_clock):
+    limiter.observe(KEY, 429, {"Retry-After": "30"})
+
+    assert limiter.acquire(KEY) == pytest.approx(30)
+    fake_clock.now = 30
+    assert limiter.acquire(KEY) is None
+
+
+def test_retry_after_http_date(limiter):
+    limiter.observe(KEY, 429, {"Retry-After": formatdate(1_700_000_000 + 120, usegmt=True)})
+    assert limiter.acquire(KEY) == pytest.approx(120)
+
+
+def test_too_many_requests_halves_rate_and_success_restores_it(limiter):
+    limiter.observe(KEY, 429, {})
+    bucket = limiter._buckets[KEY]
+    assert bucket.rate == 1
+
+    for _ in range(20):
+        limiter.observe(KEY, 200, {})
+    assert bucket.rate == 2
+
+
+def test_exhausted_window_pauses_until_reset(limiter):
+    limiter.observe(KEY, 200, {"X-RateLimit-Remaining": "0", "X-RateLimit-Reset": "10"})
+    assert limiter.acquire(KEY) == pytest.approx(10)
+
+
+def test_epoch_reset(limiter):
+    limiter.observe(KEY, 200, {"RateLimit-Remaining": "0", "RateLimit-Reset": str(1_700_000_000 + 5)})
+    assert limiter.acquire(KEY) == pytest.approx(5)
+
+
+def test_remaining_calls_are_spread_over_window(limiter):
+    limiter.observe(KEY, 200, {"X-RateLimit-Remaining": "5", "X-RateLimit-Reset": "10"})
+    assert limiter._buckets[KEY].rate == 0.5
+
+
+def test_callers_queue_until_a_token_is_available():
+    limiter = RateLimiter(requests_per_second=20, burst=1, max_wait_seconds=5)
+    started = time.monotonic()
+
+    threads = [threading.Thread(target=limiter.acquire, args=(KEY,)) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert time.monotonic() - started >= 0.14
+
+
+@patch("requests.Session.request")
+def test_http_client_observes_responses(mock_request, limiter):
+    mock_request.return_value = MagicMock(status_code=429, headers={"Retry-After": "60"})
+    client = HttpClient(client_id="client", rate_limiter=limiter)
+
+    client.get(KEY[1] + "?page=1")
+    response = client.get(KEY[1])
+
+    assert mock_request.call_count == 1
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "60"
+
+
+@patch("requests.Session.request")
+def test_rate_limited_list_athletes_records_failure(mock_request, limiter):
+    limiter.observe(KEY, 429, {"Retry-After": "60"})
+    request = ListAthleteRequest()
+
+    response = request.execute(
+        KEY[1], "token", http_client=HttpClient(client_id="client", rate_limiter=limiter)
+    )
+
+    assert response is None
+    assert request.failure.status_code == 429
+    mock_request.assert_not_called()
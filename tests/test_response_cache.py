@@ -0,0 +1,106 @@
+import pytest
+from unittest.mock import MagicMock
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from services.public_api import ListAthleteRequest
+from services.response_cache import ResponseCache
+
+LIST_ATHLETES_URL = "https://api.example.com/athletes"
+ATHLETES = [{"id": 1, "name": "Athlete One"}]
+
+
+@pytest.fixture
+def cache(fake_clock):
+    return ResponseCache(max_entries=2, ttl_seconds=60, clock=fake_clock)
+
+
+@pytest.fixture
+def http_client():
+    client = MagicMock()
+    client.get.return_value = MagicMock(
+        ok=True,
+        status_code=200,
+        json=MagicMock(return_value=ATHLETES),
+        headers={"ETag": '"v1"', "Last-Modified": "Wed, 01 May 2024 00:00:00 GMT"},
+    )
+    return client
+
+
+def list_athletes(http_client, cache, token="token"):
+    return ListAthleteRequest().execute(
+        LIST_ATHLETES_URL, token, http_client=http_client, cache=cache
+    )
+
+
+def test_key_does_not_contain_token():
+    endpoint, subject = ResponseCache.make_key(LIST_ATHLETES_URL, "secret-token")
+    assert endpoint == LIST_ATHLETES_URL
+    assert "secret-token" not in subject
+
+
+def test_fresh_hit_skips_request(http_client, cache):
+    first = list_athletes(http_client, cache)
+    second = list_athletes(http_client, cache)
+
+    assert second is first
+    http_client.get.assert_called_once()
+    assert cache.stats().hits == 1
+    assert cache.stats().misses == 1
+
+
+def test_stale_entry_sends_validators(http_client, cache, fake_clock):
+    list_athletes(http_client, cache)
+    fake_clock.now = 61
+    list_athletes(http_client, cache)
+
+    headers = http_client.get.call_args.kwargs["headers"]
+    assert headers["If-None-Match"] == '"v1"'
+    assert headers["If-Modified-Since"] == "Wed, 01 May 2024 00:00:00 GMT"
+    assert headers["Authorization"] == "Bearer token"
+
+
+def test_not_modified_serves_cached_response_without_parsing(http_client, cache, fake_clock):
+    first = list_athletes(http_client, cache)
+    fake_clock.now = 61
+    http_client.get.return_value = MagicMock(ok=True, status_code=304, json=MagicMock())
+
+    second = list_athletes(http_client, cache)
+
+    assert second is first
+    http_client.get.return_value.json.assert_not_called()
+    assert cache.stats().revalidations == 1
+
+    fake_clock.now = 100
+    assert list_athletes(http_client, cache) is first
+    assert http_client.get.call_count == 2
+
+
+def test_tokens_are_cached_separately(http_client, cache):
+    list_athletes(http_client, cache, token="coach-a")
+    list_athletes(http_client, cache, token="coach-b")
+
+    assert http_client.get.call_count == 2
+    assert len(cache) == 2
+
+
+def test_least_recently_used_entry_is_evicted(cache):
+    for token in ("a", "b", "c"):
+        cache.store(ResponseCache.make_key(LIST_ATHLETES_URL, token), token)
+
+    assert len(cache) == 2
+    assert cache.fresh_response(ResponseCache.make_key(LIST_ATHLETES_URL, "a")) is None
+    assert cache.stats().evictions == 1
+
+
+def test_failed_response_is_not_cached(http_client, cache):
+    http_client.get.return_value = MagicMock(ok=False, status_code=500)
+
+    assert list_athletes(http_client, cache) is None
+    assert len(cache) == 0
+
+
+def test_without_cache_no_validators_are_sent(http_client):
+    ListAthleteRequest().execute(LIST_ATHLETES_URL, "token", http_client=http_client)
+    assert http_client.get.call_args.kwargs["headers"] == {"Authorization": "Bearer token"}
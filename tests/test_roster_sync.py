@@ -0,0 +1,160 @@
+from collections import deque
+import gc
+import weakref
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from services import roster_sync
+from services.models import decode_athletes
+from services.roster_sync import RosterIndex, RosterSync, content_hash
+
+ANN = {"Id": 1, "FirstName": "Ann"}
+BOB = {"Id": 2, "FirstName": "Bob"}
+CAT = {"Id": 3, "FirstName": "Cat"}
+
+
+def test_first_sync_adds_every_athlete():
+    delta = RosterIndex().apply([ANN, BOB])
+    assert delta.added == (ANN, BOB)
+    assert (delta.changed, delta.removed, delta.unchanged) == ((), (), 0)
+
+
+def test_delta_between_rosters():
+    index = RosterIndex()
+    index.apply([ANN, BOB])
+    renamed = {"Id": 2, "FirstName": "Bobby"}
+    delta = index.apply([renamed, CAT])
+    assert delta.added == (CAT,)
+    assert delta.changed == (renamed,)
+    assert delta.removed == (1,)
+    assert delta.unchanged == 0
+    assert index.get(2) == renamed
+    assert len(index) == 2
+
+
+def test_same_roster_is_unchanged():
+    index = RosterIndex()
+    index.apply([ANN, BOB])
+    delta = index.apply([dict(BOB), dict(ANN)])
+    assert delta.is_empty()
+    assert delta.unchanged == 2
+    assert delta.reordered
+
+
+def test_hash_ignores_key_order_and_model():
+    assert content_hash({"Id": 1, "FirstName": "Ann"}) == content_hash({"FirstName": "Ann", "Id": 1})
+    assert content_hash(decode_athletes([ANN])[0]) == content_hash(ANN)
+
+
+def test_same_payload_is_not_hashed_again(monkeypatch):
+    index = RosterIndex()
+    athletes = decode_athletes([ANN, BOB])
+    index.apply(athletes)
+    monkeypatch.setattr(roster_sync, "content_hash", None)
+    delta = index.apply(athletes)
+    assert delta.is_empty()
+    assert delta.unchanged == 2
+
+
+def test_athletes_without_id_are_tracked_by_content():
+    index = RosterIndex()
+    index.apply([{"Name": "Ann"}])
+    delta = index.apply([{"Name": "Ann"}, {"Name": "Bob"}])
+    assert delta.added == ({"Name": "Bob"},)
+    assert delta.unchanged == 1
+
+
+def test_custom_id_field():
+    index = RosterIndex(id_field="AthleteId")
+    index.apply([{"AthleteId": 7, "FirstName": "Ann"}])
+    assert index.get(7) == {"AthleteId": 7, "FirstName": "Ann"}
+
+
+def test_listeners_get_only_changes():
+    sync = RosterSync()
+    deltas = []
+    unsubscribe = sync.subscribe(lambda key, delta: deltas.append((key, delta)))
+    sync.sync("a", [ANN])
+    sync.sync("a", [ANN])
+    sync.sync("a", [ANN, BOB])
+    assert [(key, delta.added) for key, delta in deltas] == [("a", (ANN,)), ("a", (BOB,))]
+    unsubscribe()
+    sync.sync("a", [CAT])
+    assert len(deltas) == 2
+
+
+def test_rosters_are_independent():
+    sync = RosterSync()
+    sync.sync("a", [ANN])
+    assert sync.sync("b", [ANN]).added == (ANN,)
+    assert len(sync) == 2
+
+
+def test_least_recently_synced_roster_is_dropped():
+    sync = RosterSync(max_rosters=2)
+    sync.sync("a", [ANN])
+    sync.sync("b", [ANN])
+    sync.sync("a", [ANN])
+    sync.sync("c", [ANN])
+    assert len(sync) == 2
+    assert sync.sync("a", [ANN]).is_empty()
+    assert sync.sync("b", [ANN]).added == (ANN,)
+
+
+def test_streamed_roster_is_synced_once_complete():
+    sync = RosterSync()
+    streamed = sync.track("a", iter([ANN, BOB]))
+    assert next(streamed) == ANN
+    assert len(sync.get_index("a")) == 0
+    assert list(streamed) == [BOB]
+    assert len(sync.get_index("a")) == 2
+
+
+def test_identical_roster_keeps_the_payload_it_was_built_from():
+    sync = RosterSync()
+    first = (ANN, BOB)
+    sync.sync("a", first)
+    assert sync.sync("a", (dict(ANN), dict(BOB))).is_empty()
+    assert sync.is_built_from("a", first)
+
+
+def test_streamed_roster_replaces_the_payload():
+    sync = RosterSync()
+    first = (ANN, BOB)
+    sync.sync("a", first)
+    list(sync.track("a", iter([ANN, CAT])))
+    assert not sync.is_built_from("a", first)
+    assert sync.sync("a", (ANN, CAT)).is_empty()
+    assert not sync.is_built_from("a", first)
+    assert not sync.is_built_from("b", first)
+
+
+class Record(dict):
+    """An athlete that can be weakly referenced"""
+
+
+def test_streamed_athletes_are_not_kept():
+    sync = RosterSync()
+    deltas = []
+    sync.subscribe(lambda _, delta: deltas.append(delta))
+    streamed = []
+
+    def download():
+        for athlete in (ANN, BOB, CAT):
+            record = Record(athlete)
+            streamed.append(weakref.ref(record))
+            yield record
+
+    # Consumed without keeping any, like a response streamed to the client
+    deque(sync.track("a", download()), maxlen=0)
+    gc.collect()
+    assert all(ref() is None for ref in streamed)
+    assert deltas[0].added == (1, 2, 3)
+    assert len(sync.get_index("a")) == 3
+
+    changed = dict(BOB, FirstName="Rob")
+    list(sync.track("a", iter([ANN, changed])))
+    assert deltas[1].changed == (2,)
+    assert deltas[1].removed == (3,)
+    assert sync.sync("a", [ANN, changed]).is_empty()
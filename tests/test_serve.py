@@ -0,0 +1,122 @@
+from dataclasses import replace
+import re
+import signal
+import socket
+import subprocess
+import time
+import pytest
+import sys
+import os
+
+import requests
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from serve import share_state_between_workers
+from services.config_loader import Config
+
+SERVE_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "serve.py"))
+WORKER_LABEL = re.compile(r'worker="(\d+)"')
+
+pytestmark = pytest.mark.skipif(not hasattr(os, "fork"), reason="serve.py needs os.fork")
+
+
+@pytest.fixture
+def config():
+    return Config("tests/config/test_config.ini")
+
+
+@pytest.fixture
+def server(app_workdir):
+    """serve.py with two workers, in a process of its own"""
+    workdir, environ = app_workdir
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    process = subprocess.Popen(
+        [sys.executable, SERVE_PATH, "--workers", "2", "--port", str(port)],
+        cwd=workdir,
+        env={**os.environ, **environ},
+        stdout=subprocess.DEVNULL,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 30
+    while True:
+        try:
+            get(base_url, "/")
+            break
+        except requests.ConnectionError:
+            assert process.poll() is None and time.monotonic() < deadline
+            time.sleep(0.1)
+    yield process, base_url
+    if process.poll() is None:
+        process.kill()
+        process.wait()
+
+
+def get(base_url, path, cookies=None):
+    """A request on a connection of its own, so any worker may accept it"""
+    return requests.get(
+        f"{base_url}{path}", cookies=cookies, headers={"Connection": "close"}, timeout=10
+    )
+
+
+def scrape_workers(base_url, count, timeout=30):
+    """Worker labels seen on /metrics until count different ones answered"""
+    workers = set()
+    deadline = time.monotonic() + timeout
+    while len(workers) < count and time.monotonic() < deadline:
+        workers.update(WORKER_LABEL.findall(get(base_url, "/metrics").text))
+    return workers
+
+
+@pytest.fixture
+def environ(monkeypatch):
+    """A copy of the environment for the test to change"""
+    environ = {name: value for name, value in os.environ.items() if not name.startswith("TP_")}
+    monkeypatch.setattr(os, "environ", environ)
+    return environ
+
+
+def test_workers_are_told_to_share_sessions(config, environ):
+    config.session.backend = "memory"
+    share_state_between_workers(config, 2)
+    assert environ["TP_SESSION__BACKEND"] == "sqlite"
+    assert environ["TP_SERVER__SECRET_KEY"]
+
+
+def test_one_worker_keeps_its_settings(config, environ):
+    config.session.backend = "memory"
+    config.server = replace(config.server, secret_key="configured")
+    share_state_between_workers(config, 1)
+    assert "TP_SESSION__BACKEND" not in environ
+    assert "TP_SERVER__SECRET_KEY" not in environ
+
+
+def test_sessions_are_shared_between_workers(server):
+    _, base_url = server
+    assert len(scrape_workers(base_url, 2)) == 2
+    for user in range(10):
+        callback = get(base_url, f"/callback?code=code-{user}")
+        cookies = callback.cookies
+        assert f"code-{user}" in get(base_url, "/", cookies).text
+        assert get(base_url, "/get-token", cookies).status_code == 200
+        token = get(base_url, "/api/token", cookies)
+        assert token.status_code == 200
+        assert token.json()["access_token"]
+
+
+def test_exited_worker_is_replaced_and_sigterm_stops_all(server):
+    process, base_url = server
+    workers = scrape_workers(base_url, 2)
+    killed = workers.pop()
+    os.kill(int(killed), signal.SIGKILL)
+
+    # Only live workers answer, so two labels again means one of them replaced the killed one
+    replacement = scrape_workers(base_url, 2) - workers
+    assert len(replacement) == 1
+    assert killed not in replacement
+    process.send_signal(signal.SIGTERM)
+    assert process.wait(timeout=30) == 0
+    for worker in workers | replacement:
+        with pytest.raises(ProcessLookupError):
+            os.kill(int(worker), 0)
@@ -0,0 +1,171 @@
+import pytest
+import threading
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from services.application_state import ApplicationState, Status
+from services.session_store import SessionStore
+
+
+@pytest.fixture
+def store(fake_clock):
+    return SessionStore(max_sessions=3, ttl_seconds=60, clock=fake_clock)
+
+
+def test_sessions_are_isolated(store):
+    with store.session("alice") as state:
+        state.authorization_code_request_status = Status.SUCCESS.value
+
+    with store.session("bob") as state:
+        assert state.authorization_code_request_status == Status.NOT_RUN.value
+
+    assert store.get("alice").is_authorization_complete() is True
+
+
+def test_same_session_returns_same_state(store):
+    with store.session("alice") as first:
+        pass
+    with store.session("alice") as second:
+        assert first is second
+
+
+def test_get_does_not_create(store):
+    assert store.get("missing") is None
+    assert len(store) == 0
+
+
+def test_least_recently_used_is_evicted(store):
+    for session_id in ("a", "b", "c"):
+        with store.session(session_id):
+            pass
+    with store.session("a"):
+        pass
+    with store.session("d"):
+        pass
+
+    assert len(store) == 3
+    assert store.get("b") is None
+    assert store.get("a") is not None
+
+
+def test_idle_sessions_expire(store, fake_clock):
+    with store.session("a"):
+        pass
+    fake_clock.now = 30
+    with store.session("b"):
+        pass
+    fake_clock.now = 61
+
+    assert store.get("a") is None
+    assert store.get("b") is not None
+
+    with store.session("c"):
+        pass
+    assert len(store) == 2
+
+
+def test_discard(store):
+    with store.session("a"):
+        pass
+    store.discard("a")
+    assert store.get("a") is None
+
+
+def test_other_sessions_not_blocked_by_busy_session(store):
+    entered = threading.Event()
+    release = threading.Event()
+
+    def hold_alice():
+        with store.session("alice"):
+            entered.set()
+            release.wait(5)
+
+    worker = threading.Thread(target=hold_alice)
+    worker.start()
+    entered.wait(5)
+
+    done = threading.Event()
+
+    def use_bob():
+        with store.session("bob"):
+            done.set()
+
+    threading.Thread(target=use_bob).start()
+    assert done.wait(1) is True
+
+    release.set()
+    worker.join()
+
+
+def test_new_session_ids_are_unique():
+    assert SessionStore.new_session_id() != SessionStore.new_session_id()
+
+
+def test_existing_session_does_not_create_or_touch(store, fake_clock):
+    with store.existing_session("missing") as state:
+        assert state is None
+    assert len(store) == 0
+
+    with store.session("a"):
+        pass
+    fake_clock.now = 50
+    with store.existing_session("a") as state:
+        assert state is not None
+    fake_clock.now = 61
+    assert store.get("a") is None
+
+
+def test_missing_session_is_restored(fake_clock):
+    restored = ApplicationState(authorization_code_request_status=Status.SUCCESS.value)
+    store = SessionStore(clock=fake_clock, restore=lambda session_id: restored if session_id == "a" else None)
+
+    with store.session("a") as state:
+        assert state is restored
+    with store.session("b") as state:
+        assert state.is_authorization_complete() is False
+
+
+def test_restore_does_not_hold_up_other_sessions(fake_clock):
+    restoring, release = threading.Event(), threading.Event()
+
+    def restore(session_id):
+        if session_id == "slow":
+            restoring.set()
+            release.wait(5)
+        return None
+
+    store = SessionStore(clock=fake_clock, restore=restore)
+    slow = threading.Thread(target=lambda: store.session("slow").__enter__())
+    fast = threading.Thread(target=lambda: store.session("fast").__enter__())
+    slow.start()
+    try:
+        assert restoring.wait(5)
+        fast.start()
+        fast.join(2)
+        assert not fast.is_alive()
+        assert store.get("fast") is not None
+    finally:
+        release.set()
+        slow.join(5)
+        fast.join(5)
+
+
+def test_session_created_while_restoring_wins(fake_clock):
+    def create():
+        with store.session("a") as state:
+            state.authorization_code_request_status = Status.SUCCESS.value
+
+    def restore(session_id):
+        # Another request creates the session while this one restores it
+        store.restore = None
+        other = threading.Thread(target=create)
+        other.start()
+        other.join(2)
+        assert not other.is_alive()
+        return ApplicationState()
+
+    store = SessionStore(clock=fake_clock, restore=restore)
+    with store.session("a") as state:
+        assert state.is_authorization_complete() is True
+    assert len(store) == 1
@@ -0,0 +1,145 @@
+import multiprocessing
+import pytest
+import sys
+import os
+import threading
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from services.application_state import ApplicationState, Status
+from services.public_api import GetTokenResponse
+from services.shared_session_store import SharedSessionStore
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "sessions.db")
+
+
+def test_state_is_shared_between_stores(path):
+    # Two stores on one file stand in for two worker processes
+    first, second = SharedSessionStore(path), SharedSessionStore(path)
+    with first.session("a") as state:
+        state.authorization_code_request_status = Status.SUCCESS.value
+        state.token_code_response = GetTokenResponse("refresh", "access", 123)
+    with second.session("a") as state:
+        assert state.is_authorization_complete()
+        assert state.token_code_response == GetTokenResponse("refresh", "access", 123)
+
+
+def test_state_round_trips_through_dict():
+    state = ApplicationState(exception_text="failed")
+    state.token_code_response = GetTokenResponse("refresh", "access", 123)
+    assert ApplicationState.from_dict(state.to_dict()) == state
+
+
+def test_session_is_leased_across_stores(path):
+    first, second = SharedSessionStore(path), SharedSessionStore(path)
+    entered = threading.Event()
+    release = threading.Event()
+    order = []
+
+    def hold():
+        with first.session("a") as state:
+            entered.set()
+            release.wait(5)
+            state.exception_text = "first"
+            order.append("first")
+
+    holder = threading.Thread(target=hold)
+    holder.start()
+    assert entered.wait(5)
+    def wait():
+        with second.session("a"):
+            order.append("second")
+
+    waiter = threading.Thread(target=wait)
+    waiter.start()
+    time.sleep(0.05)
+    assert order == []
+    release.set()
+    holder.join(5)
+    waiter.join(5)
+    assert order == ["first", "second"]
+    assert second.get("a").exception_text == "first"
+
+
+def hold_in_process(path, entered, release):
+    with SharedSessionStore(path).session("a") as state:
+        entered.set()
+        release.wait(5)
+        state.exception_text = "other process"
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs os.fork")
+def test_session_is_leased_across_processes(path):
+    context = multiprocessing.get_context("fork")
+    entered, release = context.Event(), context.Event()
+    holder = context.Process(target=hold_in_process, args=(path, entered, release))
+    holder.start()
+    try:
+        assert entered.wait(5)
+        order = []
+
+        def wait():
+            with SharedSessionStore(path).session("a") as state:
+                order.append(state.exception_text)
+
+        waiter = threading.Thread(target=wait)
+        waiter.start()
+        time.sleep(0.1)
+        assert order == []
+        release.set()
+        waiter.join(5)
+        assert order == ["other process"]
+    finally:
+        release.set()
+        holder.join(5)
+    assert holder.exitcode == 0
+
+
+def test_expired_lease_is_taken_over(path, fake_clock):
+    first = SharedSessionStore(path, lease_seconds=10, clock=fake_clock)
+    second = SharedSessionStore(path, lease_seconds=10, clock=fake_clock)
+    context = first.session("a")
+    context.__enter__().exception_text = "lost"
+    fake_clock.now += 11
+    with second.session("a") as state:
+        state.exception_text = "kept"
+    # The worker that lost its lease must not overwrite the new owner's state
+    context.__exit__(None, None, None)
+    assert second.get("a").exception_text == "kept"
+
+
+def test_existing_session_does_not_create(path):
+    store = SharedSessionStore(path)
+    with store.existing_session("missing") as state:
+        assert state is None
+    assert len(store) == 0
+
+
+def test_idle_sessions_expire(path, fake_clock):
+    store = SharedSessionStore(path, ttl_seconds=60, clock=fake_clock)
+    with store.session("a") as state:
+        state.exception_text = "old"
+    fake_clock.now += 61
+    assert store.get("a") is None
+    with store.session("a") as state:
+        assert state.exception_text is None
+
+
+def test_oldest_sessions_are_evicted(path, fake_clock):
+    store = SharedSessionStore(path, max_sessions=2, clock=fake_clock)
+    for session_id in ("a", "b", "c"):
+        fake_clock.now += 1
+        with store.session(session_id):
+            pass
+    assert len(store) == 2
+    assert store.get("a") is None
+
+
+def test_restore_is_used_for_new_sessions(path):
+    restored = ApplicationState(token_code_request_status=Status.SUCCESS.value)
+    store = SharedSessionStore(path, restore=lambda session_id: restored)
+    with store.session("a") as state:
+        assert state.is_token_complete()
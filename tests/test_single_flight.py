@@ -0,0 +1,90 @@
+import pytest
+import threading
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from services.single_flight import SingleFlight
+
+
+def run_concurrently(count, target):
+    threads = [threading.Thread(target=target) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads
+
+
+def test_concurrent_calls_share_one_execution():
+    flight = SingleFlight()
+    release = threading.Event()
+    executions = []
+    results = []
+
+    def refresh():
+        executions.append(1)
+        release.wait(5)
+        return "new-token"
+
+    threads = run_concurrently(5, lambda: results.append(flight.do("rt", refresh)))
+    while flight.stats().calls < 5:
+        pass
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(executions) == 1
+    assert results == ["new-token"] * 5
+    stats = flight.stats()
+    assert stats.executions == 1
+    assert stats.coalesced == 4
+    assert stats.in_flight == 0
+
+
+def test_different_keys_run_separately():
+    flight = SingleFlight()
+    assert flight.do("a", lambda: 1) == 1
+    assert flight.do("b", lambda: 2) == 2
+    assert flight.stats().executions == 2
+
+
+def test_sequential_calls_run_again_without_linger():
+    flight = SingleFlight()
+    flight.do("a", lambda: 1)
+    assert flight.do("a", lambda: 2) == 2
+    assert flight.stats().coalesced == 0
+
+
+def test_error_is_shared_and_not_cached():
+    flight = SingleFlight(linger_seconds=10)
+
+    def fail():
+        raise ConnectionError("down")
+
+    with pytest.raises(ConnectionError):
+        flight.do("a", fail)
+    assert flight.do("a", lambda: "ok") == "ok"
+
+
+def test_result_lingers_for_late_callers(fake_clock):
+    flight = SingleFlight(linger_seconds=5, clock=fake_clock)
+    flight.do("rt", lambda: "rotated")
+
+    fake_clock.now = 4
+    assert flight.do("rt", lambda: "dead-token-refresh") == "rotated"
+    assert flight.stats().coalesced == 1
+
+    fake_clock.now = 6
+    assert flight.do("rt", lambda: "fresh") == "fresh"
+    assert flight.stats().executions == 2
+
+
+def test_results_should_linger_rejects_are_not_handed_on(fake_clock):
+    flight = SingleFlight(
+        linger_seconds=5, clock=fake_clock, should_linger=lambda result: result[0] is not None
+    )
+    assert flight.do("rt", lambda: (None, "503")) == (None, "503")
+
+    fake_clock.now = 1
+    assert flight.do("rt", lambda: ("rotated", None)) == ("rotated", None)
+    assert flight.do("rt", lambda: ("again", None)) == ("rotated", None)
+    assert flight.stats().executions == 2
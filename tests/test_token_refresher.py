@@ -0,0 +1,187 @@
+import pytest
+import threading
+import time
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from services.public_api import GetTokenResponse
+from services.token_refresher import RefreshFailed, TokenRefreshScheduler
+
+
+@pytest.fixture
+def refreshed():
+    return []
+
+
+@pytest.fixture
+def scheduler(fake_clock, refreshed):
+    def refresh(key):
+        refreshed.append(key)
+        return GetTokenResponse("refresh", "access", fake_clock.now + 3600)
+
+    return TokenRefreshScheduler(
+        refresh=refresh, margin_seconds=60, jitter_seconds=20, clock=fake_clock, rng=lambda: 0.5
+    )
+
+
+def token_expiring_at(expire):
+    return GetTokenResponse("refresh", "access", expire)
+
+
+def test_deadline_includes_margin_and_jitter(scheduler):
+    assert scheduler.schedule("a", token_expiring_at(2000)) == 2000 - 60 - 10
+
+
+def test_nothing_runs_before_deadline(scheduler, fake_clock, refreshed):
+    scheduler.schedule("a", token_expiring_at(2000))
+    fake_clock.now = 1929
+    assert scheduler.run_pending() == 0
+    assert refreshed == []
+
+
+def test_refreshes_in_deadline_order(scheduler, fake_clock, refreshed):
+    scheduler.schedule("late", token_expiring_at(3000))
+    scheduler.schedule("early", token_expiring_at(2000))
+    assert scheduler.next_deadline() == 1930
+
+    fake_clock.now = 2930
+    assert scheduler.run_pending() == 2
+    assert refreshed == ["early", "late"]
+
+
+def test_refreshed_token_is_rescheduled(scheduler, fake_clock):
+    scheduler.schedule("a", token_expiring_at(2000))
+    fake_clock.now = 1930
+    scheduler.run_pending()
+
+    assert len(scheduler) == 1
+    assert scheduler.next_deadline() == 1930 + 3600 - 70
+
+
+def test_reschedule_replaces_pending_refresh(scheduler, fake_clock, refreshed):
+    scheduler.schedule("a", token_expiring_at(2000))
+    scheduler.schedule("a", token_expiring_at(5000))
+    assert len(scheduler) == 1
+
+    fake_clock.now = 2000
+    scheduler.run_pending()
+    assert refreshed == []
+
+
+def test_cancel(scheduler, fake_clock, refreshed):
+    scheduler.schedule("a", token_expiring_at(2000))
+    scheduler.cancel("a")
+    fake_clock.now = 3000
+
+    assert scheduler.run_pending() == 0
+    assert scheduler.next_deadline() is None
+    assert refreshed == []
+
+
+def test_failed_refresh_of_an_expired_token_is_not_retried(fake_clock):
+    def refresh(key):
+        raise ConnectionError("token_url unreachable")
+
+    scheduler = TokenRefreshScheduler(refresh=refresh, clock=fake_clock)
+    scheduler.schedule("a", token_expiring_at(fake_clock.now))
+
+    assert scheduler.run_pending() == 0
+    assert len(scheduler) == 0
+
+
+def test_failed_refresh_is_retried_with_backoff(fake_clock, refreshed):
+    failures = [RefreshFailed("503"), RefreshFailed("circuit open"), None]
+
+    def refresh(key):
+        refreshed.append(fake_clock.now)
+        failure = failures.pop(0)
+        if failure:
+            raise failure
+        return token_expiring_at(fake_clock.now + 3600)
+
+    scheduler = TokenRefreshScheduler(
+        refresh=refresh, margin_seconds=60, jitter_seconds=0, clock=fake_clock,
+        retry_seconds=5, max_retry_seconds=60,
+    )
+    scheduler.schedule("a", token_expiring_at(2000))
+    for _ in range(3):
+        fake_clock.now = scheduler.next_deadline()
+        scheduler.run_pending()
+
+    assert refreshed == [1940, 1945, 1955]
+    assert scheduler.next_deadline() == 1955 + 3600 - 60
+
+
+def test_retry_backoff_is_bounded(fake_clock):
+    def refresh(key):
+        raise RefreshFailed("503")
+
+    scheduler = TokenRefreshScheduler(
+        refresh=refresh, margin_seconds=3600, jitter_seconds=0, clock=fake_clock,
+        retry_seconds=5, max_retry_seconds=30,
+    )
+    scheduler.schedule("a", token_expiring_at(fake_clock.now + 3600))
+    waits = []
+    for _ in range(5):
+        scheduler.run_pending()
+        waits.append(scheduler.next_deadline() - fake_clock.now)
+        fake_clock.now = scheduler.next_deadline()
+
+    assert waits == [5, 10, 20, 30, 30]
+
+
+def test_retries_stop_when_the_token_expires(fake_clock):
+    def refresh(key):
+        raise RefreshFailed("503")
+
+    scheduler = TokenRefreshScheduler(
+        refresh=refresh, margin_seconds=12, jitter_seconds=0, clock=fake_clock,
+        retry_seconds=5, max_retry_seconds=60,
+    )
+    scheduler.schedule("a", token_expiring_at(fake_clock.now + 12))
+    scheduler.run_pending()
+    assert scheduler.next_deadline() == fake_clock.now + 5
+
+    # The next retry would be due after the token expired
+    fake_clock.now += 5
+    scheduler.run_pending()
+    assert len(scheduler) == 0
+
+
+def test_rejected_refresh_is_not_retried(fake_clock):
+    scheduler = TokenRefreshScheduler(refresh=lambda key: None, clock=fake_clock)
+    scheduler.schedule("a", token_expiring_at(fake_clock.now + 3600))
+    fake_clock.now += 3600
+
+    assert scheduler.run_pending() == 0
+    assert len(scheduler) == 0
+
+
+def test_cancel_stops_retries(fake_clock):
+    def refresh(key):
+        scheduler.cancel(key)
+        raise RefreshFailed("503")
+
+    scheduler = TokenRefreshScheduler(refresh=refresh, clock=fake_clock)
+    scheduler.schedule("a", token_expiring_at(fake_clock.now + 3600))
+    fake_clock.now += 3600 - 1
+
+    assert scheduler.run_pending() == 0
+    assert len(scheduler) == 0
+
+
+def test_background_thread_refreshes_due_tokens():
+    done = threading.Event()
+
+    def refresh(key):
+        done.set()
+        return None
+
+    scheduler = TokenRefreshScheduler(refresh=refresh, margin_seconds=0, jitter_seconds=0)
+    scheduler.start()
+    try:
+        scheduler.schedule("a", token_expiring_at(time.time() + 0.05))
+        assert done.wait(2) is True
+    finally:
+        scheduler.stop(timeout=2)
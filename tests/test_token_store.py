@@ -0,0 +1,114 @@
+import sqlite3
+import pytest
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from services.public_api import GetTokenResponse
+from services.token_store import SCHEMA_VERSION, TokenStore, TokenStoreVersionError
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "tokens.db")
+
+
+@pytest.fixture
+def store(db_path, fake_clock):
+    token_store = TokenStore(db_path, max_age_seconds=3600, clock=fake_clock)
+    yield token_store
+    token_store.close()
+
+
+def reopen(db_path, fake_clock):
+    token_store = TokenStore(db_path, max_age_seconds=3600, clock=fake_clock)
+    token_store.load()
+    return token_store
+
+
+def test_reads_are_served_from_memory_before_flush(store, db_path, fake_clock):
+    token = GetTokenResponse("refresh", "access", 2_000_000)
+    store.put("session", token)
+
+    assert store.get("session") is token
+    assert reopen(db_path, fake_clock).get("session") is None
+
+
+def test_flushed_tokens_survive_restart(store, db_path, fake_clock):
+    store.put("session", GetTokenResponse("refresh", "access", 2_000_000))
+    assert store.flush() == 1
+
+    restored = reopen(db_path, fake_clock)
+    assert restored.get("session") == GetTokenResponse("refresh", "access", 2_000_000)
+    assert len(restored) == 1
+
+
+def test_writes_are_batched_per_session(store, db_path, fake_clock):
+    for index in range(5):
+        store.put("session", GetTokenResponse(f"refresh-{index}", "access", 2_000_000))
+    store.put("other", GetTokenResponse("refresh", "access", 2_000_000))
+
+    assert store.flush() == 2
+    assert store.flush() == 0
+    assert reopen(db_path, fake_clock).get("session").refresh_token == "refresh-4"
+
+
+def test_flush_keeps_a_newer_token_written_by_another_process(store, db_path, fake_clock):
+    other = reopen(db_path, fake_clock)
+    store.put("session", GetTokenResponse("refresh-old", "access-old", 2_000_000))
+    other.put("session", GetTokenResponse("refresh-new", "access-new", 2_000_100))
+    other.flush()
+    other.close()
+
+    store.flush()
+    assert reopen(db_path, fake_clock).get("session").refresh_token == "refresh-new"
+
+    store.put("session", GetTokenResponse("refresh-newest", "access-newest", 2_000_200))
+    store.flush()
+    assert reopen(db_path, fake_clock).get("session").refresh_token == "refresh-newest"
+
+
+def test_delete(store, db_path, fake_clock):
+    store.put("session", GetTokenResponse("refresh", "access", 2_000_000))
+    store.flush()
+    store.delete("session")
+    store.flush()
+
+    assert store.get("session") is None
+    assert reopen(db_path, fake_clock).get("session") is None
+
+
+def test_old_records_are_dropped_on_load(store, db_path, fake_clock):
+    store.put("session", GetTokenResponse("refresh", "access", 2_000_000))
+    store.flush()
+    fake_clock.now += 3601
+
+    assert reopen(db_path, fake_clock).get("session") is None
+
+
+def test_stop_flushes_pending_writes(store, db_path, fake_clock):
+    store.start()
+    store.put("session", GetTokenResponse("refresh", "access", 2_000_000))
+    store.stop()
+
+    assert reopen(db_path, fake_clock).get("session") is not None
+
+
+def test_schema_version_is_recorded(store, db_path):
+    version = sqlite3.connect(db_path).execute("PRAGMA user_version").fetchone()[0]
+    assert version == SCHEMA_VERSION
+
+
+def test_newer_schema_is_rejected(db_path):
+    connection = sqlite3.connect(db_path)
+    connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION + 1}")
+    connection.close()
+
+    with pytest.raises(TokenStoreVersionError):
+        TokenStore(db_path)
+
+
+def test_secret_key_is_stable_across_restarts(store, db_path, fake_clock):
+    secret_key = store.get_secret_key()
+    assert secret_key
+    assert reopen(db_path, fake_clock).get_secret_key() == secret_key
@@ -0,0 +1,148 @@
+import http.server
+import json
+import socket
+import threading
+import pytest
+import requests
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from services.config_loader import HttpConfig
+from services.http_client import HttpClient
+from services.public_api import GetTokenRequest, ListAthleteRequest
+from services.rate_limiter import RateLimiter
+from services.upstream_timing import SlowCallLog, UpstreamTiming
+
+TOKEN_BODY = json.dumps({"access_token": "access", "refresh_token": "refresh", "expires_in": 3600})
+ATHLETES_BODY = json.dumps([{"Id": i, "FirstName": "Athlete"} for i in range(100)])
+
+
+class StubHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def send_body(self, body: str) -> None:
+        encoded = body.encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(encoded)))
+        self.end_headers()
+        self.wfile.write(encoded)
+
+    def do_GET(self):
+        self.send_body(ATHLETES_BODY)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.send_body(TOKEN_BODY)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(scope="module")
+def server_url():
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://localhost:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def http_client():
+    client = HttpClient(HttpConfig(max_retries=0))
+    yield client
+    client.close()
+
+
+def test_new_connection_times_every_phase(http_client, server_url):
+    timing = http_client.get(f"{server_url}/athletes", operation="ListAthleteRequest").timing
+
+    assert timing.reused_connection is False
+    assert timing.operation == "ListAthleteRequest"
+    assert timing.status == "200"
+    assert timing.dns_seconds > 0
+    assert timing.connect_seconds > 0
+    assert timing.tls_seconds == 0
+    assert timing.ttfb_seconds > 0
+    assert timing.body_seconds > 0
+    assert timing.total_seconds >= sum(timing.phases().values())
+
+
+def test_reused_connection_skips_dns_and_connect(http_client, server_url):
+    http_client.get(f"{server_url}/athletes")
+    timing = http_client.get(f"{server_url}/athletes").timing
+
+    assert timing.reused_connection is True
+    assert timing.dns_seconds == timing.connect_seconds == 0
+    assert timing.ttfb_seconds > 0
+
+
+def test_streamed_body_is_not_timed(http_client, server_url):
+    response = http_client.get(f"{server_url}/athletes", stream=True)
+    assert response.timing.body_seconds == 0
+    response.close()
+
+
+def test_results_carry_the_timing(http_client, server_url):
+    token = GetTokenRequest("code").execute(
+        f"{server_url}/token", "id", "secret", http_client=http_client
+    )
+    athletes = ListAthleteRequest().execute(
+        f"{server_url}/athletes", token.access_token, http_client=http_client
+    )
+
+    assert token.timing.operation == "GetTokenRequest"
+    assert athletes.timing.operation == "ListAthleteRequest"
+    assert athletes.timing.reused_connection is True
+    assert "timing" not in token.to_dict()
+
+
+def test_refused_connection_times_the_connect(http_client):
+    with socket.socket() as unused:
+        unused.bind(("127.0.0.1", 0))
+        port = unused.getsockname()[1]
+    slow_call_log = SlowCallLog(threshold_seconds=0)
+    http_client.slow_call_log = slow_call_log
+
+    with pytest.raises(requests.ConnectionError):
+        http_client.get(f"http://127.0.0.1:{port}/athletes")
+
+    timing = slow_call_log.entries()[0]
+    assert timing.status == "error"
+    assert timing.reused_connection is False
+    assert timing.connect_seconds > 0
+
+
+def test_local_responses_never_reach_the_network(server_url):
+    client = HttpClient(rate_limiter=RateLimiter(requests_per_second=0.001, burst=1, max_wait_seconds=0))
+    client.get(f"{server_url}/athletes")
+    response = client.get(f"{server_url}/athletes")
+
+    assert response.status_code == 429
+    assert response.timing.reused_connection is None
+    client.close()
+
+
+def test_phase_timing_can_be_disabled(server_url):
+    client = HttpClient(HttpConfig(phase_timing=False))
+    assert not hasattr(client.get(f"{server_url}/athletes"), "timing")
+    client.close()
+
+
+def test_slow_call_log_keeps_the_most_recent_slow_calls():
+    log = SlowCallLog(threshold_seconds=1, max_entries=2)
+
+    assert not log.record(UpstreamTiming(endpoint="fast", total_seconds=0.5))
+    for endpoint in ("a", "b", "c"):
+        assert log.record(UpstreamTiming(endpoint=endpoint, total_seconds=1))
+
+    assert [timing.endpoint for timing in log.entries()] == ["b", "c"]
+    assert log.recorded == 3
+
+
+def test_timing_to_dict_leaves_out_internal_readings():
+    values = UpstreamTiming(endpoint="e", sent_at=1.0).to_dict()
+    assert "sent_at" not in values
+    assert values["endpoint"] == "e"